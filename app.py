@@ -1,38 +1,102 @@
+from datetime import date, timedelta
 import streamlit as st
 import pandas as pd
-import mysql.connector
-from config import DB_CONFIG
-from modelo_recomendacion import SistemaRecomendacion
-import os
-from PIL import Image
+from config import (
+    ARCHIVO_PRECALCULADAS, CACHE_RESULTADOS, CAPACIDAD_HOTEL, DIR_MODELO, EXPORTAR_METRICAS, INTERVALO_REFRESCO,
+    METRICAS, MODO_BUSQUEDA, MODO_RECOMENDACION, PARAMETROS_ALS, PARAMETROS_ANN, REGISTRO_EVENTOS
+)
+from fuentes_datos import FuenteMySQL
+from modelo_recomendacion import SistemaRecomendacion, RefrescadorModelo
+from conexion_bd import conexion, consultar, ejecutar
+from miniaturas import ANCHO_TARJETA, FORMATO, CacheMiniaturas
+from indice_facetas import paginar
+from registro_eventos import RegistroEventos
+from cache_resultados import CacheResultados
+from metricas import ExportadorMetricas, configurar, cronometrado, medir, perfilar
+
+# Métricas del proceso (latencias del modelo y de la interfaz), configuradas una sola vez
+@st.cache_resource
+def inicializar_metricas():
+    registro = configurar(**METRICAS)
+    if registro.activas and (EXPORTAR_METRICAS['archivo_json'] or EXPORTAR_METRICAS['archivo_prometheus']):
+        ExportadorMetricas(**EXPORTAR_METRICAS).start()
+    return registro
+
+# Caché de miniaturas compartida por todas las sesiones (se crea una sola vez por proceso)
+@st.cache_resource
+def inicializar_miniaturas():
+    return CacheMiniaturas()
 
-# Función para obtener la imagen del hotel como objeto PIL Image
+# Función para obtener la miniatura del hotel (bytes JPEG ya redimensionados al ancho de la tarjeta)
+@cronometrado('app_imagen')
 def obtener_imagen_hotel(id_hotel):
-    ruta_imagen = f"static/images/hoteles/{id_hotel}.jpg"
-    if os.path.exists(ruta_imagen):
-        try:
-            return Image.open(ruta_imagen)
-        except Exception as e:
-            print(f"Error al abrir imagen {ruta_imagen}: {e}")
-            # Si hay un error al abrir la imagen específica, intentar con la por defecto
-            ruta_default = "static/images/hoteles/default.jpg"
-            if os.path.exists(ruta_default):
-                try:
-                    return Image.open(ruta_default)
-                except Exception as e:
-                    print( f"Error al abrir imagen por defecto {ruta_default}: {e}")
-                    return None
-            return None # O manejar el error de otra forma si la por defecto tampoco existe
-    else:
-        # Si la imagen específica no existe, usar la por defecto
-        ruta_default = "static/images/hoteles/default.jpg"
-        if os.path.exists(ruta_default):
-            try:
-                return Image.open(ruta_default)
-            except Exception as e:
-                print(f"Error al abrir imagen por defecto {ruta_default}: {e}")
-                return None
-        return None # Manejar el caso si no hay imagen por defecto
+    return inicializar_miniaturas().obtener(id_hotel, ANCHO_TARJETA)
+
+# Registro de eventos compartido por todas las sesiones: las inserciones se hacen en segundo plano
+@st.cache_resource
+def inicializar_registro():
+    registro = RegistroEventos(**REGISTRO_EVENTOS)
+    registro.start()
+    return registro
+
+def registrar_vistas(ids_hoteles):
+    # Una vista por hotel y sesión: Streamlit vuelve a ejecutar el script en cada interacción
+    vistos = st.session_state.setdefault('hoteles_vistos', set())
+    registro = inicializar_registro()
+    for id_hotel in ids_hoteles:
+        if id_hotel not in vistos:
+            vistos.add(id_hotel)
+            registro.registrar_interaccion(st.session_state.get('id_usuario'), id_hotel, 'vista')
+
+def registrar_favorito(id_hotel):
+    inicializar_registro().registrar_interaccion(st.session_state.get('id_usuario'), id_hotel, 'favorito')
+
+def seleccionar_fechas(clave):
+    # Rango de estadía opcional: (entrada, salida) o (None, None) si no se eligieron las dos fechas
+    fechas = st.date_input("Fechas de estadía (opcional):", value=(), min_value=date.today(), key=clave)
+    if len(fechas) != 2:
+        return None, None
+    entrada, salida = fechas
+    # Elegir el mismo día como entrada y salida se interpreta como una noche
+    return entrada, max(salida, entrada + timedelta(days=1))
+
+# Número de hoteles que se muestran por página en la pestaña de exploración
+HOTELES_POR_PAGINA = 10
+# Número de hoteles similares que se muestran en cada tarjeta
+HOTELES_SIMILARES = 3
+
+def mostrar_hoteles_similares(id_hotel, estado=None):
+    # Lee la lista de vecinos precalculada del hotel: no recorre el catálogo
+    similares = sistema.hoteles_similares(id_hotel, HOTELES_SIMILARES, estado=estado)
+    hoteles = sistema.obtener_hoteles([id_similar for id_similar, _ in similares], estado=estado)
+    nombres = [hotel.nombre for hotel in hoteles if hotel is not None]
+    if nombres:
+        st.caption("Hoteles similares: " + " · ".join(nombres))
+
+# Tarjeta de un hotel con botón de favoritos; `progreso` (0-1) dibuja la barra de similitud o puntuación
+@cronometrado('app_tarjeta')
+def mostrar_tarjeta_hotel(hotel, clave_favorito, puntuacion=None, progreso=None, estado=None):
+    st.markdown(f"### {hotel.nombre}  ")
+    if puntuacion is not None:
+        st.write(f"**Puntuación estimada:** {puntuacion:.2f}")
+    st.write(f"**Categoría:** {hotel.categoria}")
+    st.write(f"**Precio promedio:** ${hotel.precio_promedio:,.2f}")
+    st.write(f"**Ubicación:** {hotel.ubicacion}")
+    st.write(f"**Descripción:** {hotel.descripcion}")
+    mostrar_hoteles_similares(hotel.id_hotel, estado)
+    imagen = obtener_imagen_hotel(hotel.id_hotel)
+    if imagen:
+        # Mismo ancho y formato que la miniatura: st.image la envía sin decodificarla ni recodificarla
+        st.image(imagen, width=ANCHO_TARJETA, output_format=FORMATO)
+    if progreso is not None:
+        st.progress(min(max(progreso, 0.0), 1.0))
+    # Botón para agregar a favoritos
+    if st.button(f"Agregar a favoritos: {hotel.nombre}", key=clave_favorito):
+        if hotel.nombre not in st.session_state['favoritos']:
+            st.session_state['favoritos'].append(hotel.nombre)
+            registrar_favorito(hotel.id_hotel)
+            st.success(f"Agregado a favoritos: {hotel.nombre}")
+    st.divider()
 
 # Configuración de la página
 st.set_page_config(
@@ -40,6 +104,7 @@ st.set_page_config(
     page_icon="🏨",
     layout="wide"
 )
+inicializar_metricas()
 
 # Inicializar estado de sesión para login y usuario
 if 'logged_in' not in st.session_state:
@@ -56,10 +121,19 @@ if 'auth_menu_selection' not in st.session_state or st.session_state['auth_menu_
 
 # Inicializar el sistema de recomendación (solo se inicializa una vez por sesión con st.cache_resource)
 @st.cache_resource
+@cronometrado('app_iniciar_sistema')
 def inicializar_sistema():
-    print("Iniciando sistema...") # Mensaje para depuración
-    sistema = SistemaRecomendacion()
-    sistema.cargar_datos()
+    sistema = SistemaRecomendacion(
+        modo_busqueda=MODO_BUSQUEDA, parametros_ann=PARAMETROS_ANN,
+        modo_recomendacion=MODO_RECOMENDACION, parametros_als=PARAMETROS_ALS, capacidad_hotel=CAPACIDAD_HOTEL,
+        fuente=FuenteMySQL(archivo_precalculadas=ARCHIVO_PRECALCULADAS or None),
+        cache_resultados=CacheResultados(**CACHE_RESULTADOS)
+    )
+    # Arrancar desde el paquete guardado en disco si existe; si no, entrenar y guardarlo
+    sistema.iniciar(DIR_MODELO)
+    # Incorporar valoraciones y hoteles nuevos en segundo plano sin reiniciar el proceso
+    if INTERVALO_REFRESCO > 0:
+        RefrescadorModelo(sistema, INTERVALO_REFRESCO).start()
     return sistema
 
 sistema = None # Inicializar sistema como None por defecto
@@ -184,13 +258,10 @@ if not st.session_state['logged_in']:
                 login_error_placeholder.empty()
 
                 try:
-                    conn = mysql.connector.connect(**DB_CONFIG)
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT id_usuario, nombre FROM usuario WHERE email = %s AND password = %s", 
-                                 (user_email, user_password))
-                    usuario = cursor.fetchone()
-                    cursor.close()
-                    conn.close()
+                    with medir('app_bd_login'):
+                        filas = consultar("SELECT id_usuario, nombre FROM usuario WHERE email = %s AND password = %s",
+                                          (user_email, user_password))
+                    usuario = filas[0] if filas else None
 
                     if usuario:
                         # Si el login es exitoso, actualizamos el estado y forzamos una reejecución
@@ -225,15 +296,12 @@ if not st.session_state['logged_in']:
                     st.warning("Por favor, completa todos los campos obligatorios.")
                 else:
                     try:
-                        conn = mysql.connector.connect(**DB_CONFIG)
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            "INSERT INTO usuario (nombre, email, password, edad, genero) VALUES (%s, %s, %s, %s, %s)",
-                            (nombre, email, password, edad, genero)
-                        )
-                        conn.commit()
-                        cursor.close()
-                        conn.close()
+                        with medir('app_bd_registro'):
+                            ejecutar(
+                                "INSERT INTO usuario (nombre, email, password, edad, genero) "
+                                "VALUES (%s, %s, %s, %s, %s)",
+                                (nombre, email, password, edad, genero)
+                            )
                         st.success("¡Usuario registrado exitosamente! Ahora puedes iniciar sesión.")
                         # Cambiar a la opción de Iniciar Sesión en la sidebar después del registro exitoso
                         st.session_state['auth_menu_selection'] = "Iniciar Sesión"
@@ -256,9 +324,8 @@ if not st.session_state['logged_in']:
             if sistema is None:
                  sistema = inicializar_sistema()
             try:
-                conn = mysql.connector.connect(**DB_CONFIG)
-                usuarios_df = pd.read_sql("SELECT id_usuario, nombre, email, edad, genero FROM usuario", conn)
-                conn.close()
+                with medir('app_bd_usuarios'), conexion() as conn:
+                    usuarios_df = pd.read_sql("SELECT id_usuario, nombre, email, edad, genero FROM usuario", conn)
                 st.dataframe(usuarios_df)
             except Exception as e:
                 st.error(f"Error al cargar usuarios: {e}")
@@ -315,29 +382,30 @@ elif st.session_state['logged_in']:
                 height=100,
                 placeholder="Ejemplo: piscina, spa, restaurante gourmet, centro histórico..."
             )
+            entrada, salida = seleccionar_fechas("fechas_caracteristicas")
             if st.button("Buscar hoteles similares", key="buscar_caracteristicas"):
                 if descripcion.strip():
-                    recomendaciones = sistema.recomendar_por_caracteristicas(descripcion)
-                    if recomendaciones:
-                        st.success("Resultados encontrados:")
-                        for id_hotel, similitud in recomendaciones:
-                            hotel = sistema.hoteles_df[sistema.hoteles_df['id_hotel'] == id_hotel].iloc[0]
-                            st.markdown(f"### {hotel['nombre']}  ")
-                            st.write(f"**Categoría:** {hotel['categoria']}")
-                            st.write(f"**Precio promedio:** ${hotel['precio_promedio']:,.2f}")
-                            st.write(f"**Ubicación:** {hotel['ubicacion']}")
-                            st.write(f"**Descripción:** {hotel['descripcion']}")
-                            ruta_imagen = obtener_imagen_hotel(hotel['id_hotel'])
-                            if ruta_imagen:
-                                st.image(ruta_imagen, width=300)
-                            st.progress(min(similitud, 1.0))
-                            # Botón para agregar a favoritos
-                            if st.button(f"Agregar a favoritos: {hotel['nombre']}", key=f"fav_carac_{id_hotel}"):
-                                if hotel['nombre'] not in st.session_state['favoritos']:
-                                    st.session_state['favoritos'].append(hotel['nombre'])
-                                    st.success(f"Agregado a favoritos: {hotel['nombre']}")
-                            st.divider()
-                    else:
+                    # Una sola instantánea del modelo para buscar y mostrar los resultados
+                    estado = sistema.estado
+                    with perfilar('app_busqueda'), medir('app_busqueda'):
+                        recomendaciones = sistema.recomendar_por_caracteristicas(
+                            descripcion, entrada=entrada, salida=salida, estado=estado
+                        )
+                        inicializar_registro().registrar_busqueda(
+                            st.session_state.get('id_usuario'), 'caracteristicas', descripcion, len(recomendaciones)
+                        )
+                        if recomendaciones:
+                            st.success("Resultados encontrados:")
+                            hoteles = sistema.obtener_hoteles(
+                                [id_hotel for id_hotel, _ in recomendaciones], estado=estado
+                            )
+                            registrar_vistas([id_hotel for id_hotel, _ in recomendaciones])
+                            for (id_hotel, similitud), hotel in zip(recomendaciones, hoteles):
+                                if hotel is not None:
+                                    mostrar_tarjeta_hotel(
+                                        hotel, f"fav_carac_{id_hotel}", progreso=similitud, estado=estado
+                                    )
+                    if not recomendaciones:
                         st.warning("No se encontraron hoteles que coincidan con tu búsqueda.")
                 else:
                     st.info("Por favor, escribe una descripción para buscar.")
@@ -346,30 +414,33 @@ elif st.session_state['logged_in']:
         with pestanas[1]:
             st.subheader("Recomendaciones según tu historial")
             id_usuario = st.number_input("Ingresa tu ID de usuario:", min_value=1, step=1)
+            entrada, salida = seleccionar_fechas("fechas_recomendaciones")
             if st.button("Obtener recomendaciones", key="recomendar_usuario"):
                 if id_usuario:
-                    recomendaciones = sistema.recomendar_por_usuario(id_usuario)
-                    if recomendaciones:
-                        st.success("Tus recomendaciones:")
-                        for hotel_id, puntuacion in recomendaciones:
-                            hotel = sistema.hoteles_df[sistema.hoteles_df['id_hotel'] == hotel_id].iloc[0]
-                            st.markdown(f"### {hotel['nombre']}  ")
-                            st.write(f"**Puntuación estimada:** {puntuacion:.2f}")
-                            st.write(f"**Categoría:** {hotel['categoria']}")
-                            st.write(f"**Precio promedio:** ${hotel['precio_promedio']:,.2f}")
-                            st.write(f"**Ubicación:** {hotel['ubicacion']}")
-                            st.write(f"**Descripción:** {hotel['descripcion']}")
-                            ruta_imagen = obtener_imagen_hotel(hotel['id_hotel'])
-                            if ruta_imagen:
-                                st.image(ruta_imagen, width=300)
-                            st.progress(min(puntuacion, 1.0))
-                            # Botón para agregar a favoritos
-                            if st.button(f"Agregar a favoritos: {hotel['nombre']}", key=f"fav_recom_{hotel_id}"):
-                                if hotel['nombre'] not in st.session_state['favoritos']:
-                                    st.session_state['favoritos'].append(hotel['nombre'])
-                                    st.success(f"Agregado a favoritos: {hotel['nombre']}")
-                            st.divider()
-                    else:
+                    estado = sistema.estado
+                    with perfilar('app_recomendaciones'), medir('app_recomendaciones'):
+                        recomendaciones = sistema.recomendar_usuario(
+                            id_usuario, entrada=entrada, salida=salida, estado=estado
+                        )
+                        inicializar_registro().registrar_busqueda(
+                            st.session_state.get('id_usuario'), 'recomendaciones', id_usuario, len(recomendaciones)
+                        )
+                        if recomendaciones:
+                            st.success("Tus recomendaciones:")
+                            hoteles = sistema.obtener_hoteles(
+                                [hotel_id for hotel_id, _ in recomendaciones], estado=estado
+                            )
+                            registrar_vistas([hotel_id for hotel_id, _ in recomendaciones])
+                            # La escala depende del modo (rating 1-5 o producto de factores ALS sin cota):
+                            # la barra es relativa a la mejor recomendación de la lista
+                            maximo = max(puntuacion for _, puntuacion in recomendaciones)
+                            for (hotel_id, puntuacion), hotel in zip(recomendaciones, hoteles):
+                                if hotel is not None:
+                                    mostrar_tarjeta_hotel(
+                                        hotel, f"fav_recom_{hotel_id}", puntuacion=puntuacion,
+                                        progreso=puntuacion / maximo if maximo > 0 else 0.0, estado=estado
+                                    )
+                    if not recomendaciones:
                         st.warning("No se encontraron recomendaciones para este usuario.")
                 else:
                     st.info("Por favor, ingresa un ID de usuario válido.")
@@ -377,35 +448,42 @@ elif st.session_state['logged_in']:
         # --- Pestaña 3: Explorar hoteles ---
         with pestanas[2]:
             st.subheader("Explora todos los hoteles disponibles")
-            col1, col2 = st.columns(2)
+            # Una sola instantánea del modelo para filtrar y mostrar la misma versión del catálogo
+            estado = sistema.estado
+            facetas = estado.indice_facetas
+            col1, col2, col3 = st.columns(3)
             with col1:
-                categoria = st.selectbox("Categoría:", ["Todas", "5 estrellas", "4 estrellas", "3 estrellas"])
+                categoria = st.selectbox("Categoría:", ["Todas"] + facetas.valores_categoria())
             with col2:
+                zona = st.selectbox("Zona:", ["Todas"] + facetas.valores_zona())
+            with col3:
                 precio_max = st.slider("Precio máximo por noche:", 300000, 1000000, 1000000, step=50000)
+            entrada, salida = seleccionar_fechas("fechas_explorar")
+
+            posiciones = sistema.filtrar_hoteles(
+                categoria=None if categoria == "Todas" else categoria,
+                zona=None if zona == "Todas" else zona,
+                precio_max=precio_max,
+                estado=estado,
+                entrada=entrada,
+                salida=salida
+            )
 
-            hoteles_filtrados = sistema.hoteles_df
-            if categoria != "Todas":
-                hoteles_filtrados = hoteles_filtrados[hoteles_filtrados['categoria'] == categoria]
-            hoteles_filtrados = hoteles_filtrados[hoteles_filtrados['precio_promedio'] <= precio_max]
-
-            if len(hoteles_filtrados) == 0:
-                st.warning("No hay hoteles que cumplan con los filtros seleccionados.")
+            if len(posiciones) == 0:
+                st.warning("No hay hoteles disponibles que cumplan con los filtros seleccionados.")
             else:
-                for _, hotel in hoteles_filtrados.iterrows():
-                    st.markdown(f"### {hotel['nombre']}  ")
-                    st.write(f"**Categoría:** {hotel['categoria']}")
-                    st.write(f"**Precio promedio:** ${hotel['precio_promedio']:,.2f}")
-                    st.write(f"**Ubicación:** {hotel['ubicacion']}")
-                    st.write(f"**Descripción:** {hotel['descripcion']}")
-                    ruta_imagen = obtener_imagen_hotel(hotel['id_hotel'])
-                    if ruta_imagen:
-                        st.image(ruta_imagen, width=300)
-                    # Botón para agregar a favoritos
-                    if st.button(f"Agregar a favoritos: {hotel['nombre']}", key=f"fav_expl_{hotel['id_hotel']}"):
-                        if hotel['nombre'] not in st.session_state['favoritos']:
-                            st.session_state['favoritos'].append(hotel['nombre'])
-                            st.success(f"Agregado a favoritos: {hotel['nombre']}")
-                    st.divider()
+                # Solo se materializa y se dibuja una página de hoteles por ejecución
+                pagina = st.number_input("Página:", min_value=1, value=1, step=1, key="pagina_explorar")
+                posiciones_pagina, pagina, n_paginas = paginar(posiciones, pagina, HOTELES_POR_PAGINA)
+                primera = (pagina - 1) * HOTELES_POR_PAGINA
+                st.caption(
+                    f"Página {pagina} de {n_paginas} · hoteles {primera + 1}–{primera + len(posiciones_pagina)} de {len(posiciones)}"
+                )
+                ids_pagina = estado.ids_hoteles[posiciones_pagina].tolist()
+                registrar_vistas(ids_pagina)
+                with perfilar('app_explorar'), medir('app_explorar'):
+                    for hotel in sistema.obtener_hoteles(ids_pagina, estado=estado):
+                        mostrar_tarjeta_hotel(hotel, f"fav_expl_{hotel.id_hotel}", estado=estado)
 
     elif menu == "Registro de usuario":
          # --- Contenido: Formulario de Registro (si está logueado, accesible desde el menú) ---
@@ -424,15 +502,12 @@ elif st.session_state['logged_in']:
                     st.warning("Por favor, completa todos los campos obligatorios.")
                 else:
                     try:
-                        conn = mysql.connector.connect(**DB_CONFIG)
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            "INSERT INTO usuario (nombre, email, password, edad, genero) VALUES (%s, %s, %s, %s, %s)",
-                            (nombre, email, password, edad, genero)
-                        )
-                        conn.commit()
-                        cursor.close()
-                        conn.close()
+                        with medir('app_bd_registro'):
+                            ejecutar(
+                                "INSERT INTO usuario (nombre, email, password, edad, genero) "
+                                "VALUES (%s, %s, %s, %s, %s)",
+                                (nombre, email, password, edad, genero)
+                            )
                         st.success("¡Usuario registrado exitosamente!")
                     except Exception as e:
                         st.error(f"Error al registrar usuario: {e}")
@@ -444,9 +519,8 @@ elif st.session_state['logged_in']:
         if sistema is None:
              sistema = inicializar_sistema()
         try:
-            conn = mysql.connector.connect(**DB_CONFIG)
-            usuarios_df = pd.read_sql("SELECT id_usuario, nombre, email, edad, genero FROM usuario", conn)
-            conn.close()
+            with medir('app_bd_usuarios'), conexion() as conn:
+                usuarios_df = pd.read_sql("SELECT id_usuario, nombre, email, edad, genero FROM usuario", conn)
             st.dataframe(usuarios_df)
         except Exception as e:
             st.error(f"Error al cargar usuarios: {e}")
@@ -460,5 +534,4 @@ elif st.session_state['logged_in']:
         st.session_state['favoritos'] = [] # Limpiar favoritos de la sesión anterior
         st.rerun()
 
-# Cerrar conexión al finalizar (esto puede ser problemático con st.cache_resource, mejor manejar conexiones dentro de las funciones que la usan)
-# sistema.cerrar_conexion() 
\ No newline at end of file
+# Las conexiones se toman del pool compartido de conexion_bd y se devuelven al terminar cada consulta 
\ No newline at end of file
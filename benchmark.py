@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+from scipy import sparse
+from datos_sinteticos import SERVICIOS, ZONAS, crear_base_sqlite
+from fuentes_datos import FuenteSQLite
+from metricas import REGISTRO, configurar
+from modelo_recomendacion import SistemaRecomendacion
+
+# Uso:
+#   python benchmark.py --usuarios 1000 10000 100000 [--hoteles 1000] [--valoraciones-por-usuario 20]
+#                       [--repeticiones 3] [--salida resultados_benchmark] [--comparar resultados_benchmark/x.json]
+#                       [--metricas]
+#
+# Los datos sintéticos se generan una vez por tamaño en --datos y se reutilizan entre ejecuciones.
+
+# Una métrica que empeora más que esto respecto a la referencia se marca como regresión
+UMBRAL_REGRESION = 1.2
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _latencias(funcion, argumentos):
+    """Llama a la función con cada argumento y resume las latencias en milisegundos"""
+    tiempos = np.empty(len(argumentos))
+    for i, argumento in enumerate(argumentos):
+        inicio = time.perf_counter()
+        funcion(argumento)
+        tiempos[i] = time.perf_counter() - inicio
+    tiempos *= 1000
+    return {
+        'n': len(argumentos),
+        'media_ms': float(tiempos.mean()),
+        'p50_ms': float(np.percentile(tiempos, 50)),
+        'p95_ms': float(np.percentile(tiempos, 95)),
+        'p99_ms': float(np.percentile(tiempos, 99)),
+    }
+
+
+def _pico_memoria(funcion):
+    """Ejecuta la función una vez con tracemalloc y devuelve el pico de memoria asignada en MB
+
+    tracemalloc ralentiza las asignaciones, por eso la memoria se mide en una ejecución aparte del tiempo.
+    """
+    tracemalloc.start()
+    try:
+        funcion()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def tamano_modelo(estado):
+    """Memoria (MB) que ocupan los arreglos NumPy y las matrices dispersas de la instantánea del modelo"""
+    total = 0
+    for nombre in type(estado).__slots__:
+        valor = getattr(estado, nombre)
+        if isinstance(valor, np.ndarray):
+            total += valor.nbytes
+        elif sparse.issparse(valor):
+            total += valor.data.nbytes + valor.indices.nbytes + valor.indptr.nbytes
+    return total / 1e6
+
+
+def consultas_texto(n, rng):
+    """Descripciones de búsqueda distintas entre sí, para medir la búsqueda sin aciertos de caché"""
+    servicios = rng.integers(len(SERVICIOS), size=(n, 2))
+    zonas = rng.integers(len(ZONAS), size=n)
+    return [
+        f"{SERVICIOS[a]} {SERVICIOS[b]} {ZONAS[z]} {i}"
+        for i, ((a, b), z) in enumerate(zip(servicios.tolist(), zonas.tolist()))
+    ]
+
+
+def medir_escenario(ruta, repeticiones=3, n_consultas=200, semilla=0, opciones_sistema=None):
+    """Mide carga, recomendación por usuario y búsqueda por texto sobre una base SQLite sintética"""
+    rng = np.random.default_rng(semilla)
+    sistema = SistemaRecomendacion(fuente=FuenteSQLite(ruta), **(opciones_sistema or {}))
+
+    tiempos_carga = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        sistema.cargar_datos()
+        tiempos_carga.append(time.perf_counter() - inicio)
+    resultado = {
+        'n_usuarios': int(len(sistema.ids_usuarios)),
+        'n_hoteles': int(len(sistema.ids_hoteles)),
+        'n_valoraciones': int(sistema.matriz_ratings.nnz),
+        'tamano_modelo_mb': tamano_modelo(sistema.estado),
+        'cargar_datos': {
+            'mediana_s': float(np.median(tiempos_carga)),
+            'minimo_s': float(np.min(tiempos_carga)),
+            'pico_memoria_mb': _pico_memoria(sistema.cargar_datos),
+        },
+    }
+
+    usuarios = rng.choice(sistema.ids_usuarios, size=min(n_consultas, len(sistema.ids_usuarios)), replace=False)
+    resultado['recomendar_por_usuario'] = _latencias(sistema.recomendar_por_usuario, usuarios.tolist())
+    # Todos los usuarios (hasta 10.000) en una sola llamada por bloques
+    lote = sistema.ids_usuarios[:10000]
+    inicio = time.perf_counter()
+    sistema.recomendar_por_usuarios(lote, usar_cache=False)
+    total = time.perf_counter() - inicio
+    resultado['recomendar_por_usuarios'] = {
+        'n': len(lote),
+        'total_s': total,
+        'ms_por_usuario': total * 1000 / max(len(lote), 1),
+    }
+
+    consultas = consultas_texto(n_consultas, rng)
+    resultado['recomendar_por_caracteristicas'] = _latencias(sistema.recomendar_por_caracteristicas, consultas)
+    # Segunda pasada con las mismas consultas: todas salen de la caché
+    resultado['recomendar_por_caracteristicas_cache'] = _latencias(sistema.recomendar_por_caracteristicas, consultas)
+    resultado['cache_resultados'] = sistema.cache_resultados.estadisticas()
+    return resultado
+
+
+def _metricas(escenario):
+    """Aplana las métricas comparables de un escenario: {nombre: valor} (menor es mejor)"""
+    planas = {'tamano_modelo_mb': escenario['tamano_modelo_mb']}
+    for grupo in ('cargar_datos', 'recomendar_por_usuario', 'recomendar_por_usuarios', 'recomendar_por_caracteristicas',
+                  'recomendar_por_caracteristicas_cache'):
+        # Los informes anteriores pueden no tener todos los grupos
+        for nombre, valor in escenario.get(grupo, {}).items():
+            if nombre != 'n':
+                planas[f"{grupo}.{nombre}"] = valor
+    return planas
+
+
+def comparar(informe, referencia):
+    """Imprime la variación de cada métrica respecto a un informe anterior; devuelve las regresiones"""
+    regresiones = []
+    anteriores = {
+        (e['parametros']['n_usuarios'], e['parametros']['n_hoteles']): e for e in referencia['escenarios']
+    }
+    for escenario in informe['escenarios']:
+        clave = (escenario['parametros']['n_usuarios'], escenario['parametros']['n_hoteles'])
+        if clave not in anteriores:
+            continue
+        print(f"\nEscenario {clave[0]} usuarios × {clave[1]} hoteles (referencia {referencia.get('commit')}):")
+        actuales, previas = _metricas(escenario), _metricas(anteriores[clave])
+        for nombre, valor in actuales.items():
+            previo = previas.get(nombre)
+            if not previo:
+                continue
+            razon = valor / previo
+            marca = "  <-- REGRESIÓN" if razon > UMBRAL_REGRESION else ""
+            print(f"  {nombre:48s} {previo:12.3f} -> {valor:12.3f}  ({razon:5.2f}x){marca}")
+            if marca:
+                regresiones.append((clave, nombre, razon))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del sistema de recomendación con datos sintéticos")
+    parser.add_argument("--usuarios", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--hoteles", type=int, default=1000)
+    parser.add_argument("--valoraciones-por-usuario", type=int, default=20)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--consultas", type=int, default=200, help="consultas por tipo de recomendación")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--datos", default="datos_benchmark", help="directorio de las bases sintéticas")
+    parser.add_argument("--salida", default="resultados_benchmark", help="directorio de los informes JSON")
+    parser.add_argument("--comparar", help="informe JSON anterior con el que comparar")
+    parser.add_argument("--metricas", action="store_true", help="incluir el desglose de tiempos por operación")
+    args = parser.parse_args()
+    configurar(activas=args.metricas)
+
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit_actual(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'procesadores': os.cpu_count(),
+        'escenarios': [],
+    }
+    os.makedirs(args.datos, exist_ok=True)
+    for n_usuarios in args.usuarios:
+        parametros = {
+            'n_usuarios': n_usuarios,
+            'n_hoteles': args.hoteles,
+            'valoraciones_por_usuario': args.valoraciones_por_usuario,
+            'semilla': args.semilla,
+        }
+        ruta = os.path.join(
+            args.datos, f"sinteticos_{n_usuarios}u_{args.hoteles}h_{args.valoraciones_por_usuario}v_s{args.semilla}.sqlite"
+        )
+        if not os.path.exists(ruta):
+            inicio = time.perf_counter()
+            # Las interacciones y reservas no las lee el modelo: no hace falta generarlas para medirlo
+            crear_base_sqlite(ruta, interacciones_por_usuario=0, reservas_por_usuario=0, **parametros)
+            print(f"Base sintética {ruta} generada en {time.perf_counter() - inicio:.1f} s")
+
+        REGISTRO.reiniciar()
+        escenario = medir_escenario(ruta, args.repeticiones, args.consultas, args.semilla)
+        escenario['parametros'] = parametros
+        if args.metricas:
+            escenario['metricas'] = {nombre: h.resumen() for nombre, h in sorted(REGISTRO.histogramas.items())}
+        informe['escenarios'].append(escenario)
+        print(
+            f"{n_usuarios} usuarios: carga {escenario['cargar_datos']['mediana_s']:.2f} s "
+            f"(pico {escenario['cargar_datos']['pico_memoria_mb']:.0f} MB, modelo {escenario['tamano_modelo_mb']:.0f} MB), "
+            f"por usuario p50 {escenario['recomendar_por_usuario']['p50_ms']:.2f} ms "
+            f"(en lote {escenario['recomendar_por_usuarios']['ms_por_usuario']:.3f} ms), "
+            f"por texto p50 {escenario['recomendar_por_caracteristicas']['p50_ms']:.2f} ms"
+        )
+
+    os.makedirs(args.salida, exist_ok=True)
+    ruta_informe = os.path.join(
+        args.salida, f"benchmark_{informe['commit'] or 'sin_commit'}_{datetime.now():%Y%m%d%H%M%S}.json"
+    )
+    with open(ruta_informe, "w", encoding="utf-8") as archivo:
+        json.dump(informe, archivo, indent=2, ensure_ascii=False)
+    print(f"Informe guardado en {ruta_informe}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            regresiones = comparar(informe, json.load(archivo))
+        if regresiones:
+            print(f"\n{len(regresiones)} métricas empeoraron más de un {UMBRAL_REGRESION - 1:.0%}")
+
+
+if __name__ == "__main__":
+    main()
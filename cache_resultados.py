@@ -0,0 +1,198 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from metricas import contar
+
+# Escrituras en disco entre cada poda de entradas caducadas o sobrantes
+PODA_CADA = 256
+
+
+class CacheResultados:
+    """Caché acotada (LRU) de resultados de recomendación, con caducidad y un respaldo opcional en SQLite
+
+    Cada entrada guarda la `marca` de los datos con que se calculó (por ejemplo, la marca de agua de
+    las valoraciones): obtener() descarta las entradas con una marca anterior a la `vigente_desde`
+    indicada, así se invalidan entradas concretas sin recorrer la caché. Con `ruta`, las entradas se
+    comparten entre procesos (varios trabajadores de Streamlit) a través de un archivo SQLite; la
+    memoria del proceso actúa como primer nivel. Es segura para usar desde varios hilos.
+    """
+
+    def __init__(self, capacidad=4096, ttl=600.0, ruta=None, capacidad_disco=None):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.ruta = ruta or None
+        self.capacidad_disco = capacidad_disco or capacidad * 10
+        self._datos = OrderedDict()
+        self._bloqueo = threading.Lock()
+        self.aciertos = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.caducados = 0
+        self.invalidados = 0
+        self._conexion = None
+        self._escrituras = 0
+        if self.ruta:
+            self._abrir_disco()
+
+    def _abrir_disco(self):
+        try:
+            self._conexion = sqlite3.connect(self.ruta, timeout=5, check_same_thread=False, isolation_level=None)
+            self._conexion.execute("PRAGMA journal_mode=WAL")
+            self._conexion.execute("PRAGMA synchronous=NORMAL")
+            self._conexion.execute(
+                "CREATE TABLE IF NOT EXISTS resultados ("
+                "clave TEXT PRIMARY KEY, marca TEXT, expira REAL, valor TEXT, acceso REAL)"
+            )
+            self._conexion.execute("CREATE INDEX IF NOT EXISTS idx_resultados_acceso ON resultados (acceso)")
+        except sqlite3.Error as e:
+            print(f"Error al abrir la caché en disco {self.ruta}: {e}")
+            self._conexion = None
+
+    @staticmethod
+    def _vigente(marca, vigente_desde):
+        return vigente_desde is None or (marca is not None and marca >= vigente_desde)
+
+    def obtener(self, clave, vigente_desde=None):
+        """Devuelve el valor guardado para la clave, o None si no está, caducó o es anterior a `vigente_desde`"""
+        ahora = time.time()
+        with self._bloqueo:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                expira, marca, valor = entrada
+                if expira is not None and expira <= ahora:
+                    del self._datos[clave]
+                    self.caducados += 1
+                elif not self._vigente(marca, vigente_desde):
+                    del self._datos[clave]
+                    self.invalidados += 1
+                else:
+                    self._datos.move_to_end(clave)
+                    self.aciertos += 1
+                    contar('cache_resultados_aciertos')
+                    return valor
+
+        entrada = self._leer_disco(clave, ahora)
+        if entrada is not None and self._vigente(entrada[1], vigente_desde):
+            with self._bloqueo:
+                self._guardar_memoria(clave, entrada)
+                self.aciertos += 1
+                self.aciertos_disco += 1
+            contar('cache_resultados_aciertos')
+            return entrada[2]
+        with self._bloqueo:
+            self.fallos += 1
+        contar('cache_resultados_fallos')
+        return None
+
+    def guardar(self, clave, valor, marca=None):
+        entrada = (None if self.ttl is None else time.time() + self.ttl, marca, valor)
+        with self._bloqueo:
+            self._guardar_memoria(clave, entrada)
+        self._escribir_disco(clave, entrada)
+
+    def _guardar_memoria(self, clave, entrada):
+        self._datos[clave] = entrada
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.capacidad:
+            self._datos.popitem(last=False)
+            self.desalojos += 1
+            contar('cache_resultados_desalojos')
+
+    def _leer_disco(self, clave, ahora):
+        if self._conexion is None:
+            return None
+        try:
+            with self._bloqueo:
+                fila = self._conexion.execute(
+                    "SELECT expira, marca, valor FROM resultados WHERE clave = ?", (json.dumps(clave),)
+                ).fetchone()
+                if fila is None:
+                    return None
+                if fila[0] is not None and fila[0] <= ahora:
+                    self.caducados += 1
+                    return None
+                self._conexion.execute(
+                    "UPDATE resultados SET acceso = ? WHERE clave = ?", (ahora, json.dumps(clave))
+                )
+        except sqlite3.Error as e:
+            print(f"Error al leer la caché en disco: {e}")
+            return None
+        marca = json.loads(fila[1])
+        valor = json.loads(fila[2])
+        # JSON no distingue tuplas de listas: se restauran para que las marcas sigan siendo comparables
+        return (
+            fila[0],
+            tuple(marca) if isinstance(marca, list) else marca,
+            tuple(tuple(elemento) if isinstance(elemento, list) else elemento for elemento in valor),
+        )
+
+    def _escribir_disco(self, clave, entrada):
+        if self._conexion is None:
+            return
+        expira, marca, valor = entrada
+        try:
+            with self._bloqueo:
+                self._conexion.execute(
+                    "INSERT OR REPLACE INTO resultados (clave, marca, expira, valor, acceso) VALUES (?, ?, ?, ?, ?)",
+                    (json.dumps(clave), json.dumps(marca), expira, json.dumps(valor), time.time())
+                )
+                self._escrituras += 1
+                if self._escrituras % PODA_CADA == 0:
+                    self._podar_disco()
+        except sqlite3.Error as e:
+            print(f"Error al escribir en la caché en disco: {e}")
+
+    def _podar_disco(self):
+        """Borra las entradas caducadas y las menos usadas por encima de la capacidad del disco"""
+        self._conexion.execute("DELETE FROM resultados WHERE expira <= ?", (time.time(),))
+        sobrantes = self._conexion.execute("SELECT COUNT(*) FROM resultados").fetchone()[0] - self.capacidad_disco
+        if sobrantes > 0:
+            self._conexion.execute(
+                "DELETE FROM resultados WHERE clave IN (SELECT clave FROM resultados ORDER BY acceso LIMIT ?)",
+                (sobrantes,)
+            )
+            self.desalojos += sobrantes
+
+    def vaciar(self):
+        """Borra todas las entradas (también las del disco compartido)"""
+        with self._bloqueo:
+            self._datos.clear()
+            if self._conexion is not None:
+                try:
+                    self._conexion.execute("DELETE FROM resultados")
+                except sqlite3.Error as e:
+                    print(f"Error al vaciar la caché en disco: {e}")
+
+    def __len__(self):
+        return len(self._datos)
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {
+            'entradas': len(self._datos),
+            'aciertos': self.aciertos,
+            'aciertos_disco': self.aciertos_disco,
+            'fallos': self.fallos,
+            'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+            'desalojos': self.desalojos,
+            'caducados': self.caducados,
+            'invalidados': self.invalidados,
+        }
+
+    def cerrar(self):
+        if self._conexion is not None:
+            with self._bloqueo:
+                self._conexion.close()
+                self._conexion = None
+
+    def __getstate__(self):
+        # El contenido en memoria y la conexión no se transfieren a otros procesos
+        return {
+            'capacidad': self.capacidad, 'ttl': self.ttl, 'ruta': self.ruta, 'capacidad_disco': self.capacidad_disco
+        }
+
+    def __setstate__(self, estado):
+        self.__init__(**estado)
@@ -0,0 +1,129 @@
+import threading
+import time
+from contextlib import contextmanager
+from mysql.connector import errors, pooling
+from config import DB_CONFIG, POOL_CONFIG
+
+# Pool compartido por la aplicación y el sistema de recomendación (se crea al primer uso)
+_pool = None
+_bloqueo_pool = threading.Lock()
+
+# Errores que indican una conexión caída o vencida por el servidor (wait_timeout, reinicio, red)
+ERRORES_CONEXION = (errors.OperationalError, errors.InterfaceError)
+
+
+def obtener_pool():
+    """Devuelve el pool de conexiones compartido, creándolo la primera vez"""
+    global _pool
+    if _pool is None:
+        with _bloqueo_pool:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=POOL_CONFIG['nombre'],
+                    pool_size=POOL_CONFIG['tamano'],
+                    pool_reset_session=True,
+                    autocommit=True,
+                    **DB_CONFIG
+                )
+    return _pool
+
+
+def _tomar_conexion():
+    """Toma una conexión del pool, esperando si está agotado y reconectando si está vencida"""
+    limite = time.monotonic() + POOL_CONFIG['espera_maxima']
+    espera = 0.005
+    while True:
+        try:
+            # El pool comprueba la conexión (ping) y reconecta si el servidor la cerró
+            return obtener_pool().get_connection()
+        except errors.PoolError:
+            if time.monotonic() >= limite:
+                raise
+            time.sleep(espera)
+            espera = min(espera * 2, 0.2)
+
+
+@contextmanager
+def conexion():
+    """Presta una conexión del pool y la devuelve al salir del bloque `with`"""
+    conn = _tomar_conexion()
+    try:
+        yield conn
+    finally:
+        # En una conexión del pool, close() la devuelve al pool en lugar de cerrarla
+        conn.close()
+
+
+def consultar(sql, parametros=None, diccionario=False):
+    """Ejecuta una consulta de lectura y devuelve todas las filas
+
+    Si la conexión prestada resulta estar caída, se reintenta una vez con otra conexión.
+    """
+    for intento in range(2):
+        try:
+            with conexion() as conn:
+                cursor = conn.cursor(dictionary=diccionario)
+                try:
+                    cursor.execute(sql, parametros)
+                    return cursor.fetchall()
+                finally:
+                    cursor.close()
+        except ERRORES_CONEXION:
+            if intento == 1:
+                raise
+
+
+def consultar_por_bloques(sql, parametros=None, tam_bloque=10000):
+    """Ejecuta una consulta de lectura y genera sus filas (tuplas) en bloques de hasta `tam_bloque`
+
+    Usa un cursor sin búfer: el servidor envía las filas a medida que se leen, así que nunca se
+    tiene en memoria más de un bloque del resultado. La conexión queda ocupada hasta agotar el generador.
+    """
+    with conexion() as conn:
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(sql, parametros)
+            while True:
+                filas = cursor.fetchmany(tam_bloque)
+                if not filas:
+                    break
+                yield filas
+        finally:
+            # Un resultado a medio leer dejaría inutilizable la conexión al devolverla al pool
+            if conn.unread_result:
+                conn.consume_results()
+            cursor.close()
+
+
+def ejecutar(sql, parametros=None):
+    """Ejecuta una sentencia de escritura, confirma la transacción y devuelve el número de filas afectadas"""
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, parametros)
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+
+def ejecutar_lote(sql, filas):
+    """Ejecuta una sentencia de escritura para todas las filas en una sola transacción (executemany)"""
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            # Para INSERT ... VALUES el conector agrupa las filas en una sola sentencia multi-fila
+            cursor.executemany(sql, filas)
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+
+def cerrar_pool():
+    """Cierra las conexiones libres del pool (por ejemplo, al terminar el proceso)"""
+    global _pool
+    with _bloqueo_pool:
+        if _pool is not None:
+            _pool._remove_connections()
+            _pool = None
@@ -15,6 +15,74 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME', 'sistema_hoteles_cartagena')
 }
 
+# Pool de conexiones compartido por la aplicación y el sistema de recomendación
+POOL_CONFIG = {
+    'nombre': os.getenv('DB_POOL_NOMBRE', 'sistema_hoteles'),
+    'tamano': int(os.getenv('DB_POOL_TAMANO', '10')),
+    # Segundos que se espera una conexión libre antes de fallar cuando el pool está agotado
+    'espera_maxima': float(os.getenv('DB_POOL_ESPERA', '5')),
+}
+
+# Segundos entre cada refresco incremental del modelo de recomendación (0 lo desactiva)
+INTERVALO_REFRESCO = float(os.getenv('MODELO_INTERVALO_REFRESCO', '5'))
+
+# Directorio del paquete del modelo entrenado, para arrancar sin reentrenar (vacío lo desactiva)
+DIR_MODELO = os.getenv('MODELO_DIRECTORIO', 'modelo_guardado')
+
+# Archivo .npz de precalcular_recomendaciones.py --destino archivo (vacío: se lee la tabla)
+ARCHIVO_PRECALCULADAS = os.getenv('PRECALCULADAS_ARCHIVO', '')
+
+# Búsqueda por texto: 'exacto' o 'ann' (índice aproximado para catálogos grandes)
+MODO_BUSQUEDA = os.getenv('MODELO_MODO_BUSQUEDA', 'exacto')
+PARAMETROS_ANN = {
+    'n_componentes': int(os.getenv('ANN_COMPONENTES', '128')),
+    'n_sondas': int(os.getenv('ANN_SONDAS', '8')),
+}
+
+# Recomendación por usuario: 'vecinos' (filtrado colaborativo) o 'als' (factorización con interacciones)
+MODO_RECOMENDACION = os.getenv('MODELO_MODO_RECOMENDACION', 'vecinos')
+PARAMETROS_ALS = {
+    'n_factores': int(os.getenv('ALS_FACTORES', '64')),
+    'iteraciones': int(os.getenv('ALS_ITERACIONES', '15')),
+    'regularizacion': float(os.getenv('ALS_REGULARIZACION', '0.1')),
+    'alfa': float(os.getenv('ALS_ALFA', '10')),
+}
+
+# Habitaciones por hotel: un hotel con tantas reservas activas en alguna noche no aparece para esas fechas
+CAPACIDAD_HOTEL = int(os.getenv('HOTEL_CAPACIDAD', '10'))
+
+# Registro de eventos de la interfaz (vistas, favoritos, búsquedas) en segundo plano
+REGISTRO_EVENTOS = {
+    # Eventos que caben en memoria a la espera de guardarse; con la cola llena se descartan
+    'capacidad': int(os.getenv('EVENTOS_CAPACIDAD', '10000')),
+    'tam_lote': int(os.getenv('EVENTOS_TAM_LOTE', '500')),
+    # Segundos máximos entre la llegada de un evento y su inserción
+    'intervalo': float(os.getenv('EVENTOS_INTERVALO', '1')),
+}
+
+# Caché de resultados de recomendación por usuario y por texto
+CACHE_RESULTADOS = {
+    'capacidad': int(os.getenv('CACHE_CAPACIDAD', '4096')),
+    # Segundos que una entrada sigue siendo válida aunque los datos no cambien
+    'ttl': float(os.getenv('CACHE_TTL', '600')),
+    # Archivo SQLite compartido entre procesos (varios trabajadores de Streamlit); vacío: solo en memoria
+    'ruta': os.getenv('CACHE_RUTA', ''),
+}
+
+# Instrumentación (histogramas de latencia y contadores); desactivada no añade un coste apreciable
+METRICAS = {
+    'activas': os.getenv('METRICAS_ACTIVAS', '0') == '1',
+    # Fracción de peticiones que se perfilan con cProfile (0 lo desactiva) y directorio de los .prof
+    'muestreo_perfil': float(os.getenv('METRICAS_MUESTREO_PERFIL', '0')),
+    'dir_perfiles': os.getenv('METRICAS_DIR_PERFILES', 'perfiles'),
+}
+# Volcado periódico de las métricas (archivos vacíos lo desactivan)
+EXPORTAR_METRICAS = {
+    'intervalo': float(os.getenv('METRICAS_INTERVALO', '60')),
+    'archivo_json': os.getenv('METRICAS_ARCHIVO_JSON', ''),
+    'archivo_prometheus': os.getenv('METRICAS_ARCHIVO_PROMETHEUS', ''),
+}
+
 # Verificar si las variables de entorno están configuradas
 if not all([DB_CONFIG['host'], DB_CONFIG['user'], DB_CONFIG['password'], DB_CONFIG['database']]):
     print("Advertencia: Algunas variables de entorno no están configuradas. Se usarán los valores por defecto.") 
\ No newline at end of file
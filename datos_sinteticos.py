@@ -0,0 +1,332 @@
+import argparse
+import os
+import sqlite3
+import time
+import numpy as np
+from conexion_bd import conexion
+
+# Uso:
+#   python datos_sinteticos.py datos.sqlite [--usuarios 10000] [--hoteles 1000] [--valoraciones-por-usuario 20]
+#   python datos_sinteticos.py --mysql ...        (inserta en la base de datos configurada en config.py)
+
+# Esquema de import_data.sql traducido a SQLite (las fechas se guardan como texto 'AAAA-MM-DD HH:MM:SS')
+ESQUEMA_SQLITE = """
+CREATE TABLE usuario (
+    id_usuario INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    edad INTEGER NOT NULL,
+    genero TEXT NOT NULL CHECK (genero IN ('F', 'M', 'Otro')),
+    fecha_registro TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE hoteles (
+    id_hotel INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    descripcion TEXT,
+    ubicacion TEXT,
+    categoria TEXT,
+    precio_promedio REAL,
+    imagen_url TEXT,
+    fecha_creacion TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE imagenes_hoteles (
+    id INTEGER PRIMARY KEY,
+    id_hotel INTEGER REFERENCES hoteles(id_hotel),
+    url_imagen TEXT
+);
+CREATE TABLE reservas (
+    id_reservas INTEGER PRIMARY KEY,
+    id_usuario INTEGER REFERENCES usuario(id_usuario),
+    id_hotel INTEGER REFERENCES hoteles(id_hotel),
+    fecha_entrada TEXT,
+    fecha_salida TEXT,
+    total_pago REAL,
+    estado TEXT DEFAULT 'pendiente',
+    fecha_reserva TEXT DEFAULT CURRENT_TIMESTAMP,
+    fecha_actualizacion TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TRIGGER reservas_actualizacion AFTER UPDATE ON reservas
+WHEN NEW.fecha_actualizacion = OLD.fecha_actualizacion
+BEGIN
+    UPDATE reservas SET fecha_actualizacion = CURRENT_TIMESTAMP WHERE id_reservas = NEW.id_reservas;
+END;
+CREATE TABLE valoraciones (
+    id_valoracion INTEGER PRIMARY KEY,
+    id_usuario INTEGER REFERENCES usuario(id_usuario),
+    id_hotel INTEGER REFERENCES hoteles(id_hotel),
+    puntuacion INTEGER CHECK (puntuacion BETWEEN 1 AND 5),
+    comentario TEXT,
+    fecha_valoracion TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE interacciones_usuario (
+    id INTEGER PRIMARY KEY,
+    id_usuario INTEGER REFERENCES usuario(id_usuario),
+    id_hotel INTEGER REFERENCES hoteles(id_hotel),
+    accion TEXT,
+    valor REAL DEFAULT 1.0,
+    fecha TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE busquedas_usuario (
+    id INTEGER PRIMARY KEY,
+    id_usuario INTEGER REFERENCES usuario(id_usuario),
+    tipo TEXT,
+    consulta TEXT,
+    n_resultados INTEGER,
+    fecha TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+INDICES_SQLITE = """
+CREATE INDEX idx_valoraciones_fecha ON valoraciones (fecha_valoracion, id_valoracion);
+CREATE INDEX idx_hoteles_fecha ON hoteles (fecha_creacion, id_hotel);
+CREATE INDEX idx_reservas_actualizacion ON reservas (fecha_actualizacion, id_reservas);
+CREATE INDEX idx_reservas_salida ON reservas (fecha_salida);
+"""
+
+ZONAS = (
+    "Bocagrande", "Centro Histórico", "Getsemaní", "Castillogrande", "El Laguito",
+    "Manga", "Crespo", "La Boquilla", "Marbella", "Pie de la Popa",
+)
+CATEGORIAS = ("3 estrellas", "4 estrellas", "5 estrellas")
+ESTILOS = ("boutique", "colonial", "moderno", "familiar", "romántico", "ejecutivo", "ecológico", "de lujo")
+SERVICIOS = (
+    "piscina", "spa", "gimnasio", "restaurante gourmet", "bar en la azotea", "vista al mar",
+    "playa privada", "wifi gratuito", "desayuno incluido", "parqueadero", "terraza", "jacuzzi",
+    "jardines tropicales", "centro de negocios", "admite mascotas", "traslado al aeropuerto",
+    "club de niños", "sauna", "cancha de tenis", "muelle privado",
+)
+ACCIONES = ("vista", "clic", "reserva", "calificacion")
+ESTADOS_RESERVA = ("pendiente", "confirmada", "cancelada", "completada")
+
+# Las fechas sintéticas empiezan aquí y avanzan con el id, así el orden (fecha, id) es el de inserción
+INICIO = np.datetime64("2023-01-01T00:00:00")
+
+
+def _fechas(segundos):
+    """Convierte segundos desde INICIO en texto 'AAAA-MM-DD HH:MM:SS'"""
+    return np.char.replace((INICIO + segundos.astype("timedelta64[s]")).astype(str), "T", " ")
+
+
+def _filas(*columnas):
+    """Transpone columnas NumPy en tuplas de valores Python, listas para executemany"""
+    return list(zip(*(columna.tolist() for columna in columnas)))
+
+
+def _popularidad(n_hoteles, rng, exponente=0.8):
+    """Probabilidad de elegir cada hotel: pocos hoteles muy populares y una cola larga (tipo Zipf)"""
+    rangos = rng.permutation(n_hoteles) + 1
+    pesos = 1.0 / rangos ** exponente
+    return pesos / pesos.sum()
+
+
+def generar_hoteles(n_hoteles, rng):
+    """Filas (id_hotel, nombre, descripcion, ubicacion, categoria, precio_promedio, imagen_url, fecha_creacion)"""
+    ids = np.arange(1, n_hoteles + 1)
+    estilos = rng.integers(len(ESTILOS), size=n_hoteles)
+    servicios = np.argsort(rng.random((n_hoteles, len(SERVICIOS))), axis=1)[:, :3]
+    zonas = rng.integers(len(ZONAS), size=n_hoteles)
+    categorias = rng.integers(len(CATEGORIAS), size=n_hoteles)
+    # El precio depende de la categoría, con ruido
+    precios = np.round((150000 + 250000 * categorias + rng.normal(0, 60000, n_hoteles)).clip(80000), -3)
+    descripciones = [
+        f"Hotel {ESTILOS[e]} en {ZONAS[z]} con {SERVICIOS[a]}, {SERVICIOS[b]} y {SERVICIOS[c]}."
+        for e, z, (a, b, c) in zip(estilos.tolist(), zonas.tolist(), servicios.tolist())
+    ]
+    return _filas(
+        ids,
+        np.char.add("Hotel sintético ", ids.astype(str)),
+        np.array(descripciones),
+        np.char.add(np.array(ZONAS)[zonas], ", Cartagena"),
+        np.array(CATEGORIAS)[categorias],
+        precios,
+        np.char.add(np.char.add("https://example.com/hoteles/", ids.astype(str)), ".jpg"),
+        _fechas(ids * 60),
+    )
+
+
+def generar_imagenes(n_hoteles, rng, por_hotel=2):
+    """Filas (id, id_hotel, url_imagen)"""
+    hoteles = np.repeat(np.arange(1, n_hoteles + 1), por_hotel)
+    ids = np.arange(1, len(hoteles) + 1)
+    return _filas(ids, hoteles, np.char.add(np.char.add("https://example.com/imagenes/", ids.astype(str)), ".jpg"))
+
+
+def generar_usuarios(n_usuarios, rng, tam_bloque=50000):
+    """Bloques de filas (id_usuario, nombre, email, password, edad, genero, fecha_registro)"""
+    for inicio in range(1, n_usuarios + 1, tam_bloque):
+        ids = np.arange(inicio, min(inicio + tam_bloque, n_usuarios + 1))
+        texto = ids.astype(str)
+        yield _filas(
+            ids,
+            np.char.add("Usuario ", texto),
+            np.char.add(np.char.add("usuario", texto), "@example.com"),
+            np.char.add("clave", texto),
+            rng.integers(18, 80, size=len(ids)),
+            np.array(("F", "M", "Otro"))[rng.choice(3, size=len(ids), p=(0.48, 0.48, 0.04))],
+            _fechas(ids),
+        )
+
+
+def _eventos(n_usuarios, n_hoteles, por_usuario, popularidad, rng, tam_bloque):
+    """Genera por bloques de usuarios los pares (usuario, hotel) de eventos, con ids consecutivos"""
+    siguiente_id = 1
+    for inicio in range(1, n_usuarios + 1, tam_bloque):
+        usuarios_bloque = np.arange(inicio, min(inicio + tam_bloque, n_usuarios + 1))
+        conteos = np.maximum(rng.poisson(por_usuario, size=len(usuarios_bloque)), 1)
+        usuarios = np.repeat(usuarios_bloque, conteos)
+        hoteles = rng.choice(n_hoteles, size=len(usuarios), p=popularidad) + 1
+        ids = np.arange(siguiente_id, siguiente_id + len(usuarios))
+        siguiente_id += len(usuarios)
+        yield ids, usuarios, hoteles
+
+
+def generar_valoraciones(n_usuarios, n_hoteles, por_usuario, popularidad, calidad, rng, tam_bloque=50000):
+    """Bloques de filas (id_valoracion, id_usuario, id_hotel, puntuacion, comentario, fecha_valoracion)"""
+    tam_bloque_usuarios = max(1, tam_bloque // max(por_usuario, 1))
+    # Calidad propia del hotel más un sesgo por usuario y ruido
+    sesgo = rng.normal(0, 0.5, size=n_usuarios + 1)
+    for ids, usuarios, hoteles in _eventos(n_usuarios, n_hoteles, por_usuario, popularidad, rng, tam_bloque_usuarios):
+        puntuaciones = np.rint(calidad[hoteles - 1] + sesgo[usuarios] + rng.normal(0, 0.7, len(ids))).clip(1, 5)
+        yield _filas(
+            ids, usuarios, hoteles, puntuaciones.astype(np.int64),
+            np.full(len(ids), None, dtype=object), _fechas(ids * 2 + 86400)
+        )
+
+
+def generar_interacciones(n_usuarios, n_hoteles, por_usuario, popularidad, rng, tam_bloque=50000):
+    """Bloques de filas (id, id_usuario, id_hotel, accion, valor, fecha)"""
+    tam_bloque_usuarios = max(1, tam_bloque // max(por_usuario, 1))
+    for ids, usuarios, hoteles in _eventos(n_usuarios, n_hoteles, por_usuario, popularidad, rng, tam_bloque_usuarios):
+        acciones = rng.choice(len(ACCIONES), size=len(ids), p=(0.6, 0.3, 0.05, 0.05))
+        yield _filas(
+            ids, usuarios, hoteles, np.array(ACCIONES)[acciones],
+            np.ones(len(ids)), _fechas(ids + 86400)
+        )
+
+
+def generar_reservas(n_usuarios, n_hoteles, por_usuario, popularidad, precios, rng, tam_bloque=50000):
+    """Bloques de filas (id_reservas, id_usuario, id_hotel, fecha_entrada, fecha_salida, total_pago, estado, fecha_reserva)"""
+    tam_bloque_usuarios = max(1, tam_bloque // max(por_usuario, 1))
+    for ids, usuarios, hoteles in _eventos(n_usuarios, n_hoteles, por_usuario, popularidad, rng, tam_bloque_usuarios):
+        entradas = INICIO.astype("datetime64[D]") + rng.integers(0, 730, size=len(ids))
+        noches = rng.integers(1, 8, size=len(ids))
+        yield _filas(
+            ids, usuarios, hoteles, entradas.astype(str), (entradas + noches).astype(str),
+            precios[hoteles - 1] * noches,
+            np.array(ESTADOS_RESERVA)[rng.integers(len(ESTADOS_RESERVA), size=len(ids))],
+            _fechas(ids * 3 + 86400),
+        )
+
+
+def generar_tablas(n_usuarios=1000, n_hoteles=500, valoraciones_por_usuario=20, interacciones_por_usuario=30,
+                   reservas_por_usuario=2, semilla=0, tam_bloque=50000):
+    """Genera por bloques las filas de todas las tablas: tuplas (tabla, columnas, filas)
+
+    Los datos son reproducibles para una misma semilla y no se tiene en memoria más de un bloque por tabla.
+    """
+    rng = np.random.default_rng(semilla)
+    hoteles = generar_hoteles(n_hoteles, rng)
+    yield "hoteles", (
+        "id_hotel", "nombre", "descripcion", "ubicacion", "categoria", "precio_promedio", "imagen_url", "fecha_creacion"
+    ), hoteles
+    yield "imagenes_hoteles", ("id", "id_hotel", "url_imagen"), generar_imagenes(n_hoteles, rng)
+    for filas in generar_usuarios(n_usuarios, rng, tam_bloque):
+        yield "usuario", ("id_usuario", "nombre", "email", "password", "edad", "genero", "fecha_registro"), filas
+
+    popularidad = _popularidad(n_hoteles, rng)
+    calidad = rng.normal(3.5, 0.8, size=n_hoteles)
+    precios = np.array([fila[5] for fila in hoteles])
+    for filas in generar_valoraciones(
+        n_usuarios, n_hoteles, valoraciones_por_usuario, popularidad, calidad, rng, tam_bloque
+    ):
+        yield "valoraciones", (
+            "id_valoracion", "id_usuario", "id_hotel", "puntuacion", "comentario", "fecha_valoracion"
+        ), filas
+    if interacciones_por_usuario:
+        for filas in generar_interacciones(
+            n_usuarios, n_hoteles, interacciones_por_usuario, popularidad, rng, tam_bloque
+        ):
+            yield "interacciones_usuario", ("id", "id_usuario", "id_hotel", "accion", "valor", "fecha"), filas
+    if reservas_por_usuario:
+        for filas in generar_reservas(n_usuarios, n_hoteles, reservas_por_usuario, popularidad, precios, rng, tam_bloque):
+            yield "reservas", (
+                "id_reservas", "id_usuario", "id_hotel", "fecha_entrada", "fecha_salida", "total_pago", "estado",
+                "fecha_reserva"
+            ), filas
+
+
+def crear_base_sqlite(ruta, **parametros):
+    """Crea (o reemplaza) una base SQLite sintética con el esquema de import_data.sql
+
+    Acepta los mismos parámetros que `generar_tablas`. Devuelve el número de filas por tabla.
+    """
+    if os.path.exists(ruta):
+        os.remove(ruta)
+    conteos = {}
+    conn = sqlite3.connect(ruta)
+    try:
+        # La base es desechable: sin diario ni sincronización la carga es mucho más rápida
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(ESQUEMA_SQLITE)
+        for tabla, columnas, filas in generar_tablas(**parametros):
+            marcadores = ", ".join("?" * len(columnas))
+            conn.executemany(f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({marcadores})", filas)
+            conteos[tabla] = conteos.get(tabla, 0) + len(filas)
+        # Los índices se crean al final: es más rápido que mantenerlos durante la carga
+        conn.executescript(INDICES_SQLITE)
+        conn.commit()
+    finally:
+        conn.close()
+    return conteos
+
+
+def cargar_en_mysql(**parametros):
+    """Inserta los datos sintéticos en la base MySQL configurada (cuyas tablas deben estar vacías)
+
+    Acepta los mismos parámetros que `generar_tablas`. Devuelve el número de filas por tabla.
+    """
+    conteos = {}
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            for tabla, columnas, filas in generar_tablas(**parametros):
+                marcadores = ", ".join(["%s"] * len(columnas))
+                cursor.executemany(f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({marcadores})", filas)
+                conn.commit()
+                conteos[tabla] = conteos.get(tabla, 0) + len(filas)
+        finally:
+            cursor.close()
+    return conteos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos con el esquema de import_data.sql")
+    parser.add_argument("ruta", nargs="?", default="datos_sinteticos.sqlite", help="archivo SQLite de destino")
+    parser.add_argument("--mysql", action="store_true", help="insertar en la base MySQL configurada")
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--hoteles", type=int, default=500)
+    parser.add_argument("--valoraciones-por-usuario", type=int, default=20)
+    parser.add_argument("--interacciones-por-usuario", type=int, default=30)
+    parser.add_argument("--reservas-por-usuario", type=int, default=2)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    parametros = {
+        'n_usuarios': args.usuarios,
+        'n_hoteles': args.hoteles,
+        'valoraciones_por_usuario': args.valoraciones_por_usuario,
+        'interacciones_por_usuario': args.interacciones_por_usuario,
+        'reservas_por_usuario': args.reservas_por_usuario,
+        'semilla': args.semilla,
+    }
+    inicio = time.perf_counter()
+    conteos = cargar_en_mysql(**parametros) if args.mysql else crear_base_sqlite(args.ruta, **parametros)
+    destino = "MySQL" if args.mysql else args.ruta
+    print(f"Datos generados en {destino} en {time.perf_counter() - inicio:.1f} s: "
+          + ", ".join(f"{tabla}={n}" for tabla, n in conteos.items()))
+
+
+if __name__ == "__main__":
+    main()
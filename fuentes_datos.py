@@ -0,0 +1,218 @@
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+import numpy as np
+from conexion_bd import cerrar_pool, consultar, consultar_por_bloques
+
+CONSULTA_HOTELES = """
+    SELECT h.*, GROUP_CONCAT(i.url_imagen) as imagenes
+    FROM hoteles h
+    LEFT JOIN imagenes_hoteles i ON h.id_hotel = i.id_hotel
+    WHERE (h.fecha_creacion IS NULL OR h.fecha_creacion < {corte}){filtro}
+    GROUP BY h.id_hotel
+    ORDER BY h.id_hotel
+"""
+
+CONSULTA_VALORACIONES = """
+    SELECT id_valoracion, id_usuario, id_hotel, puntuacion, fecha_valoracion
+    FROM valoraciones
+    WHERE (fecha_valoracion IS NULL OR fecha_valoracion < {corte}){filtro}
+    ORDER BY fecha_valoracion, id_valoracion
+"""
+
+# Reservas para el índice de disponibilidad; fecha_actualizacion cambia también al cancelarlas
+CONSULTA_RESERVAS = """
+    SELECT id_reservas, id_hotel, fecha_entrada, fecha_salida, estado, fecha_actualizacion
+    FROM reservas
+    WHERE (fecha_actualizacion IS NULL OR fecha_actualizacion < {corte}){filtro}
+    ORDER BY fecha_actualizacion, id_reservas
+"""
+
+# Señales implícitas para el modelo ALS (las filas sin usuario u hotel no aportan nada)
+CONSULTA_INTERACCIONES = """
+    SELECT id_usuario, id_hotel, accion, valor
+    FROM interacciones_usuario
+    WHERE id_usuario IS NOT NULL AND id_hotel IS NOT NULL
+"""
+
+# Recomendaciones calculadas fuera de línea por precalcular_recomendaciones.py
+CONSULTA_PRECALCULADAS = """
+    SELECT id_hotel, puntuacion
+    FROM recomendaciones_precalculadas
+    WHERE id_usuario = %s
+    ORDER BY posicion
+"""
+
+# Filtros por marca de agua (fecha, id) para leer solo las filas nuevas
+FILTRO_HOTELES = " AND (h.fecha_creacion > %s OR (h.fecha_creacion = %s AND h.id_hotel > %s))"
+FILTRO_VALORACIONES = " AND (fecha_valoracion > %s OR (fecha_valoracion = %s AND id_valoracion > %s))"
+FILTRO_RESERVAS = " AND (fecha_actualizacion > %s OR (fecha_actualizacion = %s AND id_reservas > %s))"
+# En la carga completa solo interesan las reservas activas que aún no han terminado
+FILTRO_RESERVAS_ACTIVAS = " AND estado IN ('pendiente', 'confirmada') AND fecha_salida > %s"
+
+# Las fechas se asignan al insertar pero las filas se ven al confirmar la transacción: una fila del
+# mismo segundo que la marca de agua y con un id menor puede aparecer después de que la marca la
+# haya pasado, y no se leería nunca. Por eso solo se leen las filas con fecha anterior al reloj de
+# la base de datos menos este margen (segundos), que debe superar la duración de las transacciones
+# que insertan; las más recientes se leen en el refresco siguiente.
+MARGEN_MARCA = 2
+CORTE = "NOW() - INTERVAL %s SECOND"
+
+
+class FuenteMySQL:
+    """Fuente de datos del modelo: la base de datos MySQL, a través del pool compartido de conexion_bd
+
+    Otras fuentes (por ejemplo FuenteSQLite) implementan los mismos métodos de lectura. Con
+    `archivo_precalculadas`, las recomendaciones precalculadas se leen del .npz que escribe
+    precalcular_recomendaciones.py --destino archivo en lugar de la tabla.
+    """
+
+    def __init__(self, margen_marca=MARGEN_MARCA, archivo_precalculadas=None):
+        self.margen_marca = margen_marca
+        self.archivo_precalculadas = archivo_precalculadas
+        # (mtime, ids_usuarios, ids_hoteles, puntuaciones) del archivo cargado
+        self._precalculadas = None
+        self._bloqueo_precalculadas = threading.Lock()
+
+    def _consultar(self, sql, parametros=None, diccionario=False):
+        return consultar(sql, parametros, diccionario=diccionario)
+
+    def _consultar_por_bloques(self, sql, parametros=None, tam_bloque=10000):
+        return consultar_por_bloques(sql, parametros, tam_bloque)
+
+    def _consulta(self, plantilla, filtro, parametros=()):
+        """Consulta con el corte por el reloj de la base de datos y el filtro indicado, y sus parámetros"""
+        return plantilla.format(corte=CORTE, filtro=filtro), (self.margen_marca, *parametros)
+
+    def leer_hoteles(self, marca=None):
+        """Filas (diccionarios) de los hoteles, o solo de los creados después de la marca de agua"""
+        if marca is None:
+            return self._consultar(*self._consulta(CONSULTA_HOTELES, ""), diccionario=True)
+        return self._consultar(
+            *self._consulta(CONSULTA_HOTELES, FILTRO_HOTELES, (marca[0], marca[0], marca[1])), diccionario=True
+        )
+
+    def leer_valoraciones(self, marca=None, tam_bloque=10000):
+        """Bloques de tuplas (id_valoracion, id_usuario, id_hotel, puntuacion, fecha), ordenados por (fecha, id)"""
+        if marca is None:
+            return self._consultar_por_bloques(*self._consulta(CONSULTA_VALORACIONES, ""), tam_bloque=tam_bloque)
+        return self._consultar_por_bloques(
+            *self._consulta(CONSULTA_VALORACIONES, FILTRO_VALORACIONES, (marca[0], marca[0], marca[1])), tam_bloque
+        )
+
+    def leer_reservas(self, marca=None, desde=None):
+        """Filas (diccionarios) de las reservas activas que terminan después de `desde`, o de todas las
+        modificadas después de la marca de agua (también las canceladas, para quitarlas del índice)"""
+        if marca is None:
+            return self._consultar(
+                *self._consulta(CONSULTA_RESERVAS, FILTRO_RESERVAS_ACTIVAS, (desde or date.today(),)),
+                diccionario=True
+            )
+        return self._consultar(
+            *self._consulta(CONSULTA_RESERVAS, FILTRO_RESERVAS, (marca[0], marca[0], marca[1])), diccionario=True
+        )
+
+    def leer_interacciones(self, tam_bloque=10000):
+        """Bloques de tuplas (id_usuario, id_hotel, accion, valor) de todas las interacciones"""
+        return self._consultar_por_bloques(CONSULTA_INTERACCIONES, tam_bloque=tam_bloque)
+
+    def leer_precalculadas(self, id_usuario):
+        """Tuplas (id_hotel, puntuacion) precalculadas para el usuario, en orden"""
+        if self.archivo_precalculadas:
+            return self._leer_precalculadas_archivo(int(id_usuario))
+        return self._consultar(CONSULTA_PRECALCULADAS, (int(id_usuario),))
+
+    def _cargar_precalculadas(self):
+        """Arreglos del archivo .npz, recargados cuando el archivo cambia; None si no existe"""
+        try:
+            mtime = os.stat(self.archivo_precalculadas).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cargadas = self._precalculadas
+        if cargadas is not None and cargadas[0] == mtime:
+            return cargadas
+        with self._bloqueo_precalculadas:
+            cargadas = self._precalculadas
+            if cargadas is None or cargadas[0] != mtime:
+                with np.load(self.archivo_precalculadas) as datos:
+                    cargadas = (mtime, datos['ids_usuarios'], datos['ids_hoteles'], datos['puntuaciones'])
+                self._precalculadas = cargadas
+        return cargadas
+
+    def _leer_precalculadas_archivo(self, id_usuario):
+        cargadas = self._cargar_precalculadas()
+        if cargadas is None:
+            return []
+        _, ids_usuarios, ids_hoteles, puntuaciones = cargadas
+        # ids_usuarios viene ordenado del modelo; las posiciones sin hotel valen -1
+        fila = np.searchsorted(ids_usuarios, id_usuario)
+        if fila >= len(ids_usuarios) or ids_usuarios[fila] != id_usuario:
+            return []
+        validos = ids_hoteles[fila] >= 0
+        return list(zip(ids_hoteles[fila][validos].tolist(), puntuaciones[fila][validos].tolist()))
+
+    def cerrar(self):
+        cerrar_pool()
+
+
+class FuenteSQLite(FuenteMySQL):
+    """Las mismas consultas sobre un archivo SQLite con el esquema de import_data.sql
+
+    Sirve para pruebas y benchmarks sin un servidor MySQL (ver datos_sinteticos.py). Cada lectura
+    abre su propia conexión, así que se puede usar desde varios hilos.
+    """
+
+    def __init__(self, ruta, margen_marca=MARGEN_MARCA, archivo_precalculadas=None):
+        super().__init__(margen_marca, archivo_precalculadas)
+        self.ruta = ruta
+
+    @staticmethod
+    def _traducir(sql, parametros):
+        # SQLite usa '?' como marcador y guarda las fechas como texto 'AAAA-MM-DD HH:MM:SS' (en UTC,
+        # como CURRENT_TIMESTAMP y datetime('now'))
+        sql = sql.replace(CORTE, "datetime('now', '-' || %s || ' seconds')")
+        if parametros is not None:
+            parametros = tuple(
+                p.isoformat(" ") if isinstance(p, datetime) else p.isoformat() if isinstance(p, date) else p
+                for p in parametros
+            )
+        return sql.replace("%s", "?"), parametros or ()
+
+    def _conectar(self, diccionario=False):
+        conn = sqlite3.connect(self.ruta)
+        if diccionario:
+            conn.row_factory = sqlite3.Row
+        return conn
+
+    def _consultar(self, sql, parametros=None, diccionario=False):
+        sql, parametros = self._traducir(sql, parametros)
+        conn = self._conectar(diccionario)
+        try:
+            filas = conn.execute(sql, parametros).fetchall()
+        finally:
+            conn.close()
+        return [dict(fila) for fila in filas] if diccionario else filas
+
+    def _consultar_por_bloques(self, sql, parametros=None, tam_bloque=10000):
+        sql, parametros = self._traducir(sql, parametros)
+        conn = self._conectar()
+        try:
+            cursor = conn.execute(sql, parametros)
+            while True:
+                filas = cursor.fetchmany(tam_bloque)
+                if not filas:
+                    break
+                yield filas
+        finally:
+            conn.close()
+
+    def leer_precalculadas(self, id_usuario):
+        try:
+            return super().leer_precalculadas(id_usuario)
+        except sqlite3.OperationalError:
+            # La tabla solo existe si se ejecutó precalcular_recomendaciones.py contra esta base
+            return []
+
+    def cerrar(self):
+        pass
@@ -1,4 +1,7 @@
 -- Eliminar tablas si existen
+DROP TABLE IF EXISTS importacion_progreso;
+DROP TABLE IF EXISTS recomendaciones_precalculadas;
+DROP TABLE IF EXISTS busquedas_usuario;
 DROP TABLE IF EXISTS interacciones_usuario;
 DROP TABLE IF EXISTS valoraciones;
 DROP TABLE IF EXISTS reservas;
@@ -47,6 +50,8 @@ CREATE TABLE reservas (
     total_pago DECIMAL(10, 2),
     estado VARCHAR(50) DEFAULT 'pendiente',
     fecha_reserva DATETIME DEFAULT CURRENT_TIMESTAMP,
+    -- Marca de agua del índice de disponibilidad del modelo: cambia con cada modificación (p. ej. al cancelar)
+    fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (id_usuario) REFERENCES usuario(id_usuario),
     FOREIGN KEY (id_hotel) REFERENCES hoteles(id_hotel)
 );
@@ -68,13 +73,49 @@ CREATE TABLE interacciones_usuario (
     id INT AUTO_INCREMENT PRIMARY KEY,
     id_usuario INT,
     id_hotel INT,
-    accion VARCHAR(50),  -- vista, clic, reserva, calificacion
+    accion VARCHAR(50),  -- vista, clic, favorito, reserva, calificacion
     valor FLOAT DEFAULT 1.0,
     fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (id_usuario) REFERENCES usuario(id_usuario), -- Corregido: REFERENCES usuario(id_usuario)
     FOREIGN KEY (id_hotel) REFERENCES hoteles(id_hotel)
 );
 
+-- TABLA DE BÚSQUEDAS Y PETICIONES DE RECOMENDACIONES (LA LLENA registro_eventos.py)
+CREATE TABLE busquedas_usuario (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    id_usuario INT,
+    tipo VARCHAR(30),  -- caracteristicas, recomendaciones
+    consulta TEXT,
+    n_resultados INT,
+    fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (id_usuario) REFERENCES usuario(id_usuario)
+);
+
+-- TABLA DE RECOMENDACIONES PRECALCULADAS (LA LLENA precalcular_recomendaciones.py)
+CREATE TABLE recomendaciones_precalculadas (
+    id_usuario INT NOT NULL,
+    posicion SMALLINT NOT NULL,
+    id_hotel INT NOT NULL,
+    puntuacion FLOAT NOT NULL,
+    fecha_calculo TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id_usuario, posicion)
+);
+
+-- PROGRESO DE LAS IMPORTACIONES MASIVAS (LA LLENA importar_datos.py, PARA REANUDARLAS)
+CREATE TABLE importacion_progreso (
+    fuente VARCHAR(500) PRIMARY KEY,
+    huella VARCHAR(100) NOT NULL,
+    filas BIGINT NOT NULL,
+    completado BOOLEAN NOT NULL DEFAULT FALSE,
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ÍNDICES PARA EL REFRESCO INCREMENTAL DEL MODELO (lecturas por marca de agua)
+CREATE INDEX idx_valoraciones_fecha ON valoraciones (fecha_valoracion, id_valoracion);
+CREATE INDEX idx_hoteles_fecha ON hoteles (fecha_creacion, id_hotel);
+CREATE INDEX idx_reservas_actualizacion ON reservas (fecha_actualizacion, id_reservas);
+CREATE INDEX idx_reservas_salida ON reservas (fecha_salida);
+
 -- Inserción de hoteles en la tabla 'hoteles'
 INSERT INTO hoteles (nombre, descripcion, ubicacion, imagen_url, precio_promedio, categoria) VALUES
 ('Sofitel Legend Santa Clara Cartagena', 'Hotel de lujo ubicado en un convento restaurado del siglo XVII.', 'Centro Histórico, Cartagena', 'https://www.sofitel-legend-santa-clara.com/images/hotel.jpg', 950000, '5 estrellas'),
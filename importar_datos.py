@@ -0,0 +1,428 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import pandas as pd
+import mysql.connector
+from config import DB_CONFIG, DIR_MODELO, MODO_BUSQUEDA, MODO_RECOMENDACION, PARAMETROS_ALS, PARAMETROS_ANN
+from datos_sinteticos import ESQUEMA_SQLITE
+from fuentes_datos import FuenteSQLite
+from modelo_recomendacion import SistemaRecomendacion
+
+# Uso:
+#   python importar_datos.py datos/ [valoraciones_2024.parquet ...] [--sqlite destino.sqlite]
+#                            [--metodo executemany|load-data] [--filas-por-transaccion 50000]
+#                            [--mantener-indices] [--reiniciar] [--reconstruir-modelo]
+#
+# Cada archivo CSV (con encabezado) o Parquet se carga en la tabla de su nombre: `valoraciones.csv`,
+# `valoraciones.2024.parquet` o `valoraciones/parte-0001.parquet` van a `valoraciones`. El esquema
+# se crea antes con import_data.sql (en SQLite, se crea si falta).
+
+# Tablas que se pueden importar, en orden de carga (primero las referenciadas por claves foráneas)
+TABLAS = {
+    'usuario': ("id_usuario", "nombre", "email", "password", "edad", "genero", "fecha_registro"),
+    'hoteles': (
+        "id_hotel", "nombre", "descripcion", "ubicacion", "categoria", "precio_promedio", "imagen_url",
+        "fecha_creacion"
+    ),
+    'imagenes_hoteles': ("id", "id_hotel", "url_imagen"),
+    'reservas': (
+        "id_reservas", "id_usuario", "id_hotel", "fecha_entrada", "fecha_salida", "total_pago", "estado",
+        "fecha_reserva", "fecha_actualizacion"
+    ),
+    'valoraciones': ("id_valoracion", "id_usuario", "id_hotel", "puntuacion", "comentario", "fecha_valoracion"),
+    'interacciones_usuario': ("id", "id_usuario", "id_hotel", "accion", "valor", "fecha"),
+    'busquedas_usuario': ("id", "id_usuario", "tipo", "consulta", "n_resultados", "fecha"),
+}
+
+# Índices secundarios de import_data.sql que se quitan durante la carga y se construyen al final
+INDICES_DIFERIDOS = {
+    'valoraciones': (("idx_valoraciones_fecha", "fecha_valoracion, id_valoracion"),),
+    'hoteles': (("idx_hoteles_fecha", "fecha_creacion, id_hotel"),),
+    'reservas': (
+        ("idx_reservas_actualizacion", "fecha_actualizacion, id_reservas"),
+        ("idx_reservas_salida", "fecha_salida"),
+    ),
+}
+
+# Progreso de cada archivo importado; se actualiza en la misma transacción que sus filas
+TABLA_PROGRESO = "importacion_progreso"
+
+DEFINICION_PROGRESO = """
+    CREATE TABLE IF NOT EXISTS {tabla} (
+        fuente VARCHAR(500) PRIMARY KEY,
+        huella VARCHAR(100) NOT NULL,
+        filas BIGINT NOT NULL,
+        completado BOOLEAN NOT NULL DEFAULT FALSE,
+        fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+EXTENSIONES = (".csv", ".parquet")
+
+# Filas por sentencia INSERT multi-fila, para no superar max_allowed_packet
+TAM_LOTE = 5000
+
+
+def tabla_de_archivo(ruta):
+    """Tabla de destino de un archivo: su nombre hasta el primer punto, o el de su directorio"""
+    nombre = os.path.basename(ruta).split(".")[0]
+    if nombre not in TABLAS:
+        nombre = os.path.basename(os.path.dirname(os.path.abspath(ruta)))
+    if nombre not in TABLAS:
+        raise ValueError(f"No se reconoce la tabla de {ruta} (tablas: {', '.join(TABLAS)})")
+    return nombre
+
+
+def buscar_fuentes(rutas):
+    """Lista (tabla, ruta) de los archivos indicados o contenidos en los directorios, en orden de carga"""
+    archivos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            for raiz, _, nombres in os.walk(ruta):
+                archivos += [os.path.join(raiz, nombre) for nombre in nombres if nombre.endswith(EXTENSIONES)]
+        elif ruta.endswith(EXTENSIONES):
+            archivos.append(ruta)
+        else:
+            raise ValueError(f"Formato no soportado: {ruta} (se esperan archivos {' o '.join(EXTENSIONES)})")
+    orden = list(TABLAS)
+    fuentes = [(tabla_de_archivo(archivo), archivo) for archivo in archivos]
+    return sorted(fuentes, key=lambda fuente: (orden.index(fuente[0]), fuente[1]))
+
+
+def huella(ruta):
+    """Tamaño y fecha de modificación: si cambian, el progreso guardado del archivo ya no vale"""
+    estado = os.stat(ruta)
+    return f"{estado.st_size}:{int(estado.st_mtime)}"
+
+
+def _validar_columnas(tabla, columnas, ruta):
+    desconocidas = [columna for columna in columnas if columna not in TABLAS[tabla]]
+    if desconocidas:
+        raise ValueError(f"{ruta}: columnas que no existen en {tabla}: {', '.join(desconocidas)}")
+    return tuple(columnas)
+
+
+def leer_csv(ruta, tabla, tam_bloque, saltar=0):
+    """Genera bloques (columnas, filas) de un CSV con encabezado; las celdas vacías son NULL
+
+    Los valores se leen como texto y la base de datos los convierte al tipo de cada columna, así
+    los enteros con valores nulos no pasan por float. Las primeras `saltar` filas se descartan.
+    """
+    lector = pd.read_csv(ruta, dtype=str, keep_default_na=False, na_values=[""], chunksize=tam_bloque)
+    for bloque in lector:
+        columnas = _validar_columnas(tabla, bloque.columns, ruta)
+        if saltar >= len(bloque):
+            saltar -= len(bloque)
+            continue
+        bloque = bloque.iloc[saltar:]
+        saltar = 0
+        filas = bloque.astype(object).where(bloque.notna(), None)
+        yield columnas, list(filas.itertuples(index=False, name=None))
+
+
+def leer_parquet(ruta, tabla, tam_bloque, saltar=0):
+    """Genera bloques (columnas, filas) de un archivo Parquet (requiere pyarrow)
+
+    Los grupos de filas ya importados se saltan con los metadatos, sin leerlos.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Para importar archivos Parquet hay que instalar pyarrow (pip install pyarrow)")
+    archivo = pq.ParquetFile(ruta)
+    columnas = _validar_columnas(tabla, archivo.schema_arrow.names, ruta)
+    grupos = []
+    for grupo in range(archivo.num_row_groups):
+        filas_grupo = archivo.metadata.row_group(grupo).num_rows
+        if saltar >= filas_grupo and not grupos:
+            saltar -= filas_grupo
+        else:
+            grupos.append(grupo)
+    if not grupos:
+        return
+    for lote in archivo.iter_batches(batch_size=tam_bloque, row_groups=grupos):
+        if saltar >= lote.num_rows:
+            saltar -= lote.num_rows
+            continue
+        lote = lote.slice(saltar)
+        saltar = 0
+        yield columnas, list(zip(*(lote.column(i).to_pylist() for i in range(lote.num_columns))))
+
+
+def leer_bloques(ruta, tabla, tam_bloque, saltar=0):
+    lector = leer_parquet if ruta.endswith(".parquet") else leer_csv
+    return lector(ruta, tabla, tam_bloque, saltar)
+
+
+def _escapar(valor):
+    """Valor en el formato por defecto de LOAD DATA (campos separados por tabuladores, escapes con \\)"""
+    if valor is None:
+        return "\\N"
+    if isinstance(valor, bool):
+        return "1" if valor else "0"
+    return str(valor).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+class DestinoMySQL:
+    """Destino de la importación: la base MySQL configurada, con una conexión propia (fuera del pool)
+
+    Las comprobaciones de claves foráneas y de unicidad se desactivan en la sesión durante la carga:
+    los archivos deben ser consistentes (por ejemplo, exportados de otra base con el mismo esquema).
+    """
+    marcador = "%s"
+
+    def __init__(self, metodo='executemany', tam_lote=TAM_LOTE):
+        self.metodo = metodo
+        self.tam_lote = tam_lote
+        self.conn = mysql.connector.connect(
+            **DB_CONFIG, autocommit=False, allow_local_infile=metodo == 'load-data'
+        )
+        self.cursor = self.conn.cursor()
+        self.cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+        self.cursor.execute(DEFINICION_PROGRESO.format(tabla=TABLA_PROGRESO))
+        self.conn.commit()
+
+    def progreso(self, fuente):
+        """(huella, filas, completado) guardados de un archivo, o None si no se empezó a importar"""
+        self.cursor.execute(
+            f"SELECT huella, filas, completado FROM {TABLA_PROGRESO} WHERE fuente = {self.marcador}", (fuente,)
+        )
+        fila = self.cursor.fetchone()
+        return None if fila is None else (fila[0], int(fila[1]), bool(fila[2]))
+
+    def olvidar_progreso(self, fuente):
+        self.cursor.execute(f"DELETE FROM {TABLA_PROGRESO} WHERE fuente = {self.marcador}", (fuente,))
+        self.conn.commit()
+
+    def indices(self, tabla):
+        self.cursor.execute(
+            "SELECT DISTINCT index_name FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = %s", (tabla,)
+        )
+        return {fila[0] for fila in self.cursor.fetchall()}
+
+    def quitar_indice(self, tabla, nombre):
+        self.cursor.execute(f"ALTER TABLE {tabla} DROP INDEX {nombre}")
+
+    def crear_indice(self, tabla, nombre, columnas):
+        self.cursor.execute(f"CREATE INDEX {nombre} ON {tabla} ({columnas})")
+
+    def insertar(self, tabla, columnas, filas):
+        if self.metodo == 'load-data':
+            self._cargar_archivo(tabla, columnas, filas)
+            return
+        marcadores = ", ".join([self.marcador] * len(columnas))
+        sentencia = f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({marcadores})"
+        for inicio in range(0, len(filas), self.tam_lote):
+            # Para INSERT ... VALUES el conector agrupa el lote en una sola sentencia multi-fila
+            self.cursor.executemany(sentencia, filas[inicio:inicio + self.tam_lote])
+
+    def _cargar_archivo(self, tabla, columnas, filas):
+        """Carga el bloque con LOAD DATA LOCAL INFILE a través de un archivo temporal"""
+        descriptor, ruta = tempfile.mkstemp(suffix=".tsv", prefix=f"importar_{tabla}_")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8", newline="\n") as archivo:
+                for fila in filas:
+                    archivo.write("\t".join(_escapar(valor) for valor in fila) + "\n")
+            self.cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {tabla} CHARACTER SET utf8mb4 ({', '.join(columnas)})",
+                (ruta,)
+            )
+        finally:
+            os.remove(ruta)
+
+    def guardar_progreso(self, fuente, huella_fuente, filas, completado=False):
+        """Registra el progreso del archivo y confirma la transacción junto con sus filas"""
+        self.cursor.execute(
+            f"REPLACE INTO {TABLA_PROGRESO} (fuente, huella, filas, completado) "
+            f"VALUES ({self.marcador}, {self.marcador}, {self.marcador}, {self.marcador})",
+            (fuente, huella_fuente, filas, completado)
+        )
+        self.conn.commit()
+
+    def confirmar(self):
+        self.conn.commit()
+
+    def deshacer(self):
+        self.conn.rollback()
+
+    def cerrar(self):
+        self.cursor.close()
+        self.conn.close()
+
+
+class DestinoSQLite(DestinoMySQL):
+    """La misma importación sobre un archivo SQLite con el esquema de import_data.sql (se crea si falta)"""
+    marcador = "?"
+
+    def __init__(self, ruta, tam_lote=TAM_LOTE):
+        self.metodo = 'executemany'
+        self.tam_lote = tam_lote
+        self.conn = sqlite3.connect(ruta)
+        self.cursor = self.conn.cursor()
+        existe = self.cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'hoteles'"
+        ).fetchone()
+        if existe is None:
+            self.conn.executescript(ESQUEMA_SQLITE)
+        self.cursor.execute(DEFINICION_PROGRESO.format(tabla=TABLA_PROGRESO))
+        self.conn.commit()
+
+    def indices(self, tabla):
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (tabla,))
+        return {fila[0] for fila in self.cursor.fetchall()}
+
+    def quitar_indice(self, tabla, nombre):
+        self.cursor.execute(f"DROP INDEX {nombre}")
+
+
+def importar(destino, fuentes, filas_por_transaccion=50000, diferir_indices=True, reiniciar=False):
+    """Importa los archivos (tabla, ruta) en el destino, por bloques y en transacciones acotadas
+
+    Cada bloque de `filas_por_transaccion` filas se confirma junto con el progreso del archivo, así
+    una importación interrumpida se reanuda en el primer bloque sin confirmar. Los índices
+    secundarios de cada tabla se quitan antes de cargarla y se construyen al terminar (una sola
+    construcción ordenada es mucho más rápida que mantenerlos fila a fila); si todos sus archivos
+    ya estaban importados, no se tocan. Devuelve las filas importadas por tabla.
+    """
+    conteos = {}
+    inicio_total = time.perf_counter()
+    tablas = list(dict.fromkeys(tabla for tabla, _ in fuentes))
+    for tabla in tablas:
+        archivos = []
+        for tabla_fuente, ruta in fuentes:
+            if tabla_fuente != tabla:
+                continue
+            fuente = os.path.abspath(ruta)
+            huella_fuente = huella(ruta)
+            guardado = destino.progreso(fuente)
+            if guardado is not None and reiniciar:
+                destino.olvidar_progreso(fuente)
+                guardado = None
+            if guardado is not None and guardado[0] != huella_fuente:
+                raise ValueError(
+                    f"{ruta} cambió desde la importación anterior: usa --reiniciar para importarlo desde el principio"
+                )
+            archivos.append((ruta, fuente, huella_fuente, guardado))
+
+        # Si todos los archivos de la tabla ya están importados, sus índices se dejan como están
+        pendiente = any(guardado is None or not guardado[2] for *_, guardado in archivos)
+        indices = [
+            (nombre, columnas) for nombre, columnas in INDICES_DIFERIDOS.get(tabla, ()) if diferir_indices
+        ]
+        if pendiente:
+            existentes = destino.indices(tabla)
+            for nombre, _ in indices:
+                if nombre in existentes:
+                    destino.quitar_indice(tabla, nombre)
+
+        for ruta, fuente, huella_fuente, guardado in archivos:
+            hechas = 0 if guardado is None else guardado[1]
+            if guardado is not None and guardado[2]:
+                print(f"{ruta}: ya importado ({hechas} filas)")
+                continue
+            if hechas:
+                print(f"{ruta}: se reanuda después de la fila {hechas}")
+
+            inicio = time.perf_counter()
+            nuevas = 0
+            for columnas, filas in leer_bloques(ruta, tabla, filas_por_transaccion, saltar=hechas):
+                try:
+                    destino.insertar(tabla, columnas, filas)
+                    destino.guardar_progreso(fuente, huella_fuente, hechas + nuevas + len(filas))
+                except Exception:
+                    destino.deshacer()
+                    raise
+                nuevas += len(filas)
+                duracion = time.perf_counter() - inicio
+                print(f"{ruta}: {hechas + nuevas} filas ({nuevas / max(duracion, 1e-9):,.0f} filas/s)")
+            destino.guardar_progreso(fuente, huella_fuente, hechas + nuevas, completado=True)
+            conteos[tabla] = conteos.get(tabla, 0) + nuevas
+
+        # Se construyen los que faltan, también los que quitó una importación interrumpida antes de este paso
+        existentes = destino.indices(tabla) if indices else ()
+        faltantes = [(nombre, columnas) for nombre, columnas in indices if nombre not in existentes]
+        if faltantes:
+            inicio = time.perf_counter()
+            for nombre, columnas in faltantes:
+                destino.crear_indice(tabla, nombre, columnas)
+            destino.confirmar()
+            print(f"Índices de {tabla} construidos en {time.perf_counter() - inicio:.1f} s")
+
+    duracion = time.perf_counter() - inicio_total
+    total = sum(conteos.values())
+    print(f"Importadas {total} filas en {duracion:.1f} s ({total / max(duracion, 1e-9):,.0f} filas/s)"
+          + "".join(f", {tabla}={n}" for tabla, n in conteos.items()))
+    return conteos
+
+
+def reconstruir_modelo(directorio, ruta_sqlite=None):
+    """Entrena el modelo desde cero con los datos importados y guarda su paquete en disco
+
+    Un refresco incremental no basta: las filas importadas pueden ser anteriores a la marca de agua
+    del paquete guardado.
+    """
+    inicio = time.perf_counter()
+    # Los mismos parámetros que la aplicación, para que ambas compartan el paquete del modelo
+    sistema = SistemaRecomendacion(
+        modo_busqueda=MODO_BUSQUEDA, parametros_ann=PARAMETROS_ANN,
+        modo_recomendacion=MODO_RECOMENDACION, parametros_als=PARAMETROS_ALS,
+        fuente=FuenteSQLite(ruta_sqlite) if ruta_sqlite else None
+    )
+    try:
+        sistema.cargar_datos()
+        ruta = sistema.guardar_modelo(directorio)
+    finally:
+        sistema.cerrar_conexion()
+    if ruta is None:
+        print("No se guardó el modelo: no hay valoraciones")
+    else:
+        print(f"Modelo reconstruido y guardado en {ruta} en {time.perf_counter() - inicio:.1f} s")
+    return ruta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa archivos CSV o Parquet en la base de datos por bloques")
+    parser.add_argument("rutas", nargs="+", help="archivos o directorios con archivos <tabla>.csv / <tabla>.parquet")
+    parser.add_argument("--sqlite", help="importar en un archivo SQLite en lugar de MySQL")
+    parser.add_argument("--metodo", choices=("executemany", "load-data"), default="executemany",
+                        help="load-data usa LOAD DATA LOCAL INFILE (solo MySQL, requiere local_infile en el servidor)")
+    parser.add_argument("--filas-por-transaccion", type=int, default=50000,
+                        help="filas leídas y confirmadas por transacción")
+    parser.add_argument("--mantener-indices", action="store_true",
+                        help="no quitar los índices secundarios durante la carga (conviene si la tabla ya es grande)")
+    parser.add_argument("--reiniciar", action="store_true", help="ignorar el progreso guardado de los archivos")
+    parser.add_argument("--reconstruir-modelo", action="store_true",
+                        help="entrenar y guardar el paquete del modelo al terminar")
+    parser.add_argument("--dir-modelo", default=DIR_MODELO, help="directorio del paquete del modelo")
+    args = parser.parse_args()
+    if args.sqlite and args.metodo == 'load-data':
+        parser.error("--metodo load-data solo está disponible para MySQL")
+    if args.reconstruir_modelo and not args.dir_modelo:
+        parser.error("--reconstruir-modelo necesita un directorio del modelo (--dir-modelo o MODELO_DIRECTORIO)")
+
+    try:
+        fuentes = buscar_fuentes(args.rutas)
+    except ValueError as e:
+        parser.error(str(e))
+    if not fuentes:
+        parser.error("No se encontraron archivos .csv ni .parquet")
+
+    destino = DestinoSQLite(args.sqlite) if args.sqlite else DestinoMySQL(args.metodo)
+    try:
+        importar(destino, fuentes, args.filas_por_transaccion, not args.mantener_indices, args.reiniciar)
+    except Exception as e:
+        print(f"Importación interrumpida: {e}")
+        print("Las filas confirmadas se conservan; el mismo comando la reanuda desde el último bloque.")
+        raise SystemExit(1)
+    finally:
+        destino.cerrar()
+
+    if args.reconstruir_modelo:
+        reconstruir_modelo(args.dir_modelo, args.sqlite)
+
+
+if __name__ == "__main__":
+    main()
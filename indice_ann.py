@@ -0,0 +1,184 @@
+import time
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+
+class IndiceIVF:
+    """Índice aproximado de vecinos más cercanos (IVF) sobre vectores TF-IDF reducidos con TruncatedSVD
+
+    Los hoteles se agrupan en `n_listas` listas invertidas según el centroide más cercano.
+    Una búsqueda solo puntúa los hoteles de las `n_sondas` listas más cercanas a la consulta:
+    más sondas dan mejor recall a cambio de más latencia. Con `reordenar=True` los candidatos
+    se vuelven a puntuar con la similitud TF-IDF exacta.
+    """
+
+    def __init__(self, n_componentes=128, n_listas=None, n_sondas=8, reordenar=True, semilla=0):
+        self.n_componentes = n_componentes
+        self.n_listas = n_listas
+        self.n_sondas = n_sondas
+        self.reordenar = reordenar
+        self.semilla = semilla
+        self.componentes = None
+        self.vectores = None
+        self.centroides = None
+        self.asignaciones = None
+        self.orden = None
+        self.inicios = None
+
+    def construir(self, matriz_tfidf):
+        """Ajusta la proyección SVD y las listas invertidas sobre la matriz TF-IDF de los hoteles"""
+        n_documentos, n_terminos = matriz_tfidf.shape
+        n_componentes = min(self.n_componentes, n_terminos - 1, n_documentos - 1)
+        if n_componentes >= 1:
+            svd = TruncatedSVD(n_components=n_componentes, random_state=self.semilla)
+            svd.fit(matriz_tfidf)
+            self.componentes = svd.components_.astype(np.float32)
+        else:
+            # Catálogo demasiado pequeño para reducir dimensiones: usar el espacio TF-IDF original
+            self.componentes = np.eye(n_terminos, dtype=np.float32)
+        self.vectores = self._proyectar(matriz_tfidf)
+
+        n_listas = self.n_listas or int(np.sqrt(n_documentos))
+        n_listas = max(1, min(n_listas, n_documentos))
+        kmeans = MiniBatchKMeans(n_clusters=n_listas, random_state=self.semilla, n_init=3)
+        asignaciones = kmeans.fit_predict(self.vectores)
+        self.centroides = normalize(kmeans.cluster_centers_).astype(np.float32)
+        self._indexar(asignaciones)
+        return self
+
+    def _proyectar(self, matriz):
+        """Proyecta vectores TF-IDF al espacio reducido y los normaliza en L2"""
+        return normalize(np.asarray(matriz @ self.componentes.T, dtype=np.float32))
+
+    def _indexar(self, asignaciones):
+        """Construye las listas invertidas: `orden` agrupa los documentos por lista, `inicios` marca sus límites"""
+        self.orden = np.argsort(asignaciones, kind='stable').astype(np.int32)
+        conteos = np.bincount(asignaciones, minlength=len(self.centroides))
+        self.inicios = np.concatenate(([0], np.cumsum(conteos))).astype(np.int64)
+        self.asignaciones = np.asarray(asignaciones, dtype=np.int32)
+
+    def con_documentos(self, tfidf_nuevos):
+        """Devuelve un índice nuevo que además contiene los documentos indicados, sin reentrenar"""
+        nuevo = IndiceIVF(self.n_componentes, self.n_listas, self.n_sondas, self.reordenar, self.semilla)
+        nuevo.componentes = self.componentes
+        nuevo.centroides = self.centroides
+        vectores_nuevos = self._proyectar(tfidf_nuevos)
+        nuevo.vectores = np.vstack((self.vectores, vectores_nuevos))
+        asignaciones_nuevas = np.argmax(vectores_nuevos @ self.centroides.T, axis=1)
+        nuevo._indexar(np.concatenate((self.asignaciones, asignaciones_nuevas)))
+        return nuevo
+
+    def buscar(self, vector_consulta, n, matriz_tfidf=None, n_sondas=None):
+        """Devuelve (índices, similitudes) de los n hoteles aproximadamente más similares a la consulta"""
+        n_sondas = min(n_sondas or self.n_sondas, len(self.centroides))
+        consulta = self._proyectar(vector_consulta)[0]
+
+        # Elegir las listas cuyos centroides están más cerca de la consulta
+        sondas = np.argpartition(-(self.centroides @ consulta), n_sondas - 1)[:n_sondas]
+        candidatos = np.concatenate([self.orden[self.inicios[l]:self.inicios[l + 1]] for l in sondas])
+        if len(candidatos) == 0:
+            return candidatos, np.zeros(0, dtype=np.float32)
+
+        if self.reordenar and matriz_tfidf is not None:
+            similitudes = (matriz_tfidf[candidatos] @ vector_consulta.T).toarray().ravel()
+        else:
+            similitudes = self.vectores[candidatos] @ consulta
+
+        if len(similitudes) > n:
+            mejores = np.argpartition(-similitudes, n - 1)[:n]
+        else:
+            mejores = np.arange(len(similitudes))
+        mejores = mejores[np.argsort(-similitudes[mejores], kind='stable')]
+        return candidatos[mejores], similitudes[mejores]
+
+    def parametros(self):
+        """Parámetros de construcción del índice, como diccionario"""
+        return {
+            'n_componentes': self.n_componentes,
+            'n_listas': self.n_listas,
+            'n_sondas': self.n_sondas,
+            'reordenar': self.reordenar,
+            'semilla': self.semilla,
+        }
+
+    def arreglos(self):
+        """Arreglos ajustados del índice, por nombre"""
+        return {
+            'componentes': self.componentes,
+            'vectores': self.vectores,
+            'centroides': self.centroides,
+            'asignaciones': self.asignaciones,
+            'orden': self.orden,
+            'inicios': self.inicios,
+        }
+
+    @classmethod
+    def desde_arreglos(cls, parametros, arreglos):
+        """Reconstruye un índice a partir de `parametros()` y `arreglos()` (pueden ser arreglos mapeados en memoria)"""
+        indice = cls(**parametros)
+        for nombre, arreglo in arreglos.items():
+            setattr(indice, nombre, arreglo)
+        if indice.orden is None or indice.inicios is None:
+            indice._indexar(indice.asignaciones)
+        return indice
+
+    def guardar(self, ruta):
+        """Guarda el índice en un archivo .npz"""
+        parametros = self.parametros()
+        np.savez(
+            ruta,
+            parametros=np.array([
+                parametros['n_componentes'], parametros['n_listas'] or 0, parametros['n_sondas'],
+                int(parametros['reordenar']), parametros['semilla']
+            ]),
+            **self.arreglos()
+        )
+
+    @classmethod
+    def cargar(cls, ruta):
+        """Carga un índice guardado con `guardar`"""
+        with np.load(ruta) as archivo:
+            n_componentes, n_listas, n_sondas, reordenar, semilla = archivo['parametros'].tolist()
+            parametros = {
+                'n_componentes': n_componentes, 'n_listas': n_listas or None, 'n_sondas': n_sondas,
+                'reordenar': bool(reordenar), 'semilla': semilla,
+            }
+            arreglos = {nombre: archivo[nombre] for nombre in archivo.files if nombre != 'parametros'}
+        return cls.desde_arreglos(parametros, arreglos)
+
+
+def evaluar_recall(indice, matriz_tfidf, vectores_consulta, n=5, n_sondas=None):
+    """Compara el índice aproximado con la búsqueda exacta
+
+    Devuelve el recall@n promedio y la latencia media (ms) de ambos caminos.
+    """
+    aciertos = 0
+    total = 0
+    tiempo_exacto = 0.0
+    tiempo_aproximado = 0.0
+    for i in range(vectores_consulta.shape[0]):
+        consulta = vectores_consulta[i]
+
+        inicio = time.perf_counter()
+        similitudes = (matriz_tfidf @ consulta.T).toarray().ravel()
+        k = min(n, len(similitudes))
+        exactos = np.argpartition(-similitudes, k - 1)[:k]
+        tiempo_exacto += time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        aproximados, _ = indice.buscar(consulta, n, matriz_tfidf, n_sondas)
+        tiempo_aproximado += time.perf_counter() - inicio
+
+        # Los empates en la similitud exacta cuentan como acierto
+        umbral = similitudes[exactos].min()
+        aciertos += min(k, int(np.sum(similitudes[aproximados] >= umbral)))
+        total += k
+
+    n_consultas = max(vectores_consulta.shape[0], 1)
+    return {
+        'recall': aciertos / total if total else 1.0,
+        'latencia_exacta_ms': 1000 * tiempo_exacto / n_consultas,
+        'latencia_aproximada_ms': 1000 * tiempo_aproximado / n_consultas,
+    }
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+
+def zona(ubicacion):
+    """Zona de una ubicación: la parte antes de la primera coma ('Bocagrande, Cartagena' -> 'Bocagrande')"""
+    if not isinstance(ubicacion, str) or not ubicacion.strip():
+        return "Sin ubicación"
+    return ubicacion.split(",")[0].strip()
+
+
+class IndiceFacetas:
+    """Índice de facetas del catálogo de hoteles, construido una vez por instantánea del modelo
+
+    - Categoría y zona: un mapa de bits (arreglo booleano) por valor.
+    - Precio: posiciones ordenadas por precio, para resolver rangos con `searchsorted`.
+
+    Las posiciones devueltas son filas de `hoteles_df`, en el orden del catálogo.
+    """
+
+    def __init__(self, hoteles_df):
+        self.n_hoteles = len(hoteles_df)
+        self.categorias = self._mapas_de_bits(hoteles_df['categoria'] if self.n_hoteles else pd.Series(dtype=object))
+        self.zonas = self._mapas_de_bits(
+            hoteles_df['ubicacion'].map(zona) if self.n_hoteles else pd.Series(dtype=object)
+        )
+
+        precios = (
+            pd.to_numeric(hoteles_df['precio_promedio'], errors='coerce').to_numpy(dtype=np.float64)
+            if self.n_hoteles else np.zeros(0)
+        )
+        # Los hoteles sin precio quedan fuera de cualquier filtro de precio
+        con_precio = np.flatnonzero(~np.isnan(precios))
+        self.orden_precio = con_precio[np.argsort(precios[con_precio], kind='stable')]
+        self.precios_ordenados = precios[self.orden_precio]
+        for arreglo in (self.orden_precio, self.precios_ordenados):
+            arreglo.setflags(write=False)
+
+    @staticmethod
+    def _mapas_de_bits(valores):
+        mapas = {}
+        if len(valores) == 0:
+            return mapas
+        codigos, unicos = pd.factorize(valores.fillna("Sin dato"), sort=True)
+        for codigo, valor in enumerate(unicos):
+            mapa = codigos == codigo
+            mapa.setflags(write=False)
+            mapas[str(valor)] = mapa
+        return mapas
+
+    def valores_categoria(self):
+        """Categorías disponibles, de mayor a menor"""
+        return sorted(self.categorias, reverse=True)
+
+    def valores_zona(self):
+        """Zonas disponibles, en orden alfabético"""
+        return sorted(self.zonas)
+
+    def rango_precios(self):
+        """Precio mínimo y máximo del catálogo (None si no hay precios)"""
+        if len(self.precios_ordenados) == 0:
+            return None
+        return float(self.precios_ordenados[0]), float(self.precios_ordenados[-1])
+
+    def filtrar(self, categoria=None, zona=None, precio_min=None, precio_max=None):
+        """Devuelve las posiciones (ordenadas) de los hoteles que cumplen todos los filtros indicados"""
+        mascara = np.ones(self.n_hoteles, dtype=bool)
+        if categoria is not None:
+            mascara &= self.categorias.get(categoria, False)
+        if zona is not None:
+            mascara &= self.zonas.get(zona, False)
+        if precio_min is not None or precio_max is not None:
+            inicio = 0 if precio_min is None else np.searchsorted(self.precios_ordenados, precio_min, side='left')
+            fin = len(self.precios_ordenados) if precio_max is None else np.searchsorted(
+                self.precios_ordenados, precio_max, side='right'
+            )
+            en_rango = np.zeros(self.n_hoteles, dtype=bool)
+            en_rango[self.orden_precio[inicio:fin]] = True
+            mascara &= en_rango
+        return np.flatnonzero(mascara)
+
+
+def paginar(posiciones, pagina, tam_pagina):
+    """Devuelve las posiciones de la página indicada (empezando en 1), la página efectiva y el total de páginas
+
+    Una página fuera de rango se ajusta a la primera o a la última.
+    """
+    n_paginas = max(1, -(-len(posiciones) // tam_pagina))
+    pagina = min(max(1, int(pagina)), n_paginas)
+    inicio = (pagina - 1) * tam_pagina
+    return posiciones[inicio:inicio + tam_pagina], pagina, n_paginas
@@ -0,0 +1,98 @@
+from datetime import date
+import numpy as np
+import pandas as pd
+
+# Estados de reserva que ocupan una habitación (las canceladas y completadas no cuentan)
+ESTADOS_ACTIVOS = ('pendiente', 'confirmada')
+
+
+def a_dias(fechas):
+    """Convierte fechas (date, datetime o texto 'AAAA-MM-DD') en días desde 1970 (int64); NaT -> -1"""
+    dias = pd.to_datetime(pd.Series(fechas, dtype=object), errors='coerce').to_numpy().astype('datetime64[D]')
+    return np.where(np.isnat(dias), -1, dias.astype(np.int64))
+
+
+class IndiceReservas:
+    """Índice de intervalos de las reservas activas de cada hotel
+
+    Cada reserva [entrada, salida) suma 1 a la ocupación del hotel desde la noche de entrada hasta la
+    anterior a la salida. La ocupación de todos los hoteles se guarda como una función escalonada:
+    eventos (+1 en la entrada, -1 en la salida) ordenados por (hotel, día) en un único arreglo de
+    claves, con la ocupación acumulada tras cada evento. La ocupación máxima de todos los hoteles en
+    un rango de fechas se resuelve con dos `searchsorted` y un `maximum.reduceat`, sin recorrer
+    hoteles ni reservas en Python.
+
+    Las posiciones de hotel son filas de `hoteles_df`. La instancia no se modifica: con_cambios()
+    devuelve un índice nuevo.
+    """
+
+    def __init__(self, ids=None, hoteles=None, entradas=None, salidas=None):
+        vacio = np.zeros(0, dtype=np.int64)
+        self.ids = vacio if ids is None else np.asarray(ids, dtype=np.int64)
+        self.hoteles = vacio if hoteles is None else np.asarray(hoteles, dtype=np.int64)
+        self.entradas = vacio if entradas is None else np.asarray(entradas, dtype=np.int64)
+        self.salidas = vacio if salidas is None else np.asarray(salidas, dtype=np.int64)
+
+        # Eventos por (hotel, día); el mismo día las salidas van antes que las entradas
+        hoteles_eventos = np.concatenate((self.hoteles, self.hoteles))
+        dias = np.concatenate((self.entradas, self.salidas))
+        deltas = np.concatenate((np.ones(len(self.ids), np.int32), np.full(len(self.ids), -1, np.int32)))
+        orden = np.lexsort((deltas, dias, hoteles_eventos))
+        self.claves = (hoteles_eventos[orden] << 32) | dias[orden]
+        # Cada hotel suma tantas entradas como salidas: la suma acumulada global es la ocupación por hotel
+        self.ocupacion = np.cumsum(deltas[orden], dtype=np.int32)
+        for arreglo in (self.ids, self.hoteles, self.entradas, self.salidas, self.claves, self.ocupacion):
+            arreglo.setflags(write=False)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def con_cambios(self, filas, ids_hoteles, hoy=None):
+        """Devuelve un índice nuevo con las reservas leídas (diccionarios de la tabla reservas) aplicadas
+
+        Una fila sustituye a la versión anterior de la misma reserva; si ya no está activa (cancelada,
+        completada o con la salida en el pasado), la reserva se quita. Se descartan las reservas de
+        hoteles que no están en `ids_hoteles` y las que ya terminaron.
+        """
+        hoy = a_dias([hoy or date.today()])[0]
+        filas = list(filas)
+        ids = np.array([fila['id_reservas'] for fila in filas], dtype=np.int64)
+        id_hotel = np.array([-1 if fila['id_hotel'] is None else fila['id_hotel'] for fila in filas], dtype=np.int64)
+        entradas = a_dias([fila['fecha_entrada'] for fila in filas])
+        salidas = a_dias([fila['fecha_salida'] for fila in filas])
+        activas = np.array([fila['estado'] in ESTADOS_ACTIVOS for fila in filas], dtype=bool)
+
+        hoteles = np.searchsorted(ids_hoteles, id_hotel).astype(np.int64)
+        conocidas = hoteles < len(ids_hoteles)
+        conocidas[conocidas] = ids_hoteles[hoteles[conocidas]] == id_hotel[conocidas]
+        nuevas = activas & conocidas & (entradas >= 0) & (salidas > entradas) & (salidas > hoy)
+
+        # Las reservas leídas reemplazan a sus versiones anteriores; las terminadas se podan
+        conservar = ~np.isin(self.ids, ids) & (self.salidas > hoy)
+        return IndiceReservas(
+            np.concatenate((self.ids[conservar], ids[nuevas])),
+            np.concatenate((self.hoteles[conservar], hoteles[nuevas])),
+            np.concatenate((self.entradas[conservar], entradas[nuevas])),
+            np.concatenate((self.salidas[conservar], salidas[nuevas])),
+        )
+
+    def ocupacion_maxima(self, entrada, salida, n_hoteles):
+        """Máximo de habitaciones reservadas en alguna noche de [entrada, salida) para cada hotel (n_hoteles)"""
+        inicio, fin = a_dias([entrada, salida])
+        if len(self.claves) == 0:
+            return np.zeros(n_hoteles, dtype=np.int32)
+        hoteles = np.arange(n_hoteles, dtype=np.int64) << 32
+        # Ocupación la noche de entrada: el último evento del hotel hasta ese día
+        desde = np.searchsorted(self.claves, hoteles | inicio, side='right')
+        previos = desde - 1
+        del_hotel = (previos >= 0) & ((self.claves[previos] >> 32) == (hoteles >> 32))
+        ocupacion = np.where(del_hotel, self.ocupacion[previos], 0)
+
+        # Cambios en las noches siguientes del rango: máximo por tramo [desde, hasta) de cada hotel
+        hasta = np.searchsorted(self.claves, hoteles | (fin - 1), side='right')
+        con_eventos = hasta > desde
+        if con_eventos.any():
+            tramos = np.column_stack((desde[con_eventos], hasta[con_eventos])).ravel()
+            maximos = np.maximum.reduceat(np.append(self.ocupacion, 0), tramos)[::2]
+            ocupacion[con_eventos] = np.maximum(ocupacion[con_eventos], maximos)
+        return ocupacion
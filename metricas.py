@@ -0,0 +1,302 @@
+import atexit
+import cProfile
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+import numpy as np
+
+# Contexto vacío compartido: con las métricas desactivadas medir() no crea objetos
+_NULO = nullcontext()
+# Cuantiles que se exportan de cada histograma
+CUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class HistogramaLatencias:
+    """Histograma de latencias log-lineal (al estilo HDR) en nanosegundos
+
+    Los valores menores que 2**precision tienen un cubo cada uno; por encima, cada potencia de dos
+    se divide en 2**(precision - 1) cubos iguales, así el error relativo de cualquier cuantil es
+    menor que 2**(1 - precision) (1,6 % con precision=7) con un arreglo de tamaño fijo, sin guardar
+    las muestras. Los valores mayores que `maximo_ns` van al último cubo.
+    """
+
+    def __init__(self, precision=7, maximo_ns=1 << 44):
+        self.precision = precision
+        self._sub = 1 << precision
+        self._mitad = 1 << (precision - 1)
+        self._ultimo = self._indice(maximo_ns)
+        self.cuentas = [0] * (self._ultimo + 1)
+        self.total = 0
+        self.suma_ns = 0
+        self.minimo_ns = None
+        self.maximo_ns = 0
+        self._bloqueo = threading.Lock()
+
+    def _indice(self, valor):
+        if valor < self._sub:
+            return valor
+        desplazamiento = valor.bit_length() - self.precision
+        return desplazamiento * self._mitad + (valor >> desplazamiento)
+
+    def _limites(self, indice):
+        """Valores mínimo y máximo (excluido) de un cubo"""
+        if indice < self._sub:
+            return indice, indice + 1
+        desplazamiento = indice // self._mitad - 1
+        mantisa = indice - desplazamiento * self._mitad
+        return mantisa << desplazamiento, (mantisa + 1) << desplazamiento
+
+    def registrar(self, nanosegundos):
+        nanosegundos = max(int(nanosegundos), 0)
+        indice = min(self._indice(nanosegundos), self._ultimo)
+        with self._bloqueo:
+            self.cuentas[indice] += 1
+            self.total += 1
+            self.suma_ns += nanosegundos
+            if self.minimo_ns is None or nanosegundos < self.minimo_ns:
+                self.minimo_ns = nanosegundos
+            if nanosegundos > self.maximo_ns:
+                self.maximo_ns = nanosegundos
+
+    def cuantiles(self, cuantiles=CUANTILES):
+        """Devuelve el valor (ns) de cada cuantil: el punto medio de su cubo, acotado por el mínimo y el máximo"""
+        with self._bloqueo:
+            cuentas = np.array(self.cuentas, dtype=np.int64)
+            total, minimo, maximo = self.total, self.minimo_ns, self.maximo_ns
+        if total == 0:
+            return [None] * len(cuantiles)
+        acumuladas = np.cumsum(cuentas)
+        valores = []
+        for cuantil in cuantiles:
+            indice = int(np.searchsorted(acumuladas, max(cuantil * total, 1)))
+            inferior, superior = self._limites(indice)
+            valores.append(min(max((inferior + superior - 1) / 2, minimo), maximo))
+        return valores
+
+    def resumen(self):
+        """Conteo, suma y cuantiles en milisegundos"""
+        with self._bloqueo:
+            total, suma, minimo, maximo = self.total, self.suma_ns, self.minimo_ns, self.maximo_ns
+        resumen = {'n': total, 'suma_s': suma / 1e9, 'min_ms': None if minimo is None else minimo / 1e6,
+                   'max_ms': maximo / 1e6}
+        for cuantil, valor in zip(CUANTILES, self.cuantiles()):
+            resumen[f"p{cuantil * 100:g}_ms".replace('.', '')] = None if valor is None else valor / 1e6
+        return resumen
+
+
+class _Cronometro:
+    """Contexto que registra su duración en un histograma"""
+    __slots__ = ('histograma', 'inicio')
+
+    def __init__(self, histograma):
+        self.histograma = histograma
+
+    def __enter__(self):
+        self.inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *excepcion):
+        self.histograma.registrar(time.perf_counter_ns() - self.inicio)
+        return False
+
+
+class _Perfil:
+    """Contexto que perfila el bloque con cProfile y guarda las estadísticas en un archivo .prof"""
+
+    def __init__(self, registro, nombre):
+        self.registro = registro
+        self.nombre = nombre
+        self.perfil = cProfile.Profile()
+
+    def __enter__(self):
+        self.registro._local.perfilando = True
+        self.perfil.enable()
+        return self
+
+    def __exit__(self, *excepcion):
+        self.perfil.disable()
+        self.registro._local.perfilando = False
+        ruta = os.path.join(
+            self.registro.dir_perfiles, f"{self.nombre}_{datetime.now():%Y%m%d%H%M%S%f}_{threading.get_ident()}.prof"
+        )
+        try:
+            os.makedirs(self.registro.dir_perfiles, exist_ok=True)
+            self.perfil.dump_stats(ruta)
+            self.registro.contar('perfiles_guardados')
+        except OSError as e:
+            print(f"Error al guardar el perfil {ruta}: {e}")
+        return False
+
+
+class RegistroMetricas:
+    """Histogramas de latencia y contadores por nombre, compartidos por todos los hilos del proceso
+
+    Desactivado (el valor por defecto) medir() devuelve un contexto vacío y contar() no hace nada:
+    la instrumentación de las rutas críticas cuesta una comprobación de atributo.
+    """
+
+    def __init__(self, activas=False, muestreo_perfil=0.0, dir_perfiles='perfiles'):
+        self.activas = activas
+        self.muestreo_perfil = muestreo_perfil
+        self.dir_perfiles = dir_perfiles
+        self.histogramas = {}
+        self.contadores = {}
+        self._bloqueo = threading.Lock()
+        self._local = threading.local()
+
+    def histograma(self, nombre):
+        histograma = self.histogramas.get(nombre)
+        if histograma is None:
+            with self._bloqueo:
+                histograma = self.histogramas.setdefault(nombre, HistogramaLatencias())
+        return histograma
+
+    def medir(self, nombre):
+        if not self.activas:
+            return _NULO
+        return _Cronometro(self.histograma(nombre))
+
+    def observar(self, nombre, segundos):
+        if self.activas:
+            self.histograma(nombre).registrar(segundos * 1e9)
+
+    def contar(self, nombre, n=1):
+        if self.activas:
+            with self._bloqueo:
+                self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+    def perfilar(self, nombre):
+        """Perfila con cProfile una fracción `muestreo_perfil` de las veces; el resto es un contexto vacío"""
+        if self.muestreo_perfil <= 0 or random.random() >= self.muestreo_perfil:
+            return _NULO
+        # cProfile no se puede anidar en el mismo hilo: solo se perfila el bloque exterior
+        if getattr(self._local, 'perfilando', False):
+            return _NULO
+        return _Perfil(self, nombre)
+
+    def reiniciar(self):
+        with self._bloqueo:
+            self.histogramas = {}
+            self.contadores = {}
+
+    def lineas_json(self):
+        """Una línea JSON por métrica con su resumen en este instante"""
+        instante = datetime.now().isoformat(timespec='seconds')
+        lineas = [
+            json.dumps({'instante': instante, 'tipo': 'latencia', 'nombre': nombre, **histograma.resumen()})
+            for nombre, histograma in sorted(self.histogramas.items())
+        ]
+        lineas += [
+            json.dumps({'instante': instante, 'tipo': 'contador', 'nombre': nombre, 'valor': valor})
+            for nombre, valor in sorted(self.contadores.items())
+        ]
+        return lineas
+
+    def texto_prometheus(self, prefijo='hoteles'):
+        """Exposición en formato de texto de Prometheus: un summary de latencias y un counter de eventos"""
+        lineas = [
+            f"# HELP {prefijo}_latencia_segundos Latencia de las operaciones instrumentadas",
+            f"# TYPE {prefijo}_latencia_segundos summary",
+        ]
+        for nombre, histograma in sorted(self.histogramas.items()):
+            etiqueta = f'operacion="{nombre}"'
+            for cuantil, valor in zip(CUANTILES, histograma.cuantiles()):
+                if valor is not None:
+                    lineas.append(f'{prefijo}_latencia_segundos{{{etiqueta},quantile="{cuantil}"}} {valor / 1e9:.9g}')
+            lineas.append(f"{prefijo}_latencia_segundos_sum{{{etiqueta}}} {histograma.suma_ns / 1e9:.9g}")
+            lineas.append(f"{prefijo}_latencia_segundos_count{{{etiqueta}}} {histograma.total}")
+        lineas += [
+            f"# HELP {prefijo}_eventos_total Contadores de eventos instrumentados",
+            f"# TYPE {prefijo}_eventos_total counter",
+        ]
+        lineas += [
+            f'{prefijo}_eventos_total{{evento="{nombre}"}} {valor}' for nombre, valor in sorted(self.contadores.items())
+        ]
+        return "\n".join(lineas) + "\n"
+
+
+# Registro del proceso; configurar() lo activa con los valores de config.METRICAS
+REGISTRO = RegistroMetricas()
+
+
+def configurar(activas=False, muestreo_perfil=0.0, dir_perfiles='perfiles'):
+    REGISTRO.activas = activas
+    REGISTRO.muestreo_perfil = muestreo_perfil
+    REGISTRO.dir_perfiles = dir_perfiles
+    return REGISTRO
+
+
+def medir(nombre):
+    """Contexto que registra la duración del bloque en el histograma `nombre`"""
+    return REGISTRO.medir(nombre)
+
+
+def contar(nombre, n=1):
+    REGISTRO.contar(nombre, n)
+
+
+def perfilar(nombre):
+    return REGISTRO.perfilar(nombre)
+
+
+def cronometrado(nombre):
+    """Decorador que registra la duración de cada llamada en el histograma `nombre`"""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not REGISTRO.activas:
+                return funcion(*args, **kwargs)
+            inicio = time.perf_counter_ns()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                REGISTRO.histograma(nombre).registrar(time.perf_counter_ns() - inicio)
+        return envoltura
+    return decorador
+
+
+class ExportadorMetricas(threading.Thread):
+    """Hilo que vuelca periódicamente las métricas en un archivo de líneas JSON y/o un archivo de texto Prometheus
+
+    El archivo Prometheus se reemplaza de forma atómica (para el recolector de archivos de texto de
+    node_exporter); el de líneas JSON acumula un resumen por métrica en cada volcado.
+    """
+
+    def __init__(self, intervalo=60.0, archivo_json=None, archivo_prometheus=None, registro=None):
+        super().__init__(daemon=True, name="exportador-metricas")
+        self.intervalo = intervalo
+        self.archivo_json = archivo_json
+        self.archivo_prometheus = archivo_prometheus
+        self.registro = registro or REGISTRO
+        self._detener = threading.Event()
+        atexit.register(self.detener)
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            self.exportar()
+
+    def exportar(self):
+        try:
+            if self.archivo_json:
+                lineas = self.registro.lineas_json()
+                if lineas:
+                    with open(self.archivo_json, 'a', encoding='utf-8') as archivo:
+                        archivo.write("\n".join(lineas) + "\n")
+            if self.archivo_prometheus:
+                temporal = f"{self.archivo_prometheus}.tmp"
+                with open(temporal, 'w', encoding='utf-8') as archivo:
+                    archivo.write(self.registro.texto_prometheus())
+                os.replace(temporal, self.archivo_prometheus)
+        except OSError as e:
+            print(f"Error al exportar métricas: {e}")
+
+    def detener(self):
+        """Detiene el hilo y hace un último volcado"""
+        if not self._detener.is_set():
+            self._detener.set()
+            self.exportar()
@@ -0,0 +1,15 @@
+-- Migración de una base creada con una versión anterior de import_data.sql (ejecutar una sola vez)
+-- Agrega la marca de agua de reservas que leen cargar_datos y refrescar para el índice de disponibilidad
+
+-- Las filas existentes toman primero la fecha de la migración (el DEFAULT de la columna nueva)
+ALTER TABLE reservas
+    ADD COLUMN fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+
+-- Rellenar con la fecha de la reserva (asignarla explícitamente evita el ON UPDATE)
+UPDATE reservas
+SET fecha_actualizacion = COALESCE(fecha_reserva, CURRENT_TIMESTAMP)
+WHERE id_reservas > 0;
+
+-- ÍNDICES PARA EL REFRESCO INCREMENTAL DEL MODELO (los mismos que import_data.sql)
+CREATE INDEX idx_reservas_actualizacion ON reservas (fecha_actualizacion, id_reservas);
+CREATE INDEX idx_reservas_salida ON reservas (fecha_salida);
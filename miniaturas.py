@@ -0,0 +1,159 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from PIL import Image
+
+DIR_IMAGENES = "static/images/hoteles"
+DIR_MINIATURAS = os.path.join(DIR_IMAGENES, "miniaturas")
+ANCHO_TARJETA = 300
+# Anchos que se pregeneran: solo el de las tarjetas (st.image reduce cualquier imagen más ancha que
+# `width` en cada ejecución, así que una variante mayor no llegaría al navegador)
+ANCHOS = (ANCHO_TARJETA,)
+# st.image vuelve a codificar en cada ejecución todo lo que no sea JPEG o PNG: en JPEG y al ancho
+# exacto de la tarjeta, los bytes de la miniatura se envían tal cual
+FORMATO = "JPEG"
+EXTENSION = ".jpg"
+
+
+def ruta_original(id_hotel):
+    """Ruta de la imagen original de un hotel"""
+    return os.path.join(DIR_IMAGENES, f"{id_hotel}.jpg")
+
+
+def ruta_miniatura(nombre, ancho):
+    """Ruta de la miniatura de una imagen (identificada por su nombre sin extensión) para un ancho dado"""
+    return os.path.join(DIR_MINIATURAS, f"{nombre}_{ancho}{EXTENSION}")
+
+
+def generar_miniatura(origen, destino, ancho):
+    """Genera la miniatura redimensionada de `origen` en `destino` y devuelve sus bytes"""
+    with Image.open(origen) as imagen:
+        imagen = imagen.convert("RGB")
+        if imagen.width > ancho:
+            alto = round(imagen.height * ancho / imagen.width)
+            imagen = imagen.resize((ancho, alto), Image.LANCZOS)
+        buffer = BytesIO()
+        imagen.save(buffer, FORMATO, quality=85)
+    datos = buffer.getvalue()
+
+    # Escribir en un temporal y renombrar, para que otros procesos nunca lean un archivo a medias
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporal = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, "wb") as archivo:
+        archivo.write(datos)
+    os.replace(temporal, destino)
+    return datos
+
+
+def _mtime(ruta):
+    try:
+        return os.stat(ruta).st_mtime
+    except OSError:
+        return None
+
+
+class CacheMiniaturas:
+    """Caché en memoria de miniaturas de hoteles, acotada por bytes y con política LRU
+
+    Las miniaturas se generan en disco la primera vez que se piden (o con `pregenerar`) y se
+    invalidan cuando cambia la fecha de modificación de la imagen original. Para no consultar el
+    disco en cada acceso, la fecha se vuelve a comprobar como mucho cada `intervalo_verificacion`
+    segundos por entrada.
+    """
+
+    def __init__(self, capacidad_bytes=32 * 1024 * 1024, intervalo_verificacion=5.0):
+        self.capacidad_bytes = capacidad_bytes
+        self.intervalo_verificacion = intervalo_verificacion
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._bloqueo = threading.Lock()
+        # La imagen por defecto se resuelve una sola vez
+        self.ruta_default = os.path.join(DIR_IMAGENES, "default.jpg")
+        if not os.path.exists(self.ruta_default):
+            self.ruta_default = None
+
+    def obtener(self, id_hotel, ancho=ANCHO_TARJETA):
+        """Devuelve los bytes de la miniatura del hotel (o de la imagen por defecto), o None si no hay imagen"""
+        clave = (id_hotel, ancho)
+        ahora = time.monotonic()
+        with self._bloqueo:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                origen, mtime, verificada, datos = entrada
+                if ahora - verificada < self.intervalo_verificacion:
+                    self._entradas.move_to_end(clave)
+                    return datos
+
+        # Resolver la imagen de origen: la del hotel si existe, si no la imagen por defecto
+        origen = ruta_original(id_hotel)
+        mtime = _mtime(origen)
+        if mtime is None:
+            origen = self.ruta_default
+            mtime = _mtime(origen) if origen else None
+        if entrada is not None and entrada[0] == origen and entrada[1] == mtime:
+            datos = entrada[3]
+        else:
+            datos = self._leer_o_generar(origen, mtime, ancho) if mtime is not None else None
+
+        with self._bloqueo:
+            self._guardar(clave, (origen, mtime, ahora, datos))
+        return datos
+
+    def _leer_o_generar(self, origen, mtime, ancho):
+        """Lee la miniatura de disco si está al día respecto al original; si no, la genera"""
+        nombre = os.path.splitext(os.path.basename(origen))[0]
+        destino = ruta_miniatura(nombre, ancho)
+        mtime_miniatura = _mtime(destino)
+        try:
+            if mtime_miniatura is not None and mtime_miniatura >= mtime:
+                with open(destino, "rb") as archivo:
+                    return archivo.read()
+            return generar_miniatura(origen, destino, ancho)
+        except Exception as e:
+            print(f"Error al generar miniatura de {origen}: {e}")
+            return None
+
+    def _guardar(self, clave, entrada):
+        anterior = self._entradas.pop(clave, None)
+        if anterior is not None and anterior[3] is not None:
+            self._bytes -= len(anterior[3])
+        self._entradas[clave] = entrada
+        if entrada[3] is not None:
+            self._bytes += len(entrada[3])
+        while self._bytes > self.capacidad_bytes and len(self._entradas) > 1:
+            _, expulsada = self._entradas.popitem(last=False)
+            if expulsada[3] is not None:
+                self._bytes -= len(expulsada[3])
+
+
+def pregenerar(anchos=ANCHOS):
+    """Genera (o actualiza) las miniaturas de todas las imágenes originales; devuelve cuántas se generaron"""
+    generadas = 0
+    for nombre_archivo in sorted(os.listdir(DIR_IMAGENES)):
+        origen = os.path.join(DIR_IMAGENES, nombre_archivo)
+        if not nombre_archivo.lower().endswith(".jpg") or not os.path.isfile(origen):
+            continue
+        nombre = os.path.splitext(nombre_archivo)[0]
+        mtime = _mtime(origen)
+        for ancho in anchos:
+            destino = ruta_miniatura(nombre, ancho)
+            mtime_miniatura = _mtime(destino)
+            if mtime_miniatura is not None and mtime_miniatura >= mtime:
+                continue
+            try:
+                generar_miniatura(origen, destino, ancho)
+                generadas += 1
+            except Exception as e:
+                print(f"Error al generar miniatura de {origen}: {e}")
+    return generadas
+
+
+if __name__ == "__main__":
+    # Uso: python miniaturas.py [ancho ...]
+    anchos = tuple(int(a) for a in sys.argv[1:]) or ANCHOS
+    inicio = time.perf_counter()
+    total = pregenerar(anchos)
+    print(f"{total} miniaturas generadas en {time.perf_counter() - inicio:.1f} s ({FORMATO}) en {DIR_MINIATURAS}")
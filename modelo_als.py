@@ -0,0 +1,232 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy import sparse
+
+# Peso de cada acción de interacciones_usuario (se multiplica por la columna `valor`)
+PESOS_ACCIONES = {
+    'vista': 1.0,
+    'clic': 2.0,
+    'favorito': 3.0,
+    'reserva': 5.0,
+    'calificacion': 3.0,
+}
+# Peso de cada punto de una valoración explícita (1-5) en la matriz de confianza
+PESO_VALORACION = 1.0
+# Las valoraciones desde esta puntuación indican preferencia; las menores, rechazo
+UMBRAL_PREFERENCIA = 3
+# Parámetros de entrenamiento por defecto (ver entrenar_als)
+PARAMETROS_ALS = {
+    'n_factores': 64,
+    'iteraciones': 15,
+    'regularizacion': 0.1,
+    'alfa': 10.0,
+}
+
+
+def volcar_interacciones(bloques, pesos_acciones=None):
+    """Vuelca bloques de filas (id_usuario, id_hotel, accion, valor) en arreglos NumPy (usuarios, hoteles, pesos)
+
+    El peso de cada fila es el de su acción por su valor; las acciones desconocidas pesan 1.
+    """
+    pesos_acciones = PESOS_ACCIONES if pesos_acciones is None else pesos_acciones
+    usuarios, hoteles, pesos = [], [], []
+    for filas in bloques:
+        usuarios.append(np.fromiter((fila[0] for fila in filas), dtype=np.int32, count=len(filas)))
+        hoteles.append(np.fromiter((fila[1] for fila in filas), dtype=np.int32, count=len(filas)))
+        pesos.append(np.fromiter(
+            (pesos_acciones.get(fila[2], 1.0) * (1.0 if fila[3] is None else fila[3]) for fila in filas),
+            dtype=np.float32, count=len(filas)
+        ))
+    if not usuarios:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    return np.concatenate(usuarios), np.concatenate(hoteles), np.concatenate(pesos)
+
+
+def construir_matriz_interacciones(usuarios, hoteles, pesos, ids_usuarios, ids_hoteles):
+    """Matriz CSR usuarios×hoteles con la suma de los pesos de las interacciones de cada par
+
+    Se descartan las interacciones de usuarios u hoteles que no están en los ids (ordenados) indicados.
+    """
+    filas = np.searchsorted(ids_usuarios, usuarios)
+    columnas = np.searchsorted(ids_hoteles, hoteles)
+    validas = (filas < len(ids_usuarios)) & (columnas < len(ids_hoteles))
+    validas[validas] = (ids_usuarios[filas[validas]] == usuarios[validas]) & (
+        ids_hoteles[columnas[validas]] == hoteles[validas]
+    )
+    # El constructor COO -> CSR suma los pares repetidos
+    matriz = sparse.csr_matrix(
+        (pesos[validas], (filas[validas], columnas[validas])),
+        shape=(len(ids_usuarios), len(ids_hoteles)),
+        dtype=np.float32
+    )
+    matriz.sum_duplicates()
+    return matriz
+
+
+def matriz_confianza(matriz_ratings, matriz_interacciones=None, peso_valoracion=PESO_VALORACION,
+                     umbral=UMBRAL_PREFERENCIA):
+    """Combina valoraciones e interacciones en los pesos r_ui del modelo implícito (misma forma que las matrices)
+
+    Las valoraciones desde `umbral` suman preferencia (3 estrellas pesan 1, 5 pesan 3); las menores
+    son pesos negativos, que el modelo trata como preferencia 0 con más confianza (1 estrella pesa
+    -2). En un par valorado por debajo del umbral las interacciones aumentan esa confianza en lugar
+    de contar como preferencia: el usuario conoció el hotel y no le gustó.
+    """
+    confianza = sparse.csr_matrix(matriz_ratings, dtype=np.float32, copy=True)
+    puntuaciones = confianza.data
+    confianza.data = np.where(
+        puntuaciones >= umbral, puntuaciones - (umbral - 1), puntuaciones - umbral
+    ).astype(np.float32) * peso_valoracion
+    if matriz_interacciones is not None:
+        rechazos = matriz_interacciones.multiply(confianza < 0)
+        confianza = confianza + matriz_interacciones - 2 * rechazos
+    confianza = sparse.csr_matrix(confianza, dtype=np.float32)
+    confianza.eliminate_zeros()
+    return confianza
+
+
+def _bloques(indptr, filas, max_elementos):
+    """Agrupa filas consecutivas en bloques de como mucho ~max_elementos valores observados"""
+    acumulado = np.cumsum(indptr[filas + 1] - indptr[filas] + 1)
+    cortes = np.searchsorted(acumulado, np.arange(max_elementos, acumulado[-1], max_elementos))
+    inicios = np.unique(np.concatenate(([0], cortes)))
+    return [filas[i:j] for i, j in zip(inicios, np.append(inicios[1:], len(filas))) if j > i]
+
+
+def _resolver_bloque(fijos, base, confianza, filas, iniciales, alfa, pasos):
+    """Gradiente conjugado por lotes sobre las filas de un bloque
+
+    Para cada fila u resuelve (YᵀY + λI + Σ_i α·|r_ui|·y_i·y_iᵀ) x_u = Σ_i p_ui·(1 + α·|r_ui|)·y_i, con
+    i sus hoteles observados y p_ui = 1 si r_ui > 0 o 0 si es negativo (un rechazo), sin formar las
+    matrices f×f: cada paso cuesta O(observados·factores).
+    """
+    sub = confianza[filas]
+    pesos = alfa * np.abs(sub.data).astype(np.float32)
+    fila_de = np.repeat(np.arange(len(filas)), np.diff(sub.indptr))
+    observados = fijos[sub.indices]
+
+    def producto(direcciones):
+        proyecciones = pesos * np.einsum('ij,ij->i', observados, direcciones[fila_de])
+        ponderada = sparse.csr_matrix((proyecciones, sub.indices, sub.indptr), shape=sub.shape)
+        return direcciones @ base + ponderada @ fijos
+
+    preferencias = np.where(sub.data > 0, 1 + pesos, 0).astype(np.float32)
+    independientes = sparse.csr_matrix((preferencias, sub.indices, sub.indptr), shape=sub.shape) @ fijos
+    x = iniciales.copy()
+    residuo = independientes - producto(x)
+    direccion = residuo.copy()
+    norma = np.einsum('ij,ij->i', residuo, residuo)
+    for _ in range(pasos):
+        a_direccion = producto(direccion)
+        curvatura = np.einsum('ij,ij->i', direccion, a_direccion)
+        paso = np.divide(norma, curvatura, out=np.zeros_like(norma), where=curvatura > 0)
+        x += paso[:, None] * direccion
+        residuo -= paso[:, None] * a_direccion
+        norma_nueva = np.einsum('ij,ij->i', residuo, residuo)
+        if norma_nueva.max() < 1e-10:
+            break
+        direccion = residuo + np.divide(
+            norma_nueva, norma, out=np.zeros_like(norma), where=norma > 0
+        )[:, None] * direccion
+        norma = norma_nueva
+    return x
+
+
+def resolver_factores(fijos, confianza, regularizacion=0.1, alfa=10.0, filas=None, iniciales=None, pasos=None,
+                      n_hilos=None, max_elementos=1 << 16):
+    """Un medio paso de ALS: factores de las filas de `confianza` con los factores de sus columnas fijos
+
+    `iniciales` (los factores anteriores de esas filas) permite pocos `pasos` de gradiente conjugado
+    al entrenar; sin ellos se parte de cero y se dan tantos pasos como factores, que es la solución
+    exacta. Si se indican `filas`, solo se resuelven esas (para incorporar usuarios u hoteles sin
+    reentrenar).
+    """
+    confianza = sparse.csr_matrix(confianza)
+    filas = np.arange(confianza.shape[0]) if filas is None else np.asarray(filas, dtype=np.int64)
+    n_factores = fijos.shape[1]
+    if iniciales is None:
+        iniciales = np.zeros((len(filas), n_factores), dtype=np.float32)
+        pasos = n_factores if pasos is None else pasos
+    resultado = np.zeros((len(filas), n_factores), dtype=np.float32)
+    if len(filas) == 0:
+        return resultado
+
+    fijos = np.ascontiguousarray(fijos, dtype=np.float32)
+    base = (fijos.T @ fijos + regularizacion * np.eye(n_factores)).astype(np.float32)
+    bloques = _bloques(confianza.indptr, filas, max_elementos)
+    posiciones = np.cumsum([0] + [len(bloque) for bloque in bloques])
+
+    def resolver(i):
+        inicio, fin = posiciones[i], posiciones[i + 1]
+        resultado[inicio:fin] = _resolver_bloque(
+            fijos, base, confianza, bloques[i], iniciales[inicio:fin], alfa, pasos or 3
+        )
+
+    # NumPy y las operaciones dispersas liberan el GIL, así varios hilos avanzan bloques en paralelo
+    with ThreadPoolExecutor(max_workers=n_hilos or os.cpu_count()) as ejecutor:
+        list(ejecutor.map(resolver, range(len(bloques))))
+    return resultado
+
+
+def entrenar_als(confianza, n_factores=64, iteraciones=15, regularizacion=0.1, alfa=10.0, pasos_cg=3, n_hilos=None,
+                 semilla=0):
+    """Factoriza la matriz de confianza usuarios×hoteles con ALS implícito (Hu, Koren y Volinsky)
+
+    Cada iteración resuelve todos los usuarios con los hoteles fijos y luego todos los hoteles con
+    los usuarios fijos (`pasos_cg` pasos de gradiente conjugado partiendo de la iteración anterior),
+    repartiendo los bloques entre `n_hilos`. Devuelve (factores_usuarios,
+    factores_hoteles) en float32: la puntuación de un par es el producto punto de sus factores.
+    """
+    confianza = sparse.csr_matrix(confianza, dtype=np.float32)
+    traspuesta = confianza.T.tocsr()
+    rng = np.random.default_rng(semilla)
+    n_usuarios, n_hoteles = confianza.shape
+    factores_usuarios = (rng.standard_normal((n_usuarios, n_factores)) * 0.01).astype(np.float32)
+    factores_hoteles = (rng.standard_normal((n_hoteles, n_factores)) * 0.01).astype(np.float32)
+    for _ in range(iteraciones):
+        factores_usuarios = resolver_factores(
+            factores_hoteles, confianza, regularizacion, alfa, iniciales=factores_usuarios, pasos=pasos_cg,
+            n_hilos=n_hilos
+        )
+        factores_hoteles = resolver_factores(
+            factores_usuarios, traspuesta, regularizacion, alfa, iniciales=factores_hoteles, pasos=pasos_cg,
+            n_hilos=n_hilos
+        )
+    return factores_usuarios, factores_hoteles
+
+
+def evaluar_valoraciones_negativas(factores_usuarios, factores_hoteles, matriz_ratings, puntuacion_maxima=1,
+                                   tam_bloque=1024):
+    """Comprueba que los hoteles mal valorados no se puntúen por encima de los que el usuario no valoró
+
+    Para cada par (usuario, hotel valorado con `puntuacion_maxima` estrellas o menos) calcula la
+    fracción de hoteles no valorados por el usuario con menor puntuación que ese hotel. Devuelve el
+    número de pares, la media de esa fracción (0 es lo deseable; 0,5 sería puntuar al azar) y la
+    fracción de pares puntuados por encima de todos los hoteles no valorados.
+    """
+    matriz_ratings = sparse.csr_matrix(matriz_ratings)
+    n_hoteles = matriz_ratings.shape[1]
+    fracciones, por_encima = [], 0
+    for inicio in range(0, matriz_ratings.shape[0], tam_bloque):
+        bloque = matriz_ratings[inicio:inicio + tam_bloque].tocoo()
+        malos = bloque.data <= puntuacion_maxima
+        if not malos.any():
+            continue
+        puntuaciones = factores_usuarios[inicio:inicio + bloque.shape[0]] @ factores_hoteles.T
+        # Puntuaciones ordenadas de los no valorados de cada fila (los valorados quedan al final)
+        no_valorados = puntuaciones.copy()
+        no_valorados[bloque.row, bloque.col] = np.inf
+        no_valorados.sort(axis=1)
+        n_no_valorados = n_hoteles - np.bincount(bloque.row, minlength=bloque.shape[0])
+        for fila, columna in zip(bloque.row[malos].tolist(), bloque.col[malos].tolist()):
+            if n_no_valorados[fila] == 0:
+                continue
+            superados = np.searchsorted(no_valorados[fila, :n_no_valorados[fila]], puntuaciones[fila, columna])
+            fracciones.append(superados / n_no_valorados[fila])
+            por_encima += int(superados == n_no_valorados[fila])
+    return {
+        'pares': len(fracciones),
+        'fraccion_superados': float(np.mean(fracciones)) if fracciones else 0.0,
+        'por_encima_de_todos': por_encima / len(fracciones) if fracciones else 0.0,
+    }
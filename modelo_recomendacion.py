@@ -1,109 +1,1111 @@
+import threading
+from collections import namedtuple
+from operator import itemgetter
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-import mysql.connector
-from config import DB_CONFIG
+from sklearn.preprocessing import normalize
+from cache_resultados import CacheResultados
+from indice_ann import IndiceIVF, evaluar_recall
+from fuentes_datos import FuenteMySQL
+from indice_facetas import IndiceFacetas
+from indice_reservas import IndiceReservas
+from metricas import contar, cronometrado, medir
+from modelo_als import (
+    PARAMETROS_ALS, construir_matriz_interacciones, entrenar_als, evaluar_valoraciones_negativas, matriz_confianza,
+    resolver_factores, volcar_interacciones
+)
+from paquete_modelo import cargar_paquete, guardar_paquete
+
+
+def calcular_vecinos_usuarios(matriz, k, tam_bloque=512, filas=None):
+    """Calcula por bloques los k usuarios más similares (coseno) de cada fila de la matriz de ratings
+
+    Si se indican `filas`, solo se calculan los vecinos de esos usuarios (en ese orden).
+    """
+    matriz = sparse.csr_matrix(matriz, dtype=np.float32)
+    n_usuarios = matriz.shape[0]
+    filas = np.arange(n_usuarios) if filas is None else np.asarray(filas, dtype=np.int64)
+    if n_usuarios == 0 or len(filas) == 0:
+        return sparse.csr_matrix((len(filas), n_usuarios), dtype=np.float32)
+
+    # Normalizar las filas para que el producto punto sea directamente la similitud coseno
+    normas = np.sqrt(np.asarray(matriz.multiply(matriz).sum(axis=1)).ravel())
+    normas[normas == 0] = 1
+    normalizada = (sparse.diags(1 / normas) @ matriz).tocsr()
+    traspuesta = normalizada.T.tocsr()
+
+    indptr = np.zeros(len(filas) + 1, dtype=np.int64)
+    indices = []
+    datos = []
+    for inicio in range(0, len(filas), tam_bloque):
+        bloque = filas[inicio:inicio + tam_bloque]
+        # Solo se materializa la similitud de un bloque de usuarios contra todos los demás
+        similitud = (normalizada[bloque] @ traspuesta).tocsr()
+        for i, fila in enumerate(bloque):
+            columnas = similitud.indices[similitud.indptr[i]:similitud.indptr[i + 1]]
+            valores = similitud.data[similitud.indptr[i]:similitud.indptr[i + 1]]
+            # No considerar al propio usuario ni similitudes nulas
+            mascara = (columnas != fila) & (valores > 0)
+            columnas, valores = columnas[mascara], valores[mascara]
+            if len(valores) > k:
+                seleccion = np.argpartition(-valores, k - 1)[:k]
+                columnas, valores = columnas[seleccion], valores[seleccion]
+            indices.append(columnas)
+            datos.append(valores)
+            indptr[inicio + i + 1] = indptr[inicio + i] + len(columnas)
+
+    indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32)
+    datos = np.concatenate(datos) if datos else np.zeros(0, dtype=np.float32)
+    return sparse.csr_matrix((datos, indices, indptr), shape=(len(filas), n_usuarios))
+
+
+def expandir_filas(matriz, posiciones, n_filas):
+    """Reubica las filas de una matriz CSR en `posiciones`, dejando vacías las filas nuevas"""
+    conteos = np.zeros(n_filas, dtype=np.int64)
+    conteos[posiciones] = np.diff(matriz.indptr)
+    indptr = np.concatenate(([0], np.cumsum(conteos)))
+    return sparse.csr_matrix((matriz.data, matriz.indices, indptr), shape=(n_filas, matriz.shape[1]))
+
+
+def reemplazar_filas(matriz, filas, nuevas):
+    """Devuelve una copia de la matriz CSR con las `filas` indicadas sustituidas por las de `nuevas`"""
+    coo = matriz.tocoo()
+    conservar = ~np.isin(coo.row, filas)
+    nuevas = nuevas.tocoo()
+    return sparse.csr_matrix(
+        (
+            np.concatenate((coo.data[conservar], nuevas.data)),
+            (np.concatenate((coo.row[conservar], np.asarray(filas)[nuevas.row])),
+             np.concatenate((coo.col[conservar], nuevas.col)))
+        ),
+        shape=matriz.shape,
+        dtype=matriz.dtype
+    )
+
+
+def seleccionar_top_n(puntuaciones, n):
+    """Devuelve los índices de las n puntuaciones más altas, ordenados de mayor a menor"""
+    if n <= 0 or len(puntuaciones) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if len(puntuaciones) > n:
+        indices = np.argpartition(-puntuaciones, n - 1)[:n]
+    else:
+        indices = np.arange(len(puntuaciones))
+    return indices[np.argsort(-puntuaciones[indices], kind='stable')]
+
+
+def seleccionar_top_n_filas(puntuaciones, n):
+    """Devuelve, por fila, las columnas de las n puntuaciones más altas y esas puntuaciones, de mayor a menor"""
+    if puntuaciones.shape[1] > n:
+        mejores = np.argpartition(-puntuaciones, n - 1, axis=1)[:, :n]
+    else:
+        mejores = np.broadcast_to(np.arange(puntuaciones.shape[1]), puntuaciones.shape)
+    valores = np.take_along_axis(puntuaciones, mejores, axis=1)
+    orden = np.argsort(-valores, axis=1, kind='stable')
+    return np.take_along_axis(mejores, orden, axis=1), np.take_along_axis(valores, orden, axis=1)
+
+
+def _vecinos_validos(posiciones, similitudes):
+    """Marca con -1 (y similitud 0) los vecinos sin similitud positiva"""
+    validos = similitudes > 0
+    return (
+        np.where(validos, posiciones, -1).astype(np.int32),
+        np.where(validos, similitudes, 0).astype(np.float32)
+    )
+
+
+def calcular_vecinos_hoteles(matriz_tfidf, k, tam_bloque=128, filas=None):
+    """Calcula por bloques los k hoteles más similares (coseno TF-IDF) de cada hotel del catálogo
+
+    Devuelve dos matrices len(filas)×k, ordenadas de mayor a menor similitud por fila: posiciones de
+    los vecinos en el catálogo (-1 si no hay suficientes con similitud positiva) y similitudes en
+    float32. Solo se materializa la similitud de `tam_bloque` hoteles contra el catálogo a la vez.
+    Las filas de `matriz_tfidf` deben estar normalizadas en L2.
+    """
+    n_hoteles = matriz_tfidf.shape[0]
+    filas = np.arange(n_hoteles) if filas is None else np.asarray(filas, dtype=np.int64)
+    k = min(k, max(n_hoteles - 1, 0))
+    vecinos = np.full((len(filas), k), -1, dtype=np.int32)
+    similitudes = np.zeros((len(filas), k), dtype=np.float32)
+    if k == 0 or len(filas) == 0:
+        return vecinos, similitudes
+
+    traspuesta = matriz_tfidf.T.tocsr()
+    for inicio in range(0, len(filas), tam_bloque):
+        bloque = filas[inicio:inicio + tam_bloque]
+        similitud = (matriz_tfidf[bloque] @ traspuesta).toarray().astype(np.float32)
+        # No considerar al propio hotel
+        similitud[np.arange(len(bloque)), bloque] = -np.inf
+        mejores, valores = seleccionar_top_n_filas(similitud, k)
+        vecinos[inicio:inicio + len(bloque)], similitudes[inicio:inicio + len(bloque)] = _vecinos_validos(
+            mejores, valores
+        )
+    return vecinos, similitudes
+
+
+def fusionar_vecinos_hoteles(vecinos, similitudes, matriz_tfidf, tfidf_nuevos, inicio_nuevos, tam_bloque=128):
+    """Actualiza los vecinos de los hoteles existentes con los hoteles nuevos agregados al final del catálogo
+
+    Los nuevos se comparan por bloques con todo el catálogo anterior y cada fila conserva sus k mejores.
+    """
+    k = vecinos.shape[1]
+    if k == 0 or tfidf_nuevos.shape[0] == 0:
+        return vecinos, similitudes
+    for inicio in range(0, tfidf_nuevos.shape[0], tam_bloque):
+        bloque = tfidf_nuevos[inicio:inicio + tam_bloque]
+        cruzada = (matriz_tfidf @ bloque.T).toarray().astype(np.float32)
+        candidatos = np.concatenate((
+            vecinos,
+            np.broadcast_to(np.arange(bloque.shape[0], dtype=np.int32) + inicio_nuevos + inicio, cruzada.shape)
+        ), axis=1)
+        puntuaciones = np.concatenate((np.where(vecinos >= 0, similitudes, -np.inf), cruzada), axis=1)
+        mejores, valores = seleccionar_top_n_filas(puntuaciones, k)
+        vecinos, similitudes = _vecinos_validos(np.take_along_axis(candidatos, mejores, axis=1), valores)
+    return vecinos, similitudes
+
+
+def puntuar_usuarios(estado, filas, n, excluidos=None):
+    """Puntúa en bloque los hoteles no calificados de varios usuarios (filas de la matriz de ratings)
+
+    Con factores ALS en la instantánea la puntuación es el producto de los factores del usuario y del
+    hotel; si no, el promedio de los ratings de los vecinos. Devuelve dos matrices len(filas)×n,
+    ordenadas de mayor a menor puntuación por fila: ids de hotel (-1 cuando el usuario no tiene
+    suficientes candidatos) y puntuaciones estimadas. `excluidos` es una máscara booleana por hotel
+    (por ejemplo, los que no tienen disponibilidad) que se descarta para todos los usuarios.
+    """
+    filas = np.asarray(filas, dtype=np.int64)
+    n = min(n, estado.matriz_ratings.shape[1])
+    if len(filas) == 0 or n <= 0:
+        return np.zeros((len(filas), 0), dtype=np.int32), np.zeros((len(filas), 0), dtype=np.float32)
+
+    with medir('puntuar_usuarios'):
+        calificados = estado.calificados[filas].tocoo()
+        if estado.factores_usuarios is not None:
+            # O(hoteles·factores) por usuario, sin depender del número de usuarios
+            predicciones = estado.factores_usuarios[filas] @ estado.factores_hoteles.T
+            predicciones[calificados.row, calificados.col] = -np.inf
+        else:
+            # Promedio ponderado de los ratings de los vecinos, para todo el bloque en dos productos dispersos
+            pesos = estado.vecinos_usuarios[filas]
+            numerador = (pesos @ estado.matriz_ratings).toarray()
+            denominador = (pesos @ estado.calificados).toarray()
+
+            # Solo hoteles no calificados por el usuario y calificados por algún vecino
+            denominador[calificados.row, calificados.col] = 0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                predicciones = np.where(denominador > 0, numerador / denominador, -np.inf).astype(np.float32)
+        if excluidos is not None:
+            predicciones[:, excluidos] = -np.inf
+
+    # Top-n por fila sin ordenar todos los hoteles
+    with medir('top_n'):
+        mejores, puntuaciones = seleccionar_top_n_filas(predicciones, n)
+    ids_hoteles = np.where(np.isfinite(puntuaciones), estado.ids_hoteles[mejores], -1).astype(np.int32)
+    return ids_hoteles, puntuaciones
+
+
+def puntuar_consultas(estado, vectores, n, excluidos=None):
+    """Puntúa en bloque varias consultas de texto (filas TF-IDF normalizadas) contra todo el catálogo
+
+    Devuelve dos matrices len(consultas)×n como puntuar_usuarios: ids de hotel (-1 si no hay
+    suficientes candidatos) y similitudes coseno, de mayor a menor.
+    """
+    n = min(n, estado.matriz_tfidf.shape[0])
+    if vectores.shape[0] == 0 or n <= 0:
+        return np.zeros((vectores.shape[0], 0), dtype=np.int32), np.zeros((vectores.shape[0], 0), dtype=np.float32)
+
+    # Un único producto disperso consultas×hoteles para todo el lote
+    with medir('puntuar_consultas'):
+        similitudes = (vectores @ estado.matriz_tfidf.T).toarray().astype(np.float32)
+        if excluidos is not None:
+            similitudes[:, excluidos] = -np.inf
+    with medir('top_n'):
+        mejores, similitudes = seleccionar_top_n_filas(similitudes, n)
+    ids_hoteles = np.where(np.isfinite(similitudes), estado.ids_hoteles[mejores], -1).astype(np.int32)
+    return ids_hoteles, similitudes
+
+
+def construir_matriz_ratings(usuarios, hoteles, puntuaciones, ids_hoteles):
+    """Construye la matriz dispersa CSR usuarios×hoteles a partir de las valoraciones en orden de inserción"""
+    usuarios = np.asarray(usuarios, dtype=np.int32)
+    hoteles = np.asarray(hoteles, dtype=np.int32)
+    puntuaciones = np.asarray(puntuaciones, dtype=np.float32)
+
+    # Descartar valoraciones de hoteles que no están en el catálogo
+    columnas = np.searchsorted(ids_hoteles, hoteles)
+    validas = columnas < len(ids_hoteles)
+    validas[validas] = ids_hoteles[columnas[validas]] == hoteles[validas]
+    usuarios, columnas, puntuaciones = usuarios[validas], columnas[validas], puntuaciones[validas]
+
+    ids_usuarios, filas = np.unique(usuarios, return_inverse=True)
+    ids_usuarios = ids_usuarios.astype(np.int32)
+
+    # Si un usuario valoró varias veces el mismo hotel, conservar la última valoración
+    claves = filas.astype(np.int64) * len(ids_hoteles) + columnas
+    _, ultimas = np.unique(claves[::-1], return_index=True)
+    ultimas = len(claves) - 1 - ultimas
+
+    matriz = sparse.csr_matrix(
+        (puntuaciones[ultimas], (filas[ultimas], columnas[ultimas])),
+        shape=(len(ids_usuarios), len(ids_hoteles)),
+        dtype=np.float32
+    )
+    return matriz, ids_usuarios
+
+
+# Valoraciones leídas en arreglos NumPy, con la marca de agua (fecha, id) de la última fila
+Valoraciones = namedtuple('Valoraciones', ('usuarios', 'hoteles', 'puntuaciones', 'marca'))
+
+
+def _ampliar(arreglo, usados, capacidad):
+    nuevo = np.empty(capacidad, dtype=arreglo.dtype)
+    nuevo[:usados] = arreglo[:usados]
+    return nuevo
+
+
+def volcar_valoraciones(bloques, capacidad=1 << 16):
+    """Vuelca bloques de filas (id_valoracion, id_usuario, id_hotel, puntuacion, fecha) en arreglos NumPy
+
+    Cada bloque se copia directamente en arreglos int32/int8 reservados de antemano, que duplican su
+    capacidad cuando se llenan: no se crea un objeto por valoración. Las filas deben llegar ordenadas
+    por (fecha, id), de modo que la marca de agua es la de la última fila.
+    """
+    usuarios = np.empty(capacidad, dtype=np.int32)
+    hoteles = np.empty(capacidad, dtype=np.int32)
+    puntuaciones = np.empty(capacidad, dtype=np.int8)
+    n = 0
+    ultima = None
+    for filas in bloques:
+        fin = n + len(filas)
+        if fin > len(usuarios):
+            capacidad = max(2 * len(usuarios), fin)
+            usuarios, hoteles, puntuaciones = (
+                _ampliar(arreglo, n, capacidad) for arreglo in (usuarios, hoteles, puntuaciones)
+            )
+        usuarios[n:fin] = np.fromiter(map(itemgetter(1), filas), dtype=np.int32, count=len(filas))
+        hoteles[n:fin] = np.fromiter(map(itemgetter(2), filas), dtype=np.int32, count=len(filas))
+        puntuaciones[n:fin] = np.fromiter(map(itemgetter(3), filas), dtype=np.int8, count=len(filas))
+        ultima = filas[-1]
+        n = fin
+    marca = None if ultima is None else (ultima[4], ultima[0])
+    return Valoraciones(usuarios[:n], hoteles[:n], puntuaciones[:n], marca)
+
+
+def buscar_posiciones(ids_ordenados, ids):
+    """Traduce ids a posiciones en un arreglo ordenado de ids; devuelve -1 para los ids desconocidos"""
+    ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+    posiciones = np.searchsorted(ids_ordenados, ids)
+    encontrados = posiciones < len(ids_ordenados)
+    encontrados[encontrados] = ids_ordenados[posiciones[encontrados]] == ids[encontrados]
+    return np.where(encontrados, posiciones, -1)
+
+
+def normalizar_consulta(texto):
+    """Normaliza el texto de búsqueda (minúsculas y espacios) para usarlo como clave de caché"""
+    return " ".join(texto.lower().split())
+
+
+# Registro ligero de un hotel, tal como lo necesitan las tarjetas de resultados
+CAMPOS_HOTEL = ('id_hotel', 'nombre', 'descripcion', 'ubicacion', 'categoria', 'precio_promedio', 'imagen_url')
+Hotel = namedtuple('Hotel', CAMPOS_HOTEL)
+
+
+def marca_cache(marca):
+    """Convierte una marca de agua (fecha, id) en un valor comparable y serializable en JSON para la caché"""
+    return None if marca is None else (str(marca[0]), int(marca[1]))
+
+
+def columnas_hoteles(hoteles_df):
+    """Extrae las columnas de CAMPOS_HOTEL como arreglos NumPy para poder tomarlas por posición"""
+    n_hoteles = len(hoteles_df)
+    return tuple(
+        hoteles_df[campo].to_numpy() if campo in hoteles_df else np.full(n_hoteles, None, dtype=object)
+        for campo in CAMPOS_HOTEL
+    )
+
+
+def congelar(valor):
+    """Marca como de solo lectura los arreglos NumPy (también los de una matriz dispersa)"""
+    if isinstance(valor, np.ndarray):
+        valor.setflags(write=False)
+    elif sparse.issparse(valor):
+        for arreglo in (valor.data, valor.indices, valor.indptr):
+            arreglo.setflags(write=False)
+    elif isinstance(valor, tuple):
+        for elemento in valor:
+            congelar(elemento)
+    return valor
+
+
+class EstadoModelo:
+    """Instantánea inmutable del modelo entrenado
+
+    Agrupa la matriz de ratings, los vecinos (o los factores ALS), el índice TF-IDF y la tabla de hoteles. Los arreglos
+    se marcan de solo lectura y la instantánea no admite asignaciones: un refresco construye una
+    instantánea nueva (reutilizando los arreglos que no cambian) en lugar de modificar esta.
+    `hoteles_df` debe tratarse también como de solo lectura.
+    """
+
+    __slots__ = (
+        'version',
+        'hoteles_df', 'ids_hoteles', 'vectorizador', 'matriz_tfidf', 'vecinos_hoteles', 'similitud_vecinos_hoteles',
+        'indice_ann', 'indice_facetas', 'columnas_hoteles',
+        'matriz_ratings', 'ids_usuarios', 'vecinos_usuarios', 'calificados',
+        'matriz_interacciones', 'factores_usuarios', 'factores_hoteles',
+        'indice_reservas',
+        'marca_hoteles', 'marca_valoraciones', 'marca_reservas',
+    )
+
+    def __init__(self, **campos):
+        desconocidos = set(campos) - set(self.__slots__)
+        if desconocidos:
+            raise TypeError(f"Campos desconocidos para EstadoModelo: {sorted(desconocidos)}")
+        for nombre in self.__slots__:
+            object.__setattr__(self, nombre, congelar(campos.get(nombre)))
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError("EstadoModelo es inmutable; use reemplazar() para obtener una instantánea nueva")
+
+    def reemplazar(self, **cambios):
+        """Devuelve una instantánea nueva con los campos indicados cambiados y la versión incrementada"""
+        campos = {nombre: getattr(self, nombre) for nombre in self.__slots__}
+        campos.update(cambios)
+        campos['version'] = self.version + 1
+        return EstadoModelo(**campos)
+
+    def __reduce__(self):
+        # Las asignaciones están bloqueadas: al deserializar se reconstruye a través del constructor
+        return (_restaurar_estado, ({nombre: getattr(self, nombre) for nombre in self.__slots__},))
+
+    @classmethod
+    def vacio(cls):
+        """Instantánea inicial, antes de cargar datos"""
+        return cls(
+            version=0,
+            hoteles_df=pd.DataFrame(),
+            ids_hoteles=np.zeros(0, dtype=np.int32),
+            indice_facetas=IndiceFacetas(pd.DataFrame()),
+            columnas_hoteles=columnas_hoteles(pd.DataFrame()),
+            vectorizador=TfidfVectorizer(stop_words='english'),
+            ids_usuarios=np.zeros(0, dtype=np.int32),
+        )
+
+
+def _restaurar_estado(campos):
+    return EstadoModelo(**campos)
+
 
 class SistemaRecomendacion:
-    def __init__(self):
-        self.conexion = mysql.connector.connect(**DB_CONFIG)
-        self.cursor = self.conexion.cursor(dictionary=True)
-        self.matriz_ratings = None
-        self.similitud_hoteles = None
-        self.vectorizador = TfidfVectorizer(stop_words='english')
-        
+    def __init__(self, k_vecinos=50, tam_bloque=512, tam_cache_consultas=1024,
+                 modo_busqueda='exacto', parametros_ann=None, k_vecinos_hoteles=20, tam_lectura=10000,
+                 fuente=None, modo_recomendacion='vecinos', parametros_als=None, capacidad_hotel=10,
+                 cache_resultados=None):
+        # Estructuras del filtrado colaborativo, calculadas una sola vez en cargar_datos
+        self.k_vecinos = k_vecinos
+        self.tam_bloque = tam_bloque
+        # Hoteles similares que se guardan por hotel (por contenido TF-IDF)
+        self.k_vecinos_hoteles = k_vecinos_hoteles
+        # Filas de valoraciones que se leen de la base de datos por bloque
+        self.tam_lectura = tam_lectura
+        # De dónde se leen hoteles y valoraciones: MySQL por defecto (FuenteSQLite para pruebas y benchmarks)
+        self.fuente = fuente or FuenteMySQL()
+        # Resultados recientes por usuario y por texto (por defecto, solo en memoria con tam_cache_consultas entradas)
+        self.cache_resultados = cache_resultados or CacheResultados(tam_cache_consultas)
+        # Marcas de valoraciones desde las que son válidos los resultados en caché: de todas las consultas o
+        # usuarios (desde la última carga completa) y de cada usuario afectado por valoraciones nuevas
+        self._vigencia_consultas = None
+        self._vigencia_usuarios = None
+        self._cambios_usuarios = {}
+        # Búsqueda por texto: 'exacto' (coseno contra todo el catálogo) o 'ann' (índice IVF aproximado)
+        if modo_busqueda not in ('exacto', 'ann'):
+            raise ValueError(f"Modo de búsqueda desconocido: {modo_busqueda}")
+        self.modo_busqueda = modo_busqueda
+        self.parametros_ann = parametros_ann or {}
+        # Recomendación por usuario: 'vecinos' (filtrado colaborativo con las valoraciones) o 'als'
+        # (factorización implícita de valoraciones e interacciones, ver modelo_als.py)
+        if modo_recomendacion not in ('vecinos', 'als'):
+            raise ValueError(f"Modo de recomendación desconocido: {modo_recomendacion}")
+        self.modo_recomendacion = modo_recomendacion
+        self.parametros_als = dict(PARAMETROS_ALS, **(parametros_als or {}))
+        # Habitaciones por hotel: con tantas reservas activas en alguna noche, el hotel está completo
+        self.capacidad_hotel = capacidad_hotel
+        # Instantánea vigente del modelo: los lectores la toman sin bloqueo y los refrescos la reemplazan
+        self._estado = EstadoModelo.vacio()
+        # Serializa las reconstrucciones (solo escritores)
+        self._bloqueo = threading.RLock()
+
+    @property
+    def estado(self):
+        """Instantánea vigente; para lecturas coherentes, tomarla una vez y usar solo esa referencia"""
+        return self._estado
+
+    def __getattr__(self, nombre):
+        # Compatibilidad: sistema.hoteles_df, sistema.matriz_ratings, etc. leen de la instantánea vigente
+        if nombre in EstadoModelo.__slots__:
+            return getattr(self._estado, nombre)
+        raise AttributeError(f"'{type(self).__name__}' no tiene el atributo '{nombre}'")
+
+    @cronometrado('bd_hoteles')
+    def _leer_hoteles(self, marca=None):
+        """Lee los hoteles, o solo los creados después de la marca de agua indicada"""
+        return self.fuente.leer_hoteles(marca)
+
+    @cronometrado('bd_valoraciones')
+    def _leer_valoraciones(self, marca=None):
+        """Lee las valoraciones, o solo las registradas después de la marca de agua indicada, en arreglos NumPy"""
+        return volcar_valoraciones(self.fuente.leer_valoraciones(marca, self.tam_lectura))
+
+    @cronometrado('bd_reservas')
+    def _leer_reservas(self, marca=None):
+        """Lee las reservas activas, o solo las modificadas después de la marca de agua indicada"""
+        return self.fuente.leer_reservas(marca)
+
+    def _actualizar_reservas(self, indice, filas, ids_hoteles, marca_anterior=None):
+        """Aplica las reservas leídas sobre el índice de disponibilidad (o lo crea) y avanza su marca de agua"""
+        return {
+            'indice_reservas': (indice or IndiceReservas()).con_cambios(filas, ids_hoteles),
+            'marca_reservas': self._calcular_marca(filas, 'fecha_actualizacion', 'id_reservas', marca_anterior),
+        }
+
+    @cronometrado('bd_interacciones')
+    def _leer_interacciones(self):
+        """Lee las interacciones de usuarios con hoteles en arreglos NumPy (usuarios, hoteles, pesos)"""
+        return volcar_interacciones(self.fuente.leer_interacciones(self.tam_lectura))
+
+    @staticmethod
+    def _preparar_hoteles(hoteles):
+        """Construye el DataFrame de hoteles con el texto de características"""
+        hoteles_df = pd.DataFrame(hoteles)
+        # Concatenación vectorizada por columnas (los campos vacíos no aportan texto)
+        descripcion, categoria, ubicacion = (
+            hoteles_df[columna].fillna("").astype(str) for columna in ('descripcion', 'categoria', 'ubicacion')
+        )
+        hoteles_df['caracteristicas'] = descripcion.str.cat([categoria, ubicacion], sep=" ")
+        return hoteles_df
+
+    @staticmethod
+    def _calcular_marca(filas, columna_fecha, columna_id, marca_anterior=None):
+        """Devuelve la marca de agua (fecha, id) de la fila más reciente"""
+        if not filas:
+            return marca_anterior
+        return max((fila[columna_fecha], fila[columna_id]) for fila in filas)
+
+    def _publicar(self, estado):
+        """Publica una instantánea nueva del modelo"""
+        # Asignar una referencia es atómico: cada lector ve la instantánea anterior o la nueva, nunca una mezcla
+        self._estado = estado
+
+    @cronometrado('cargar_datos')
     def cargar_datos(self):
         """Carga los datos necesarios de la base de datos"""
-        # Cargar ratings
-        self.cursor.execute("""
-            SELECT id_usuario, id_hotel, puntuacion
-            FROM valoraciones
-        """)
-        ratings = self.cursor.fetchall()
-
-        if ratings: # Solo crear matriz de ratings si hay datos
-            self.matriz_ratings = pd.DataFrame(ratings).pivot(
-                index='id_usuario',
-                columns='id_hotel',
-                values='puntuacion'
-            ).fillna(0)
+        with self._bloqueo:
+            estado = {'version': self._estado.version + 1}
+
+            # Cargar información de hoteles (ordenada por id para poder indexarla con searchsorted)
+            hoteles = self._leer_hoteles()
+            estado['vectorizador'] = TfidfVectorizer(stop_words='english')
+
+            if hoteles: # Crear DataFrame de hoteles si hay datos
+                estado['hoteles_df'] = self._preparar_hoteles(hoteles)
+                estado['ids_hoteles'] = estado['hoteles_df']['id_hotel'].to_numpy(dtype=np.int32)
+
+                # Calcular los hoteles más similares a cada hotel solo si hay datos
+                with medir('tfidf'):
+                    estado['matriz_tfidf'] = normalize(
+                        estado['vectorizador'].fit_transform(estado['hoteles_df']['caracteristicas'])
+                    ).tocsr()
+                with medir('vecinos_hoteles'):
+                    estado['vecinos_hoteles'], estado['similitud_vecinos_hoteles'] = calcular_vecinos_hoteles(
+                        estado['matriz_tfidf'], self.k_vecinos_hoteles
+                    )
+                estado['indice_ann'] = self._construir_indice_ann(estado['matriz_tfidf'])
+
+            else:
+                estado['hoteles_df'] = pd.DataFrame() # Inicializar como DataFrame vacío si no hay hoteles
+                estado['ids_hoteles'] = np.zeros(0, dtype=np.int32)
+                estado['matriz_tfidf'] = None
+                estado['vecinos_hoteles'] = None
+                estado['similitud_vecinos_hoteles'] = None
+                estado['indice_ann'] = None
+            estado['marca_hoteles'] = self._calcular_marca(hoteles, 'fecha_creacion', 'id_hotel')
+            estado['indice_facetas'] = IndiceFacetas(estado['hoteles_df'])
+            estado['columnas_hoteles'] = columnas_hoteles(estado['hoteles_df'])
+
+            # Cargar ratings
+            ratings = self._leer_valoraciones()
+            with medir('matriz_ratings'):
+                estado['matriz_ratings'], estado['ids_usuarios'] = construir_matriz_ratings(
+                    ratings.usuarios, ratings.hoteles, ratings.puntuaciones, estado['ids_hoteles']
+                )
+            estado['marca_valoraciones'] = ratings.marca
+            if self.modo_recomendacion == 'als':
+                estado.update(self._entrenar_als(
+                    estado['matriz_ratings'], estado['ids_usuarios'], estado['ids_hoteles']
+                ))
+            estado.update(self._construir_vecinos_usuarios(estado['matriz_ratings']))
+            estado.update(self._actualizar_reservas(None, self._leer_reservas(), estado['ids_hoteles']))
+
+            self._reiniciar_vigencia(estado['marca_valoraciones'])
+            self._publicar(EstadoModelo(**estado))
+
+    def _parametros_paquete(self):
+        """Parámetros del sistema que debe compartir un paquete guardado para poder reutilizarlo"""
+        return {
+            'k_vecinos': self.k_vecinos,
+            'k_vecinos_hoteles': self.k_vecinos_hoteles,
+            'modo_busqueda': self.modo_busqueda,
+            'parametros_ann': self.parametros_ann,
+            'modo_recomendacion': self.modo_recomendacion,
+            'parametros_als': self.parametros_als if self.modo_recomendacion == 'als' else None,
+        }
+
+    @cronometrado('guardar_modelo')
+    def guardar_modelo(self, directorio):
+        """Guarda la instantánea vigente en un paquete versionado en disco; devuelve su ruta"""
+        estado = self._estado
+        if estado.matriz_ratings is None:
+            return None
+        return guardar_paquete(estado, directorio, self._parametros_paquete())
+
+    @cronometrado('cargar_modelo')
+    def cargar_modelo(self, directorio):
+        """Arranca desde el paquete guardado en disco (arreglos mapeados en memoria) y lo pone al día
+
+        Devuelve el número de filas nuevas leídas de la base de datos, o None si no hay un paquete
+        compatible con los parámetros del sistema (en ese caso hay que llamar a cargar_datos).
+        """
+        paquete = cargar_paquete(directorio)
+        if paquete is None or paquete[1] != self._parametros_paquete():
+            return None
+        campos, _ = paquete
+        with self._bloqueo:
+            campos['indice_facetas'] = IndiceFacetas(campos['hoteles_df'])
+            campos['columnas_hoteles'] = columnas_hoteles(campos['hoteles_df'])
+            self._reiniciar_vigencia(campos['marca_valoraciones'])
+            self._publicar(EstadoModelo(**campos))
+            # El paquete puede ser anterior a los últimos cambios: leer solo lo posterior a su marca de agua
+            return self.refrescar()
+
+    def iniciar(self, directorio=None):
+        """Carga el modelo desde el paquete en disco si existe y, si no, lo entrena desde la base de datos
+
+        El paquete se vuelve a guardar cuando se entrenó o cuando la base de datos tenía filas nuevas.
+        """
+        nuevas = self.cargar_modelo(directorio) if directorio else None
+        if nuevas is None:
+            self.cargar_datos()
+        if directorio and nuevas != 0:
+            try:
+                self.guardar_modelo(directorio)
+            except OSError as e:
+                print(f"Error al guardar el paquete del modelo: {e}")
+
+    @cronometrado('refrescar')
+    def refrescar(self):
+        """Incorpora los hoteles, valoraciones y reservas nuevos desde la última carga sin releer las tablas completas
+
+        Devuelve el número de hoteles y valoraciones nuevos incorporados (las reservas no cuentan: no
+        forman parte del paquete guardado y se leen de nuevo al arrancar).
+        """
+        with self._bloqueo:
+            actual = self._estado
+            if actual.matriz_ratings is None:
+                self.cargar_datos()
+                return 0
+
+            hoteles = self._leer_hoteles(actual.marca_hoteles)
+            ratings = self._leer_valoraciones(actual.marca_valoraciones)
+            reservas = self._leer_reservas(actual.marca_reservas)
+            n_ratings = len(ratings.usuarios)
+            contar('refresco_hoteles', len(hoteles))
+            contar('refresco_valoraciones', n_ratings)
+            contar('refresco_reservas', len(reservas))
+            if not hoteles and not n_ratings:
+                if reservas:
+                    self._publicar(actual.reemplazar(**self._actualizar_reservas(
+                        actual.indice_reservas, reservas, actual.ids_hoteles, actual.marca_reservas
+                    )))
+                return 0
+
+            cambios = {}
+            ids_hoteles = actual.ids_hoteles
+            matriz_ratings = actual.matriz_ratings
+
+            if hoteles:
+                nuevos_df = self._preparar_hoteles(hoteles)
+                ids_nuevos = nuevos_df['id_hotel'].to_numpy(dtype=np.int32)
+                if len(ids_hoteles) == 0 or ids_nuevos.min() <= ids_hoteles[-1]:
+                    # Los ids nuevos no quedan al final del catálogo: reconstruir el modelo completo
+                    self.cargar_datos()
+                    return len(hoteles) + n_ratings
+
+                # Vectorizar solo los hoteles nuevos con el vocabulario ya ajustado
+                tfidf_nuevos = normalize(actual.vectorizador.transform(nuevos_df['caracteristicas']))
+                cambios['matriz_tfidf'] = sparse.vstack([actual.matriz_tfidf, tfidf_nuevos]).tocsr()
+                # Los hoteles nuevos pueden entrar en las listas de vecinos de los existentes
+                vecinos, similitudes = fusionar_vecinos_hoteles(
+                    actual.vecinos_hoteles, actual.similitud_vecinos_hoteles,
+                    actual.matriz_tfidf, tfidf_nuevos, len(ids_hoteles)
+                )
+                vecinos_nuevos, similitudes_nuevas = calcular_vecinos_hoteles(
+                    cambios['matriz_tfidf'], self.k_vecinos_hoteles,
+                    filas=np.arange(len(ids_hoteles), len(ids_hoteles) + len(ids_nuevos))
+                )
+                cambios['vecinos_hoteles'] = np.vstack((vecinos, vecinos_nuevos))
+                cambios['similitud_vecinos_hoteles'] = np.vstack((similitudes, similitudes_nuevas))
+                if actual.indice_ann is not None:
+                    # Los hoteles nuevos se asignan a las listas existentes sin reentrenar el índice
+                    cambios['indice_ann'] = actual.indice_ann.con_documentos(tfidf_nuevos)
+                cambios['hoteles_df'] = pd.concat([actual.hoteles_df, nuevos_df], ignore_index=True)
+                cambios['indice_facetas'] = IndiceFacetas(cambios['hoteles_df'])
+                cambios['columnas_hoteles'] = columnas_hoteles(cambios['hoteles_df'])
+                ids_hoteles = np.concatenate((ids_hoteles, ids_nuevos))
+                cambios['ids_hoteles'] = ids_hoteles
+                cambios['marca_hoteles'] = self._calcular_marca(hoteles, 'fecha_creacion', 'id_hotel')
+
+                # Los hoteles nuevos se agregan como columnas vacías al final de la matriz de ratings
+                matriz_ratings = sparse.csr_matrix(
+                    (matriz_ratings.data, matriz_ratings.indices, matriz_ratings.indptr),
+                    shape=(matriz_ratings.shape[0], len(ids_hoteles))
+                )
+
+            if n_ratings:
+                valoraciones, afectados = self._aplicar_valoraciones(actual, ratings, matriz_ratings, ids_hoteles)
+                cambios.update(valoraciones)
+                cambios['marca_valoraciones'] = ratings.marca
+            else:
+                cambios['matriz_ratings'] = matriz_ratings
+                cambios.update(self._construir_vecinos_usuarios(matriz_ratings, actual.vecinos_usuarios))
+            if actual.factores_usuarios is not None:
+                cambios.update(self._actualizar_als(actual, cambios, ratings))
+            if reservas:
+                cambios.update(self._actualizar_reservas(
+                    actual.indice_reservas, reservas, ids_hoteles, actual.marca_reservas
+                ))
+
+            if n_ratings:
+                # Con los factores ALS solo cambian los usuarios que calificaron; con vecinos, también los
+                # que comparten hoteles con ellos. Se invalida antes de publicar la instantánea nueva.
+                if self.modo_recomendacion == 'als':
+                    afectados = np.unique(ratings.usuarios)
+                self._invalidar_usuarios(afectados, ratings.marca, len(cambios['ids_usuarios']))
+            self._publicar(actual.reemplazar(**cambios))
+            return len(hoteles) + n_ratings
+
+    def _reiniciar_vigencia(self, marca_valoraciones):
+        """Tras una carga completa solo valen los resultados en caché calculados con estos datos o posteriores"""
+        marca = marca_cache(marca_valoraciones)
+        self._vigencia_consultas = self._vigencia_usuarios = marca
+        self._cambios_usuarios = {}
+
+    def _invalidar_usuarios(self, ids_usuarios, marca_valoraciones, n_usuarios):
+        """Descarta los resultados en caché de los usuarios indicados calculados antes de la marca de valoraciones"""
+        marca = marca_cache(marca_valoraciones)
+        if len(ids_usuarios) > n_usuarios // 2:
+            # Casi todos los usuarios: es más barato mover la vigencia de todos
+            self._vigencia_usuarios = marca
+            self._cambios_usuarios = {}
         else:
-            self.matriz_ratings = pd.DataFrame() # Inicializar como DataFrame vacío si no hay ratings
-            self.similitud_hoteles = None # O inicializar a una matriz vacía si es necesario
-
-        # Cargar información de hoteles
-        self.cursor.execute("""
-            SELECT h.*, GROUP_CONCAT(i.imagen_url) as imagenes
-            FROM hoteles h
-            LEFT JOIN imagenes_hoteles i ON h.id_hotel = i.id_hotel
-            GROUP BY h.id_hotel
-        """)
-        hoteles = self.cursor.fetchall()
-
-        if hoteles: # Crear DataFrame de hoteles si hay datos
-            self.hoteles_df = pd.DataFrame(hoteles)
-            self.hoteles_df['caracteristicas'] = self.hoteles_df.apply(
-                lambda x: f"{x['descripcion']} {x['categoria']} {x['ubicacion']}",
-                axis=1
+            self._cambios_usuarios.update(dict.fromkeys(np.asarray(ids_usuarios).tolist(), marca))
+
+    def _vigencia_usuario(self, id_usuario):
+        vigencias = [m for m in (self._vigencia_usuarios, self._cambios_usuarios.get(id_usuario)) if m is not None]
+        return max(vigencias) if vigencias else None
+
+    def _clave_usuario(self, estado, id_usuario, n_recomendaciones):
+        return ('usuario', self.modo_recomendacion, marca_cache(estado.marca_hoteles), id_usuario, n_recomendaciones)
+
+    def _clave_consulta(self, estado, consulta, n_recomendaciones):
+        return ('consulta', self.modo_busqueda, marca_cache(estado.marca_hoteles), consulta, n_recomendaciones)
+
+    def consulta_en_cache(self, consulta, n_recomendaciones, estado=None):
+        """Resultado guardado de una búsqueda por texto (ya normalizada) sin fechas, o None"""
+        estado = estado or self._estado
+        return self.cache_resultados.obtener(
+            self._clave_consulta(estado, consulta, n_recomendaciones), self._vigencia_consultas
+        )
+
+    def guardar_consulta(self, consulta, n_recomendaciones, resultado, estado=None):
+        estado = estado or self._estado
+        self.cache_resultados.guardar(
+            self._clave_consulta(estado, consulta, n_recomendaciones), tuple(resultado),
+            marca_cache(estado.marca_valoraciones)
+        )
+
+    @cronometrado('indice_ann')
+    def _construir_indice_ann(self, matriz_tfidf):
+        """Construye el índice aproximado de búsqueda por texto si el modo 'ann' está activo"""
+        if self.modo_busqueda != 'ann':
+            return None
+        return IndiceIVF(**self.parametros_ann).construir(matriz_tfidf)
+
+    def _aplicar_valoraciones(self, actual, ratings, matriz_ratings, ids_hoteles):
+        """Aplica valoraciones nuevas sobre la matriz de ratings y recalcula solo los vecinos afectados
+
+        Devuelve los campos nuevos de la instantánea y los ids de los usuarios afectados.
+        """
+        delta, ids_delta = construir_matriz_ratings(
+            ratings.usuarios, ratings.hoteles, ratings.puntuaciones, ids_hoteles
+        )
+
+        # Insertar filas vacías para los usuarios nuevos manteniendo los ids ordenados
+        ids_usuarios = np.union1d(actual.ids_usuarios, ids_delta).astype(np.int32)
+        posiciones_previas = np.searchsorted(ids_usuarios, actual.ids_usuarios)
+        matriz_ratings = expandir_filas(matriz_ratings, posiciones_previas, len(ids_usuarios))
+        vecinos = actual.vecinos_usuarios
+        if vecinos is not None:
+            vecinos = expandir_filas(vecinos, posiciones_previas, len(ids_usuarios))
+            vecinos = sparse.csr_matrix(
+                (vecinos.data, posiciones_previas[vecinos.indices], vecinos.indptr),
+                shape=(len(ids_usuarios), len(ids_usuarios))
+            )
+        delta = expandir_filas(delta, np.searchsorted(ids_usuarios, ids_delta), len(ids_usuarios))
+
+        # Las valoraciones nuevas sustituyen a las anteriores del mismo usuario y hotel
+        patron = delta.copy()
+        patron.data[:] = 1
+        matriz_ratings = (matriz_ratings - matriz_ratings.multiply(patron) + delta).tocsr()
+        matriz_ratings.eliminate_zeros()
+
+        # Solo cambia la similitud de los usuarios que comparten algún hotel con los usuarios modificados
+        filas_modificadas = np.flatnonzero(np.diff(delta.indptr))
+        hoteles_afectados = np.zeros(len(ids_hoteles), dtype=np.float32)
+        hoteles_afectados[matriz_ratings[filas_modificadas].indices] = 1
+        afectados = np.flatnonzero(matriz_ratings @ hoteles_afectados)
+
+        estado = {'matriz_ratings': matriz_ratings, 'ids_usuarios': ids_usuarios}
+        estado.update(self._construir_vecinos_usuarios(matriz_ratings, vecinos, afectados))
+        return estado, ids_usuarios[afectados]
+
+    @cronometrado('vecinos_usuarios')
+    def _construir_vecinos_usuarios(self, matriz_ratings, vecinos=None, filas=None):
+        """Calcula los k vecinos más similares de cada usuario, o solo de las `filas` indicadas"""
+        # Matriz binaria de hoteles calificados que comparte la estructura de la matriz de ratings
+        calificados = sparse.csr_matrix(
+            (np.ones_like(matriz_ratings.data), matriz_ratings.indices, matriz_ratings.indptr),
+            shape=matriz_ratings.shape
+        )
+        if self.modo_recomendacion == 'als':
+            # Los factores ALS sustituyen a los vecinos: no hace falta calcularlos
+            return {'vecinos_usuarios': None, 'calificados': calificados}
+        if vecinos is None:
+            vecinos = calcular_vecinos_usuarios(matriz_ratings, self.k_vecinos, self.tam_bloque)
+        elif filas is not None and len(filas):
+            nuevas = calcular_vecinos_usuarios(matriz_ratings, self.k_vecinos, self.tam_bloque, filas)
+            vecinos = reemplazar_filas(vecinos, filas, nuevas)
+        return {'vecinos_usuarios': vecinos, 'calificados': calificados}
+
+    @cronometrado('entrenar_als')
+    def _entrenar_als(self, matriz_ratings, ids_usuarios, ids_hoteles):
+        """Entrena los factores ALS con las valoraciones y las interacciones de la base de datos
+
+        Los usuarios que solo tienen interacciones se agregan como filas vacías de la matriz de ratings.
+        """
+        usuarios, hoteles, pesos = self._leer_interacciones()
+        ids = np.union1d(ids_usuarios, usuarios).astype(np.int32)
+        if len(ids) != len(ids_usuarios):
+            matriz_ratings = expandir_filas(matriz_ratings, np.searchsorted(ids, ids_usuarios), len(ids))
+        matriz_interacciones = construir_matriz_interacciones(usuarios, hoteles, pesos, ids, ids_hoteles)
+        factores_usuarios, factores_hoteles = entrenar_als(
+            matriz_confianza(matriz_ratings, matriz_interacciones), **self.parametros_als
+        )
+        return {
+            'matriz_ratings': matriz_ratings,
+            'ids_usuarios': ids,
+            'matriz_interacciones': matriz_interacciones,
+            'factores_usuarios': factores_usuarios,
+            'factores_hoteles': factores_hoteles,
+        }
+
+    @cronometrado('actualizar_als')
+    def _actualizar_als(self, actual, cambios, ratings):
+        """Incorpora hoteles y valoraciones nuevos a los factores ALS sin reentrenar
+
+        Se resuelven los factores de los hoteles nuevos con los de los usuarios fijos y luego los de
+        los usuarios con valoraciones nuevas. Las interacciones nuevas se incorporan en la próxima
+        carga completa.
+        """
+        matriz_ratings = cambios['matriz_ratings']
+        ids_usuarios = cambios.get('ids_usuarios', actual.ids_usuarios)
+        n_usuarios, n_hoteles = matriz_ratings.shape
+        n_hoteles_previos, n_factores = actual.factores_hoteles.shape
+
+        posiciones_previas = np.searchsorted(ids_usuarios, actual.ids_usuarios)
+        interacciones = actual.matriz_interacciones
+        interacciones = expandir_filas(
+            sparse.csr_matrix(
+                (interacciones.data, interacciones.indices, interacciones.indptr),
+                shape=(interacciones.shape[0], n_hoteles)
+            ),
+            posiciones_previas, n_usuarios
+        )
+        factores_usuarios = np.zeros((n_usuarios, n_factores), dtype=np.float32)
+        factores_usuarios[posiciones_previas] = actual.factores_usuarios
+        factores_hoteles = np.zeros((n_hoteles, n_factores), dtype=np.float32)
+        factores_hoteles[:n_hoteles_previos] = actual.factores_hoteles
+
+        confianza = matriz_confianza(matriz_ratings, interacciones)
+        regularizacion, alfa = self.parametros_als['regularizacion'], self.parametros_als['alfa']
+        if n_hoteles > n_hoteles_previos:
+            factores_hoteles[n_hoteles_previos:] = resolver_factores(
+                factores_usuarios, confianza[:, n_hoteles_previos:].T, regularizacion, alfa
             )
+        filas = buscar_posiciones(ids_usuarios, np.unique(ratings.usuarios))
+        filas = filas[filas >= 0]
+        if len(filas):
+            factores_usuarios[filas] = resolver_factores(factores_hoteles, confianza, regularizacion, alfa, filas=filas)
+        return {
+            'matriz_interacciones': interacciones,
+            'factores_usuarios': factores_usuarios,
+            'factores_hoteles': factores_hoteles,
+        }
+
+    def hoteles_ocupados(self, entrada, salida, estado=None):
+        """Máscara por hotel (filas de hoteles_df) de los que están completos alguna noche de [entrada, salida)
+
+        Devuelve None si no se indica un rango de fechas.
+        """
+        if entrada is None or salida is None:
+            return None
+        if pd.Timestamp(salida) <= pd.Timestamp(entrada):
+            raise ValueError("La fecha de salida debe ser posterior a la de entrada")
+        estado = estado or self._estado
+        n_hoteles = len(estado.ids_hoteles)
+        if estado.indice_reservas is None:
+            return np.zeros(n_hoteles, dtype=bool)
+        return estado.indice_reservas.ocupacion_maxima(entrada, salida, n_hoteles) >= self.capacidad_hotel
+
+    def recomendar_por_usuario(self, id_usuario, n_recomendaciones=5, entrada=None, salida=None, estado=None):
+        """Genera recomendaciones basadas en el historial del usuario (filtrado colaborativo o factores ALS)
+
+        Con un rango de fechas [entrada, salida) solo se recomiendan hoteles con disponibilidad.
+        """
+        return self.recomendar_por_usuarios(
+            [id_usuario], n_recomendaciones, entrada=entrada, salida=salida, estado=estado
+        )[0]
+
+    @cronometrado('recomendar_por_usuarios')
+    def recomendar_por_usuarios(self, ids_usuarios, n_recomendaciones=5, tam_bloque=None, entrada=None, salida=None,
+                                estado=None, usar_cache=True):
+        """Recomendaciones de varios usuarios a la vez: una lista de (id_hotel, puntuacion) por id, en el mismo orden
+
+        Los usuarios se puntúan por bloques de `tam_bloque` (por defecto el del sistema) con productos
+        de matrices dispersas, así la memoria queda acotada a tam_bloque×hoteles. Los ids desconocidos
+        reciben una lista vacía. Sin fechas, los resultados se sirven de la caché de resultados y se
+        guardan en ella (`usar_cache=False` lo evita, por ejemplo en procesos por lotes de todos los usuarios).
+        """
+        # Una sola lectura de la instantánea: el resto del cálculo no ve refrescos concurrentes
+        estado = estado or self._estado
+        ids_usuarios = np.atleast_1d(np.asarray(ids_usuarios, dtype=np.int64))
+        resultado = [[] for _ in range(len(ids_usuarios))]
+        if estado.matriz_ratings is None or len(ids_usuarios) == 0:
+            return resultado
+        ocupados = self.hoteles_ocupados(entrada, salida, estado)
+        posiciones = buscar_posiciones(estado.ids_usuarios, ids_usuarios)
+        pendientes = np.flatnonzero(posiciones >= 0)
+        tam_bloque = tam_bloque or self.tam_bloque
+
+        # La disponibilidad cambia con cada reserva: las recomendaciones con fechas no pasan por la caché
+        usar_cache = usar_cache and ocupados is None
+        if usar_cache:
+            claves, faltan = {}, []
+            for i in pendientes.tolist():
+                id_usuario = int(ids_usuarios[i])
+                claves[i] = self._clave_usuario(estado, id_usuario, n_recomendaciones)
+                guardado = self.cache_resultados.obtener(claves[i], self._vigencia_usuario(id_usuario))
+                if guardado is None:
+                    faltan.append(i)
+                else:
+                    resultado[i] = list(guardado)
+            pendientes = np.array(faltan, dtype=np.int64)
+            marca = marca_cache(estado.marca_valoraciones)
+
+        for inicio in range(0, len(pendientes), tam_bloque):
+            bloque = pendientes[inicio:inicio + tam_bloque]
+            ids_hoteles, puntuaciones = puntuar_usuarios(estado, posiciones[bloque], n_recomendaciones, ocupados)
+            for i, ids, valores in zip(bloque.tolist(), ids_hoteles, puntuaciones):
+                validos = ids >= 0
+                resultado[i] = list(zip(ids[validos].tolist(), valores[validos].tolist()))
+                if usar_cache:
+                    self.cache_resultados.guardar(claves[i], tuple(resultado[i]), marca)
+        return resultado
+
+    @cronometrado('bd_precalculadas')
+    def recomendaciones_precalculadas(self, id_usuario, n_recomendaciones=5, entrada=None, salida=None, estado=None):
+        """Lee las recomendaciones precalculadas del usuario; None si no las tiene o no se pueden leer
+
+        Con un rango de fechas se descartan los hoteles completos, y si no quedan n se devuelve None.
+        """
+        estado = estado or self._estado
+        try:
+            filas = self.fuente.leer_precalculadas(id_usuario)
+        except Exception as e:
+            print(f"Error al leer recomendaciones precalculadas: {e}")
+            return None
+        if not filas:
+            return None
+
+        # Descartar los hoteles que el usuario calificó después del último cálculo
+        calificados = ()
+        idx_usuario = buscar_posiciones(estado.ids_usuarios, id_usuario)[0]
+        if idx_usuario >= 0 and estado.matriz_ratings is not None:
+            matriz = estado.matriz_ratings
+            inicio, fin = matriz.indptr[idx_usuario], matriz.indptr[idx_usuario + 1]
+            calificados = set(estado.ids_hoteles[matriz.indices[inicio:fin]].tolist())
+        resultado = [(id_hotel, puntuacion) for id_hotel, puntuacion in filas if id_hotel not in calificados]
+        ocupados = self.hoteles_ocupados(entrada, salida, estado)
+        if ocupados is not None:
+            posiciones = buscar_posiciones(estado.ids_hoteles, [id_hotel for id_hotel, _ in resultado])
+            resultado = [
+                fila for fila, posicion in zip(resultado, posiciones) if posicion < 0 or not ocupados[posicion]
+            ]
+            if len(resultado) < n_recomendaciones:
+                return None
+        return resultado[:n_recomendaciones] or None
 
-            # Calcular similitud entre hoteles solo si hay datos
-            tfidf_matrix = self.vectorizador.fit_transform(self.hoteles_df['caracteristicas'])
-            self.similitud_hoteles = cosine_similarity(tfidf_matrix)
+    def recomendar_usuario(self, id_usuario, n_recomendaciones=5, entrada=None, salida=None, estado=None):
+        """Sirve las recomendaciones precalculadas del usuario y, si no las hay, las calcula en línea"""
+        estado = estado or self._estado
+        recomendaciones = self.recomendaciones_precalculadas(id_usuario, n_recomendaciones, entrada, salida, estado)
+        if recomendaciones is None:
+            recomendaciones = self.recomendar_por_usuario(id_usuario, n_recomendaciones, entrada, salida, estado)
+        return recomendaciones
 
+    @cronometrado('recomendar_por_caracteristicas')
+    def recomendar_por_caracteristicas(self, descripcion, n_recomendaciones=5, entrada=None, salida=None, estado=None):
+        """Genera recomendaciones basadas en características
+
+        Con un rango de fechas [entrada, salida) se descartan los hoteles completos; esas búsquedas
+        no pasan por la caché, porque la disponibilidad cambia con cada reserva.
+        """
+        # Una sola lectura de la instantánea: un refresco concurrente publica otra sin modificar esta
+        estado = estado or self._estado
+        matriz_tfidf, vectorizador = estado.matriz_tfidf, estado.vectorizador
+        ids_hoteles, indice_ann = estado.ids_hoteles, estado.indice_ann
+        if matriz_tfidf is None:
+            return []
+
+        ocupados = self.hoteles_ocupados(entrada, salida, estado)
+        consulta = normalizar_consulta(descripcion)
+        if ocupados is None:
+            resultado = self.consulta_en_cache(consulta, n_recomendaciones, estado)
+            if resultado is not None:
+                return list(resultado)
+
+        # Vectorizar la descripción (el vectorizador ya normaliza en L2)
+        descripcion_vector = vectorizador.transform([consulta])
+
+        if indice_ann is not None:
+            # Solo se puntúan los hoteles de las listas del índice más cercanas a la consulta; se piden
+            # tantos candidatos de más como hoteles completos, para que queden n con disponibilidad
+            n_candidatos = min(n_recomendaciones + (0 if ocupados is None else int(ocupados.sum())), len(ids_hoteles))
+            indices_similares, similitudes = indice_ann.buscar(descripcion_vector, n_candidatos, matriz_tfidf)
+            if ocupados is not None:
+                libres = ~ocupados[indices_similares]
+                indices_similares = indices_similares[libres][:n_recomendaciones]
+                similitudes = similitudes[libres][:n_recomendaciones]
         else:
-            self.hoteles_df = pd.DataFrame() # Inicializar como DataFrame vacío si no hay hoteles
-            self.similitud_hoteles = None # O inicializar a una matriz vacía si es necesario
-        
-    def recomendar_por_usuario(self, id_usuario, n_recomendaciones=5):
-        """Genera recomendaciones basadas en el historial del usuario usando filtrado colaborativo basado en usuarios"""
-        if id_usuario not in self.matriz_ratings.index:
+            # Con filas normalizadas, la similitud coseno es un único producto disperso
+            similitudes = (matriz_tfidf @ descripcion_vector.T).toarray().ravel()
+            if ocupados is not None:
+                similitudes[ocupados] = -np.inf
+
+            # Obtener índices de los hoteles más similares sin ordenar todo el catálogo
+            with medir('top_n'):
+                indices_similares = seleccionar_top_n(similitudes, n_recomendaciones)
+            similitudes = similitudes[indices_similares]
+            if ocupados is not None:
+                libres = np.isfinite(similitudes)
+                indices_similares, similitudes = indices_similares[libres], similitudes[libres]
+
+        resultado = list(zip(ids_hoteles[indices_similares].tolist(), similitudes.tolist()))
+        if ocupados is None:
+            self.guardar_consulta(consulta, n_recomendaciones, resultado, estado)
+        return resultado
+
+    @cronometrado('hoteles_similares')
+    def hoteles_similares(self, id_hotel, n_similares=5, estado=None):
+        """Devuelve hasta n (id_hotel, similitud) de los hoteles más parecidos al indicado, leyendo su lista de vecinos"""
+        estado = estado or self._estado
+        if estado.vecinos_hoteles is None:
             return []
+        posicion = buscar_posiciones(estado.ids_hoteles, id_hotel)[0]
+        if posicion < 0:
+            return []
+        vecinos = estado.vecinos_hoteles[posicion, :n_similares]
+        validos = vecinos >= 0
+        return list(zip(
+            estado.ids_hoteles[vecinos[validos]].tolist(),
+            estado.similitud_vecinos_hoteles[posicion, :n_similares][validos].tolist()
+        ))
+
+    @cronometrado('obtener_hoteles')
+    def obtener_hoteles(self, ids, estado=None):
+        """Devuelve los registros `Hotel` de los ids indicados, en el mismo orden (None para ids desconocidos)"""
+        estado = estado or self._estado
+        posiciones = buscar_posiciones(estado.ids_hoteles, ids)
+        encontrados = posiciones >= 0
+        # Una sola toma vectorizada por columna, en lugar de filtrar hoteles_df por cada id
+        valores = [columna[posiciones[encontrados]].tolist() for columna in estado.columnas_hoteles]
+        registros = iter(Hotel(*fila) for fila in zip(*valores))
+        return [next(registros) if encontrado else None for encontrado in encontrados]
+
+    @cronometrado('filtrar_hoteles')
+    def filtrar_hoteles(self, categoria=None, zona=None, precio_min=None, precio_max=None, estado=None,
+                        entrada=None, salida=None):
+        """Devuelve las posiciones en hoteles_df de los hoteles que cumplen los filtros, usando el índice de facetas
+
+        Con un rango de fechas [entrada, salida) se quitan los hoteles completos alguna de esas noches.
+        """
+        estado = estado or self._estado
+        posiciones = estado.indice_facetas.filtrar(categoria, zona, precio_min, precio_max)
+        ocupados = self.hoteles_ocupados(entrada, salida, estado)
+        if ocupados is not None:
+            posiciones = posiciones[~ocupados[posiciones]]
+        return posiciones
+
+    def evaluar_busqueda_aproximada(self, consultas, n_recomendaciones=5, n_sondas=None):
+        """Mide el recall@n y la latencia del índice aproximado frente a la búsqueda exacta"""
+        estado = self._estado
+        if estado.indice_ann is None:
+            raise ValueError("El índice aproximado no está construido (use modo_busqueda='ann')")
+        vectores = estado.vectorizador.transform([normalizar_consulta(c) for c in consultas])
+        return evaluar_recall(estado.indice_ann, estado.matriz_tfidf, vectores, n_recomendaciones, n_sondas)
+
+    def evaluar_valoraciones_negativas(self, puntuacion_maxima=1):
+        """Comprueba que los factores ALS no puntúen los hoteles mal valorados por encima de los no valorados"""
+        estado = self._estado
+        if estado.factores_usuarios is None:
+            raise ValueError("Los factores ALS no están entrenados (use modo_recomendacion='als')")
+        return evaluar_valoraciones_negativas(
+            estado.factores_usuarios, estado.factores_hoteles, estado.matriz_ratings, puntuacion_maxima
+        )
 
-        # Calcular similitud entre usuarios
-        matriz = self.matriz_ratings.values
-        similitud_usuarios = cosine_similarity(matriz)
-        usuarios_ids = self.matriz_ratings.index.tolist()
-        idx_usuario = usuarios_ids.index(id_usuario)
-
-        # Obtener las puntuaciones del usuario actual
-        ratings_usuario = matriz[idx_usuario]
-
-        # Hoteles no calificados por el usuario
-        hoteles_no_calificados = np.where(ratings_usuario == 0)[0]
-
-        predicciones = []
-        for idx_hotel in hoteles_no_calificados:
-            # Puntuaciones de otros usuarios para este hotel
-            ratings_otros = matriz[:, idx_hotel]
-            # Similitud de los otros usuarios con el usuario actual
-            similitudes = similitud_usuarios[idx_usuario]
-            # No considerar al propio usuario
-            mask = ratings_otros != 0
-            if np.sum(mask) == 0:
-                continue
-            prediccion = np.dot(similitudes[mask], ratings_otros[mask]) / np.sum(similitudes[mask])
-            id_hotel = self.matriz_ratings.columns[idx_hotel]
-            predicciones.append((id_hotel, prediccion))
-
-        # Ordenar y devolver mejores recomendaciones
-        return sorted(predicciones, key=lambda x: x[1], reverse=True)[:n_recomendaciones]
-        
-    def recomendar_por_caracteristicas(self, descripcion, n_recomendaciones=5):
-        """Genera recomendaciones basadas en características"""
-        # Vectorizar la descripción
-        descripcion_vector = self.vectorizador.transform([descripcion])
-        
-        # Calcular similitud con todos los hoteles
-        similitudes = cosine_similarity(descripcion_vector, self.vectorizador.transform(self.hoteles_df['caracteristicas']))
-        
-        # Obtener índices de los hoteles más similares
-        indices_similares = similitudes[0].argsort()[-n_recomendaciones:][::-1]
-        
-        return [(self.hoteles_df.iloc[idx]['id_hotel'], similitudes[0][idx]) for idx in indices_similares]
-        
     def cerrar_conexion(self):
-        """Cierra la conexión a la base de datos"""
-        self.cursor.close()
-        self.conexion.close() 
\ No newline at end of file
+        """Cierra las conexiones a la base de datos"""
+        # El sistema ya no mantiene una conexión propia: cada lectura toma una del pool compartido
+        self.fuente.cerrar()
+        self.cache_resultados.cerrar()
+
+
+class RefrescadorModelo(threading.Thread):
+    """Hilo en segundo plano que llama periódicamente a `refrescar` sobre el sistema de recomendación"""
+
+    def __init__(self, sistema, intervalo=5.0):
+        super().__init__(name="refrescador-modelo", daemon=True)
+        self.sistema = sistema
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.sistema.refrescar()
+            except Exception as e:
+                print(f"Error al refrescar el modelo de recomendación: {e}")
+
+    def detener(self):
+        """Detiene el hilo después de la iteración en curso"""
+        self._detener.set()
@@ -0,0 +1,179 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from indice_ann import IndiceIVF
+
+# Versión del formato del paquete: un paquete de otro formato se ignora y el modelo se entrena de nuevo
+FORMATO = 2
+# Archivo que apunta a la versión vigente dentro del directorio de paquetes
+ARCHIVO_ACTUAL = "actual.json"
+MANIFIESTO = "manifiesto.json"
+
+# Matrices dispersas y arreglos densos del estado que se guardan como .npy
+MATRICES = ('matriz_tfidf', 'matriz_ratings', 'vecinos_usuarios', 'calificados', 'matriz_interacciones')
+ARREGLOS = (
+    'ids_hoteles', 'ids_usuarios', 'vecinos_hoteles', 'similitud_vecinos_hoteles',
+    'factores_usuarios', 'factores_hoteles',
+)
+
+
+def _marca_a_json(marca):
+    if marca is None:
+        return None
+    fecha, id_fila = marca
+    return [fecha.isoformat() if hasattr(fecha, 'isoformat') else fecha, int(id_fila)]
+
+
+def _marca_desde_json(valor):
+    if valor is None:
+        return None
+    fecha, id_fila = valor
+    return datetime.fromisoformat(fecha) if isinstance(fecha, str) else fecha, id_fila
+
+
+def _escribir_json(ruta, contenido):
+    # Escribir en un temporal y renombrar, para que otros procesos nunca lean un archivo a medias
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        json.dump(contenido, archivo)
+    os.replace(temporal, ruta)
+
+
+def guardar_paquete(estado, directorio, metadatos=None, conservar=2):
+    """Guarda la instantánea del modelo en una versión nueva dentro de `directorio` y la marca como vigente
+
+    Las matrices se guardan como .npy para poder mapearlas en memoria al cargarlas. Se conservan las
+    `conservar` versiones más recientes; las anteriores se borran (los procesos que aún las tengan
+    mapeadas siguen leyéndolas sin problema). Devuelve la ruta de la versión creada.
+    """
+    nombre_version = f"v{datetime.now():%Y%m%d%H%M%S%f}_{os.getpid()}_{estado.version}"
+    ruta = os.path.join(directorio, nombre_version)
+    temporal = f"{ruta}.tmp"
+    os.makedirs(temporal, exist_ok=True)
+
+    formas = {}
+    for nombre in MATRICES:
+        matriz = getattr(estado, nombre)
+        if matriz is None:
+            continue
+        formas[nombre] = list(matriz.shape)
+        for parte in ('data', 'indices', 'indptr'):
+            np.save(os.path.join(temporal, f"{nombre}.{parte}.npy"), getattr(matriz, parte))
+    guardados = []
+    for nombre in ARREGLOS:
+        arreglo = getattr(estado, nombre)
+        if arreglo is not None:
+            np.save(os.path.join(temporal, f"{nombre}.npy"), arreglo)
+            guardados.append(nombre)
+
+    # Vectorizador: basta con el vocabulario y los pesos idf para transformar consultas
+    vectorizador = estado.vectorizador
+    vocabulario = None
+    if hasattr(vectorizador, 'vocabulary_'):
+        vocabulario = {termino: int(indice) for termino, indice in vectorizador.vocabulary_.items()}
+        np.save(os.path.join(temporal, "idf.npy"), vectorizador.idf_)
+
+    parametros_ann = None
+    if estado.indice_ann is not None:
+        parametros_ann = estado.indice_ann.parametros()
+        for nombre, arreglo in estado.indice_ann.arreglos().items():
+            np.save(os.path.join(temporal, f"ann.{nombre}.npy"), arreglo)
+
+    # La tabla de hoteles tiene columnas de texto, fechas y decimales: no se puede mapear en memoria
+    estado.hoteles_df.to_pickle(os.path.join(temporal, "hoteles.pkl"))
+
+    _escribir_json(os.path.join(temporal, MANIFIESTO), {
+        'formato': FORMATO,
+        'creado': datetime.now().isoformat(),
+        'version': estado.version,
+        'marca_hoteles': _marca_a_json(estado.marca_hoteles),
+        'marca_valoraciones': _marca_a_json(estado.marca_valoraciones),
+        'formas': formas,
+        'arreglos': guardados,
+        'vocabulario': vocabulario,
+        'ann': parametros_ann,
+        'metadatos': metadatos or {},
+    })
+    os.replace(temporal, ruta)
+    _escribir_json(os.path.join(directorio, ARCHIVO_ACTUAL), {'version': nombre_version})
+
+    # Borrar las versiones antiguas y los temporales abandonados (no los de otro proceso que esté guardando)
+    versiones = []
+    for version in os.listdir(directorio):
+        ruta_version = os.path.join(directorio, version)
+        if not version.startswith("v") or version == nombre_version:
+            continue
+        if version.endswith(".tmp"):
+            if time.time() - os.path.getmtime(ruta_version) > 3600:
+                shutil.rmtree(ruta_version, ignore_errors=True)
+            continue
+        versiones.append(ruta_version)
+    versiones.sort(key=os.path.getmtime)
+    for ruta_version in versiones[:max(len(versiones) - (conservar - 1), 0)]:
+        shutil.rmtree(ruta_version, ignore_errors=True)
+    return ruta
+
+
+def cargar_paquete(directorio, mapear=True):
+    """Carga la versión vigente del paquete; devuelve (campos, metadatos) o None si no hay un paquete válido
+
+    Con `mapear=True` los arreglos se abren con `np.load(mmap_mode='r')`: las páginas se leen de
+    disco bajo demanda y se comparten entre todos los procesos que cargan la misma versión.
+    """
+    try:
+        with open(os.path.join(directorio, ARCHIVO_ACTUAL), encoding="utf-8") as archivo:
+            ruta = os.path.join(directorio, json.load(archivo)['version'])
+        with open(os.path.join(ruta, MANIFIESTO), encoding="utf-8") as archivo:
+            manifiesto = json.load(archivo)
+    except (OSError, ValueError, KeyError):
+        return None
+    if manifiesto.get('formato') != FORMATO:
+        return None
+
+    try:
+        return _cargar_version(ruta, manifiesto, 'r' if mapear else None)
+    except (OSError, ValueError) as e:
+        # Por ejemplo, una versión borrada por otro proceso mientras se cargaba
+        print(f"Error al cargar el paquete del modelo {ruta}: {e}")
+        return None
+
+
+def _cargar_version(ruta, manifiesto, modo):
+    """Reconstruye los campos del estado a partir de los archivos de una versión"""
+    def cargar(nombre):
+        return np.load(os.path.join(ruta, f"{nombre}.npy"), mmap_mode=modo)
+
+    campos = {
+        'version': manifiesto['version'],
+        'marca_hoteles': _marca_desde_json(manifiesto['marca_hoteles']),
+        'marca_valoraciones': _marca_desde_json(manifiesto['marca_valoraciones']),
+        'hoteles_df': pd.read_pickle(os.path.join(ruta, "hoteles.pkl")),
+    }
+    for nombre in MATRICES:
+        forma = manifiesto['formas'].get(nombre)
+        campos[nombre] = None if forma is None else sparse.csr_matrix(
+            (cargar(f"{nombre}.data"), cargar(f"{nombre}.indices"), cargar(f"{nombre}.indptr")),
+            shape=tuple(forma), copy=False
+        )
+    for nombre in ARREGLOS:
+        campos[nombre] = cargar(nombre) if nombre in manifiesto['arreglos'] else None
+
+    vectorizador = TfidfVectorizer(stop_words='english')
+    if manifiesto['vocabulario'] is not None:
+        vectorizador.vocabulary_ = manifiesto['vocabulario']
+        vectorizador.idf_ = np.load(os.path.join(ruta, "idf.npy"))
+    campos['vectorizador'] = vectorizador
+
+    campos['indice_ann'] = None
+    if manifiesto['ann'] is not None:
+        nombres = ('componentes', 'vectores', 'centroides', 'asignaciones', 'orden', 'inicios')
+        campos['indice_ann'] = IndiceIVF.desde_arreglos(
+            manifiesto['ann'], {nombre: cargar(f"ann.{nombre}") for nombre in nombres}
+        )
+    return campos, manifiesto['metadatos']
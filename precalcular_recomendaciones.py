@@ -0,0 +1,157 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from config import ARCHIVO_PRECALCULADAS, DIR_MODELO, MODO_BUSQUEDA, MODO_RECOMENDACION, PARAMETROS_ALS, PARAMETROS_ANN
+from conexion_bd import conexion
+from modelo_recomendacion import SistemaRecomendacion, puntuar_usuarios
+
+# Uso:
+#   python precalcular_recomendaciones.py [--n 10] [--procesos 4] [--tam-bloque 256]
+#                                         [--destino tabla|archivo] [--archivo recomendaciones.npz]
+
+TABLA = "recomendaciones_precalculadas"
+
+DEFINICION_TABLA = """
+    CREATE TABLE {tabla} (
+        id_usuario INT NOT NULL,
+        posicion SMALLINT NOT NULL,
+        id_hotel INT NOT NULL,
+        puntuacion FLOAT NOT NULL,
+        fecha_calculo TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id_usuario, posicion)
+    )
+"""
+
+# Instantánea del modelo en cada proceso trabajador (se recibe una vez, al iniciar el proceso)
+_estado_trabajador = None
+
+
+def _inicializar_trabajador(estado):
+    global _estado_trabajador
+    _estado_trabajador = estado
+
+
+def _puntuar_bloque(inicio, fin, n):
+    ids_hoteles, puntuaciones = puntuar_usuarios(_estado_trabajador, np.arange(inicio, fin), n)
+    return inicio, ids_hoteles, puntuaciones
+
+
+def precalcular(estado, n=10, tam_bloque=256, procesos=None):
+    """Calcula el top-n de todos los usuarios del modelo, por bloques y en varios procesos
+
+    Devuelve (ids_usuarios, ids_hoteles, puntuaciones) con una fila por usuario.
+    """
+    n_usuarios = len(estado.ids_usuarios)
+    n = min(n, len(estado.ids_hoteles))
+    ids_hoteles = np.full((n_usuarios, n), -1, dtype=np.int32)
+    puntuaciones = np.full((n_usuarios, n), -np.inf, dtype=np.float32)
+    bloques = [(inicio, min(inicio + tam_bloque, n_usuarios), n) for inicio in range(0, n_usuarios, tam_bloque)]
+
+    if procesos == 1 or len(bloques) <= 1:
+        _inicializar_trabajador(estado)
+        resultados = (_puntuar_bloque(*bloque) for bloque in bloques)
+        for inicio, ids_bloque, puntuaciones_bloque in resultados:
+            ids_hoteles[inicio:inicio + len(ids_bloque)] = ids_bloque
+            puntuaciones[inicio:inicio + len(ids_bloque)] = puntuaciones_bloque
+    else:
+        with ProcessPoolExecutor(
+            max_workers=procesos, initializer=_inicializar_trabajador, initargs=(estado,)
+        ) as ejecutor:
+            futuros = [ejecutor.submit(_puntuar_bloque, *bloque) for bloque in bloques]
+            for futuro in futuros:
+                inicio, ids_bloque, puntuaciones_bloque = futuro.result()
+                ids_hoteles[inicio:inicio + len(ids_bloque)] = ids_bloque
+                puntuaciones[inicio:inicio + len(ids_bloque)] = puntuaciones_bloque
+
+    return np.asarray(estado.ids_usuarios), ids_hoteles, puntuaciones
+
+
+def _filas_tabla(ids_usuarios, ids_hoteles, puntuaciones):
+    """Aplana las matrices de resultados en columnas (id_usuario, posicion, id_hotel, puntuacion)"""
+    validos = ids_hoteles >= 0
+    usuarios = np.broadcast_to(ids_usuarios[:, None], ids_hoteles.shape)[validos]
+    posiciones = np.broadcast_to(np.arange(ids_hoteles.shape[1]), ids_hoteles.shape)[validos]
+    return usuarios, posiciones, ids_hoteles[validos], puntuaciones[validos]
+
+
+def escribir_tabla(ids_usuarios, ids_hoteles, puntuaciones, tam_lote=5000):
+    """Carga los resultados en una tabla nueva y la intercambia atómicamente con la tabla servida"""
+    columnas = _filas_tabla(ids_usuarios, ids_hoteles, puntuaciones)
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLA}_nueva")
+            cursor.execute(DEFINICION_TABLA.format(tabla=f"{TABLA}_nueva"))
+            sentencia = (
+                f"INSERT INTO {TABLA}_nueva (id_usuario, posicion, id_hotel, puntuacion) VALUES (%s, %s, %s, %s)"
+            )
+            for inicio in range(0, len(columnas[0]), tam_lote):
+                # executemany agrupa el lote en un único INSERT de varias filas
+                lote = list(zip(*(columna[inicio:inicio + tam_lote].tolist() for columna in columnas)))
+                cursor.executemany(sentencia, lote)
+            conn.commit()
+
+            # Los lectores pasan de la tabla anterior a la nueva sin ver nunca una tabla a medio cargar
+            cursor.execute(DEFINICION_TABLA.format(tabla=f"IF NOT EXISTS {TABLA}"))
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLA}_vieja")
+            cursor.execute(f"RENAME TABLE {TABLA} TO {TABLA}_vieja, {TABLA}_nueva TO {TABLA}")
+            cursor.execute(f"DROP TABLE {TABLA}_vieja")
+        finally:
+            cursor.close()
+    return len(columnas[0])
+
+
+def escribir_archivo(ruta, ids_usuarios, ids_hoteles, puntuaciones):
+    """Guarda los resultados en un archivo columnar .npz (el que lee FuenteMySQL con archivo_precalculadas)
+
+    Se escribe en un archivo temporal y se renombra, así los lectores nunca ven un archivo a medio escribir.
+    """
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "wb") as archivo:
+        np.savez(archivo, ids_usuarios=ids_usuarios, ids_hoteles=ids_hoteles, puntuaciones=puntuaciones)
+    os.replace(temporal, ruta)
+    return int(np.sum(ids_hoteles >= 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precalcula el top-N de recomendaciones de todos los usuarios")
+    parser.add_argument("--n", type=int, default=10, help="recomendaciones por usuario")
+    parser.add_argument("--tam-bloque", type=int, default=256, help="usuarios puntuados por bloque")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count(), help="procesos de puntuación")
+    parser.add_argument("--destino", choices=("tabla", "archivo"), default="tabla")
+    parser.add_argument("--archivo", default=ARCHIVO_PRECALCULADAS or "recomendaciones_precalculadas.npz")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    # Los mismos parámetros que la aplicación, para que ambas compartan el paquete del modelo
+    sistema = SistemaRecomendacion(
+        modo_busqueda=MODO_BUSQUEDA, parametros_ann=PARAMETROS_ANN,
+        modo_recomendacion=MODO_RECOMENDACION, parametros_als=PARAMETROS_ALS
+    )
+    # Reutiliza el paquete del modelo guardado en disco si existe y está al día
+    sistema.iniciar(DIR_MODELO)
+    estado = sistema.estado
+    print(f"Modelo cargado en {time.perf_counter() - inicio:.1f} s "
+          f"({len(estado.ids_usuarios)} usuarios, {len(estado.ids_hoteles)} hoteles)")
+
+    inicio = time.perf_counter()
+    ids_usuarios, ids_hoteles, puntuaciones = precalcular(estado, args.n, args.tam_bloque, args.procesos)
+    duracion = time.perf_counter() - inicio
+    print(f"Puntuados {len(ids_usuarios)} usuarios en {duracion:.1f} s "
+          f"({len(ids_usuarios) / max(duracion, 1e-9):,.0f} usuarios/s, {args.procesos} procesos)")
+
+    inicio = time.perf_counter()
+    if args.destino == "tabla":
+        filas = escribir_tabla(ids_usuarios, ids_hoteles, puntuaciones)
+        destino = f"tabla {TABLA}"
+    else:
+        filas = escribir_archivo(args.archivo, ids_usuarios, ids_hoteles, puntuaciones)
+        destino = args.archivo
+    duracion = time.perf_counter() - inicio
+    print(f"Escritas {filas} filas en {destino} en {duracion:.1f} s ({filas / max(duracion, 1e-9):,.0f} filas/s)")
+
+
+if __name__ == "__main__":
+    main()
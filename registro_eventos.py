@@ -0,0 +1,120 @@
+import atexit
+import queue
+import threading
+from datetime import datetime
+from conexion_bd import ejecutar_lote
+
+# Sentencia de inserción de cada tipo de evento (las filas se acumulan y se insertan por lotes)
+SENTENCIAS = {
+    'interaccion': (
+        "INSERT INTO interacciones_usuario (id_usuario, id_hotel, accion, valor, fecha) VALUES (%s, %s, %s, %s, %s)"
+    ),
+    'busqueda': (
+        "INSERT INTO busquedas_usuario (id_usuario, tipo, consulta, n_resultados, fecha) VALUES (%s, %s, %s, %s, %s)"
+    ),
+}
+
+# Marca el final de la cola al detener el hilo
+_FIN = object()
+
+
+class RegistroEventos(threading.Thread):
+    """Hilo en segundo plano que guarda en la base de datos los eventos de la interfaz
+
+    Los eventos (tarjetas de hotel vistas, clics en favoritos, búsquedas y peticiones de
+    recomendaciones) se encolan sin tocar la base de datos; el hilo vacía la cola e inserta lotes de
+    hasta `tam_lote` filas con executemany. La cola es acotada: si está llena, registrar() espera
+    como mucho `espera` segundos y, si sigue llena, descarta el evento y lo cuenta en `descartados`,
+    de modo que la interfaz nunca se bloquea por la base de datos. Al terminar el proceso se guardan
+    los eventos pendientes.
+    """
+
+    def __init__(self, capacidad=10000, tam_lote=500, intervalo=1.0, espera=0.0, escribir=None):
+        super().__init__(name="registro-eventos", daemon=True)
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self.espera = espera
+        # Función (sql, filas) que inserta un lote; por defecto, en el pool MySQL compartido
+        self.escribir = escribir or ejecutar_lote
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._detener = threading.Event()
+        self._bloqueo = threading.Lock()
+        self.descartados = 0
+        self.fallidos = 0
+        self.guardados = 0
+        atexit.register(self.detener)
+
+    def registrar(self, tipo, *valores):
+        """Encola una fila del tipo indicado (ver SENTENCIAS) con la fecha actual; devuelve False si se descartó"""
+        if tipo not in SENTENCIAS:
+            raise ValueError(f"Tipo de evento desconocido: {tipo}")
+        if self._detener.is_set():
+            return False
+        try:
+            self._cola.put((tipo, valores + (datetime.now(),)), block=self.espera > 0, timeout=self.espera or None)
+            return True
+        except queue.Full:
+            with self._bloqueo:
+                self.descartados += 1
+            return False
+
+    def registrar_interaccion(self, id_usuario, id_hotel, accion, valor=1.0):
+        """Vista de la tarjeta de un hotel, clic en favoritos, etc. (alimenta el modelo ALS)"""
+        if id_usuario is None or id_hotel is None:
+            return False
+        return self.registrar('interaccion', int(id_usuario), int(id_hotel), accion, float(valor))
+
+    def registrar_busqueda(self, id_usuario, tipo, consulta, n_resultados):
+        """Búsqueda por texto o petición de recomendaciones y cuántos resultados devolvió"""
+        return self.registrar(
+            'busqueda', None if id_usuario is None else int(id_usuario), tipo, str(consulta), int(n_resultados)
+        )
+
+    def pendientes(self):
+        return self._cola.qsize()
+
+    def run(self):
+        terminar = False
+        while not terminar:
+            try:
+                primero = self._cola.get(timeout=self.intervalo)
+            except queue.Empty:
+                continue
+            # Tomar todo lo que ya esté en la cola, hasta un lote
+            lote = [primero]
+            while len(lote) < self.tam_lote:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            terminar = any(evento is _FIN for evento in lote)
+            self._guardar([evento for evento in lote if evento is not _FIN])
+
+    def _guardar(self, eventos):
+        """Inserta los eventos agrupados por tipo; si la base de datos falla, el lote se pierde y se cuenta"""
+        por_tipo = {}
+        for tipo, fila in eventos:
+            por_tipo.setdefault(tipo, []).append(fila)
+        for tipo, filas in por_tipo.items():
+            try:
+                self.escribir(SENTENCIAS[tipo], filas)
+                self.guardados += len(filas)
+            except Exception as e:
+                self.fallidos += len(filas)
+                print(f"Error al guardar {len(filas)} eventos de tipo '{tipo}': {e}")
+
+    def detener(self, espera=10.0):
+        """Deja de aceptar eventos, guarda los que quedan en la cola y espera al hilo como mucho `espera` segundos"""
+        if self._detener.is_set():
+            return
+        self._detener.set()
+        if not self.is_alive():
+            # El hilo nunca arrancó: guardar lo encolado desde aquí
+            eventos = []
+            while not self._cola.empty():
+                eventos.append(self._cola.get_nowait())
+            self._guardar(eventos)
+            return
+        # El marcador de fin se encola detrás de los eventos pendientes (espera si la cola está llena)
+        self._cola.put(_FIN)
+        self.join(espera)
@@ -0,0 +1,458 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from config import (
+    ARCHIVO_PRECALCULADAS, CACHE_RESULTADOS, CAPACIDAD_HOTEL, DIR_MODELO, EXPORTAR_METRICAS, INTERVALO_REFRESCO,
+    METRICAS, MODO_BUSQUEDA, MODO_RECOMENDACION, PARAMETROS_ALS, PARAMETROS_ANN
+)
+from cache_resultados import CacheResultados
+from fuentes_datos import FuenteMySQL, FuenteSQLite
+from metricas import REGISTRO, ExportadorMetricas, configurar, medir, perfilar
+from modelo_recomendacion import (
+    RefrescadorModelo, SistemaRecomendacion, normalizar_consulta, puntuar_consultas
+)
+
+# Uso:
+#   python servicio_recomendacion.py [--host 127.0.0.1] [--puerto 8080] [--ventana-ms 2] [--max-lote 256]
+#                                    [--sqlite datos_benchmark/x.sqlite]
+#
+#   GET /recomendaciones/usuario?id=5&n=10[&entrada=2025-01-10&salida=2025-01-12]
+#   GET /recomendaciones/caracteristicas?q=piscina+spa&n=10[&entrada=...&salida=...]
+#   GET /hoteles?ids=1,2,3
+#   GET /hoteles/similares?id=1&n=5
+#   GET /metricas          latencias p50/p99 y QPS por ruta, y tamaño de los lotes
+#   GET /metricas/prometheus   histogramas del modelo y del servicio en formato Prometheus (METRICAS_ACTIVAS=1)
+#   GET /salud
+
+# Máximo de recomendaciones por petición
+N_MAXIMO = 100
+
+
+class ErrorPeticion(Exception):
+    """Petición mal formada: se responde con 400 y el mensaje"""
+
+
+class AgrupadorLotes:
+    """Junta las peticiones que llegan dentro de una ventana de unos milisegundos y las procesa en un solo lote
+
+    `procesar` recibe la lista de peticiones y devuelve la lista de resultados en el mismo orden; se
+    ejecuta en un hilo del `ejecutor` para no bloquear el bucle de eventos. Un lote se despacha
+    cuando vence la ventana o cuando alcanza `max_lote` peticiones.
+    """
+
+    def __init__(self, procesar, ejecutor, ventana=0.002, max_lote=256, nombre='lote'):
+        self.procesar = procesar
+        self.nombre = nombre
+        self.ejecutor = ejecutor
+        self.ventana = ventana
+        self.max_lote = max_lote
+        self._pendientes = []
+        self._temporizador = None
+        self.n_lotes = 0
+        self.n_peticiones = 0
+
+    async def enviar(self, peticion):
+        bucle = asyncio.get_running_loop()
+        futuro = bucle.create_future()
+        self._pendientes.append((peticion, futuro))
+        if len(self._pendientes) >= self.max_lote:
+            self._despachar()
+        elif self._temporizador is None:
+            self._temporizador = bucle.call_later(self.ventana, self._despachar)
+        return await futuro
+
+    def _despachar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        lote, self._pendientes = self._pendientes, []
+        if lote:
+            self.n_lotes += 1
+            self.n_peticiones += len(lote)
+            asyncio.ensure_future(self._ejecutar(lote))
+
+    async def _ejecutar(self, lote):
+        try:
+            resultados = await asyncio.get_running_loop().run_in_executor(
+                self.ejecutor, self._procesar, [peticion for peticion, _ in lote]
+            )
+        except Exception as e:
+            resultados = [e] * len(lote)
+        for (_, futuro), resultado in zip(lote, resultados):
+            if futuro.done():
+                continue
+            if isinstance(resultado, Exception):
+                futuro.set_exception(resultado)
+            else:
+                futuro.set_result(resultado)
+
+    def _procesar(self, peticiones):
+        with perfilar(f"servicio_{self.nombre}"), medir(f"servicio_{self.nombre}"):
+            return self.procesar(peticiones)
+
+    def resumen(self):
+        return {
+            'lotes': self.n_lotes,
+            'peticiones': self.n_peticiones,
+            'tamano_medio': self.n_peticiones / self.n_lotes if self.n_lotes else 0.0,
+        }
+
+
+class Latencias:
+    """Latencias recientes y conteo de peticiones de una ruta, para informar p50/p99 y QPS"""
+
+    def __init__(self, maximo=10000, ventana_qps=10.0):
+        self.tiempos = deque(maxlen=maximo)
+        self.instantes = deque(maxlen=maximo)
+        self.ventana_qps = ventana_qps
+        self.total = 0
+        self.errores = 0
+
+    def registrar(self, segundos, error=False):
+        self.tiempos.append(segundos)
+        self.instantes.append(time.monotonic())
+        self.total += 1
+        self.errores += error
+
+    def resumen(self):
+        tiempos = np.fromiter(self.tiempos, dtype=np.float64, count=len(self.tiempos)) * 1000
+        # QPS de los últimos `ventana_qps` segundos (o desde la primera petición guardada)
+        ahora = time.monotonic()
+        instantes = np.fromiter(self.instantes, dtype=np.float64, count=len(self.instantes))
+        recientes = instantes[instantes >= ahora - self.ventana_qps]
+        duracion = min(self.ventana_qps, ahora - instantes[0]) if len(instantes) else 0.0
+        return {
+            'total': self.total,
+            'errores': self.errores,
+            'qps': len(recientes) / duracion if duracion > 0 else 0.0,
+            'p50_ms': float(np.percentile(tiempos, 50)) if len(tiempos) else None,
+            'p99_ms': float(np.percentile(tiempos, 99)) if len(tiempos) else None,
+        }
+
+
+def _fecha(parametros, nombre):
+    valor = parametros.get(nombre)
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise ErrorPeticion(f"Fecha no válida en '{nombre}': {valor}")
+
+
+def _entero(parametros, nombre, defecto=None, minimo=1, maximo=None):
+    valor = parametros.get(nombre)
+    if valor is None:
+        if defecto is None:
+            raise ErrorPeticion(f"Falta el parámetro '{nombre}'")
+        return defecto
+    try:
+        valor = int(valor)
+    except ValueError:
+        raise ErrorPeticion(f"'{nombre}' debe ser un entero: {valor}")
+    if valor < minimo or (maximo is not None and valor > maximo):
+        raise ErrorPeticion(f"'{nombre}' fuera de rango: {valor}")
+    return valor
+
+
+def _rango_fechas(parametros):
+    entrada, salida = _fecha(parametros, 'entrada'), _fecha(parametros, 'salida')
+    if (entrada is None) != (salida is None):
+        raise ErrorPeticion("Indique 'entrada' y 'salida', o ninguna de las dos")
+    if entrada is not None and salida <= entrada:
+        raise ErrorPeticion("La fecha de salida debe ser posterior a la de entrada")
+    return entrada, salida
+
+
+def _a_json(valor):
+    # Tipos de NumPy, Decimal y fechas que vienen de la base de datos
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return str(valor)
+
+
+class ServicioRecomendacion:
+    """Servicio HTTP/JSON (asyncio, solo biblioteca estándar) sobre un SistemaRecomendacion ya cargado
+
+    Las recomendaciones por usuario y por texto pasan por un AgrupadorLotes: las peticiones
+    concurrentes se resuelven con una sola operación matricial sobre la misma instantánea del modelo.
+    """
+
+    def __init__(self, sistema, ventana=0.002, max_lote=256, hilos=2):
+        self.sistema = sistema
+        self.ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="servicio-lotes")
+        self.lotes_usuarios = AgrupadorLotes(self._lote_usuarios, self.ejecutor, ventana, max_lote, 'lote_usuarios')
+        self.lotes_texto = AgrupadorLotes(self._lote_texto, self.ejecutor, ventana, max_lote, 'lote_texto')
+        self.latencias = {}
+        self.inicio = time.monotonic()
+        self.rutas = {
+            '/recomendaciones/usuario': self._recomendar_usuario,
+            '/recomendaciones/caracteristicas': self._recomendar_caracteristicas,
+            '/hoteles': self._hoteles,
+            '/hoteles/similares': self._hoteles_similares,
+            '/metricas': self._metricas,
+            '/metricas/prometheus': self._metricas_prometheus,
+            '/salud': self._salud,
+        }
+
+    # --- Procesamiento por lotes (en un hilo del ejecutor) ---
+
+    @staticmethod
+    def _por_fechas(peticiones):
+        """Agrupa los índices de las peticiones por su rango de fechas (cada rango excluye otros hoteles)"""
+        grupos = {}
+        for i, peticion in enumerate(peticiones):
+            grupos.setdefault((peticion[2], peticion[3]), []).append(i)
+        return grupos.items()
+
+    def _lote_usuarios(self, peticiones):
+        """Peticiones (id_usuario, n, entrada, salida) -> listas de (id_hotel, puntuacion)"""
+        estado = self.sistema.estado
+        resultados = [[] for _ in peticiones]
+        for (entrada, salida), indices in self._por_fechas(peticiones):
+            recomendaciones = self.sistema.recomendar_por_usuarios(
+                [peticiones[i][0] for i in indices], max(peticiones[i][1] for i in indices),
+                entrada=entrada, salida=salida, estado=estado
+            )
+            for i, recomendacion in zip(indices, recomendaciones):
+                resultados[i] = recomendacion[:peticiones[i][1]]
+        return resultados
+
+    def _lote_texto(self, peticiones):
+        """Peticiones (consulta, n, entrada, salida) -> listas de (id_hotel, similitud)"""
+        estado = self.sistema.estado
+        resultados = [[] for _ in peticiones]
+        if estado.matriz_tfidf is None:
+            return resultados
+        if estado.indice_ann is not None:
+            # El índice aproximado ya evita recorrer el catálogo: se consulta petición a petición
+            return [
+                self.sistema.recomendar_por_caracteristicas(consulta, n, entrada, salida)
+                for consulta, n, entrada, salida in peticiones
+            ]
+        for (entrada, salida), indices in self._por_fechas(peticiones):
+            consultas = {i: normalizar_consulta(peticiones[i][0]) for i in indices}
+            pendientes = []
+            for i in indices:
+                # Las búsquedas sin fechas comparten la caché de resultados del modelo
+                en_cache = None if entrada is not None else self.sistema.consulta_en_cache(
+                    consultas[i], peticiones[i][1], estado
+                )
+                if en_cache is None:
+                    pendientes.append(i)
+                else:
+                    resultados[i] = list(en_cache)
+            if not pendientes:
+                continue
+            vectores = estado.vectorizador.transform([consultas[i] for i in pendientes])
+            ids_hoteles, similitudes = puntuar_consultas(
+                estado, vectores, max(peticiones[i][1] for i in pendientes),
+                self.sistema.hoteles_ocupados(entrada, salida, estado)
+            )
+            for i, ids, valores in zip(pendientes, ids_hoteles, similitudes):
+                n = peticiones[i][1]
+                validos = ids[:n] >= 0
+                resultados[i] = list(zip(ids[:n][validos].tolist(), valores[:n][validos].tolist()))
+                if entrada is None:
+                    self.sistema.guardar_consulta(consultas[i], n, resultados[i], estado)
+        return resultados
+
+    # --- Rutas ---
+
+    async def _recomendar_usuario(self, parametros):
+        id_usuario = _entero(parametros, 'id')
+        n = _entero(parametros, 'n', 5, maximo=N_MAXIMO)
+        entrada, salida = _rango_fechas(parametros)
+        recomendaciones = await self.lotes_usuarios.enviar((id_usuario, n, entrada, salida))
+        return {'id_usuario': id_usuario, 'recomendaciones': [
+            {'id_hotel': id_hotel, 'puntuacion': puntuacion} for id_hotel, puntuacion in recomendaciones
+        ]}
+
+    async def _recomendar_caracteristicas(self, parametros):
+        consulta = parametros.get('q', '').strip()
+        if not consulta:
+            raise ErrorPeticion("Falta el parámetro 'q'")
+        n = _entero(parametros, 'n', 5, maximo=N_MAXIMO)
+        entrada, salida = _rango_fechas(parametros)
+        recomendaciones = await self.lotes_texto.enviar((consulta, n, entrada, salida))
+        return {'consulta': consulta, 'recomendaciones': [
+            {'id_hotel': id_hotel, 'similitud': similitud} for id_hotel, similitud in recomendaciones
+        ]}
+
+    async def _hoteles(self, parametros):
+        try:
+            ids = [int(valor) for valor in parametros.get('ids', '').split(',') if valor.strip()]
+        except ValueError:
+            raise ErrorPeticion("'ids' debe ser una lista de enteros separados por comas")
+        if not ids:
+            raise ErrorPeticion("Falta el parámetro 'ids'")
+        hoteles = self.sistema.obtener_hoteles(ids)
+        return {'hoteles': [None if hotel is None else hotel._asdict() for hotel in hoteles]}
+
+    async def _hoteles_similares(self, parametros):
+        id_hotel = _entero(parametros, 'id')
+        n = _entero(parametros, 'n', 5, maximo=N_MAXIMO)
+        similares = self.sistema.hoteles_similares(id_hotel, n)
+        return {'id_hotel': id_hotel, 'similares': [
+            {'id_hotel': id_similar, 'similitud': similitud} for id_similar, similitud in similares
+        ]}
+
+    async def _metricas(self, parametros):
+        return {
+            'segundos_activo': time.monotonic() - self.inicio,
+            'version_modelo': self.sistema.estado.version,
+            'rutas': {ruta: latencias.resumen() for ruta, latencias in sorted(self.latencias.items())},
+            'lotes': {'usuario': self.lotes_usuarios.resumen(), 'caracteristicas': self.lotes_texto.resumen()},
+            'cache': self.sistema.cache_resultados.estadisticas(),
+        }
+
+    async def _metricas_prometheus(self, parametros):
+        # Texto plano en lugar de JSON
+        return REGISTRO.texto_prometheus()
+
+    async def _salud(self, parametros):
+        return {'estado': 'ok', 'version_modelo': self.sistema.estado.version}
+
+    # --- HTTP ---
+
+    async def _atender(self, metodo, destino):
+        """Devuelve (código, cuerpo) de una petición"""
+        partes = urlsplit(destino)
+        manejador = self.rutas.get(partes.path.rstrip('/') or '/')
+        if manejador is None:
+            return 404, {'error': f"Ruta desconocida: {partes.path}"}
+        if metodo != 'GET':
+            return 405, {'error': "Solo se admite GET"}
+        parametros = {clave: valores[-1] for clave, valores in parse_qs(partes.query).items()}
+        try:
+            return 200, await manejador(parametros)
+        except ErrorPeticion as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            print(f"Error al atender {destino}: {e}")
+            return 500, {'error': "Error interno"}
+
+    async def manejar_conexion(self, lector, escritor):
+        """Atiende las peticiones HTTP/1.1 de una conexión (con keep-alive) hasta que el cliente la cierra"""
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea:
+                    break
+                inicio = time.perf_counter()
+                try:
+                    metodo, destino, version = linea.decode('latin-1').split()
+                except ValueError:
+                    break
+                cabeceras = {}
+                while True:
+                    cabecera = await lector.readline()
+                    if cabecera in (b'\r\n', b'\n', b''):
+                        break
+                    nombre, _, valor = cabecera.decode('latin-1').partition(':')
+                    cabeceras[nombre.strip().lower()] = valor.strip()
+                try:
+                    longitud = int(cabeceras.get('content-length', 0) or 0)
+                except ValueError:
+                    longitud = -1
+                if longitud < 0:
+                    # Sin una longitud válida no se sabe dónde empieza la petición siguiente: se responde y se cierra
+                    codigo, cuerpo = 400, {'error': "Cabecera Content-Length no válida"}
+                else:
+                    if longitud:
+                        await lector.readexactly(longitud)
+                    codigo, cuerpo = await self._atender(metodo, destino)
+                tipo = 'application/json'
+                if isinstance(cuerpo, str):
+                    datos, tipo = cuerpo.encode('utf-8'), 'text/plain; version=0.0.4'
+                else:
+                    datos = json.dumps(cuerpo, default=_a_json, ensure_ascii=False).encode('utf-8')
+                cerrar = longitud < 0 or cabeceras.get('connection', '').lower() == 'close' or version == 'HTTP/1.0'
+                escritor.write(
+                    f"HTTP/1.1 {codigo} {'OK' if codigo == 200 else 'Error'}\r\n"
+                    f"Content-Type: {tipo}; charset=utf-8\r\n"
+                    f"Content-Length: {len(datos)}\r\n"
+                    f"Connection: {'close' if cerrar else 'keep-alive'}\r\n\r\n".encode('latin-1') + datos
+                )
+                await escritor.drain()
+
+                ruta = urlsplit(destino).path.rstrip('/') or '/'
+                if ruta in self.rutas:
+                    self.latencias.setdefault(ruta, Latencias()).registrar(time.perf_counter() - inicio, codigo >= 500)
+                if cerrar:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+    async def servir(self, host='127.0.0.1', puerto=8080, intervalo_informe=0):
+        servidor = await asyncio.start_server(self.manejar_conexion, host, puerto)
+        print(f"Servicio de recomendación escuchando en http://{host}:{puerto}")
+        async with servidor:
+            if intervalo_informe > 0:
+                asyncio.ensure_future(self._informar(intervalo_informe))
+            await servidor.serve_forever()
+
+    async def _informar(self, intervalo):
+        """Imprime periódicamente p50/p99 y QPS de cada ruta"""
+        while True:
+            await asyncio.sleep(intervalo)
+            for ruta, latencias in sorted(self.latencias.items()):
+                r = latencias.resumen()
+                if r['p50_ms'] is not None:
+                    print(f"{ruta}: {r['qps']:.1f} QPS, p50 {r['p50_ms']:.2f} ms, p99 {r['p99_ms']:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio HTTP/JSON de recomendaciones con agrupación de peticiones")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8080)
+    parser.add_argument("--ventana-ms", type=float, default=2.0, help="espera máxima para agrupar peticiones")
+    parser.add_argument("--max-lote", type=int, default=256, help="peticiones máximas por lote")
+    parser.add_argument("--hilos", type=int, default=2, help="hilos que procesan los lotes")
+    parser.add_argument("--informe", type=float, default=0, help="segundos entre informes de latencia (0 = nunca)")
+    parser.add_argument("--sqlite", help="leer los datos de un archivo SQLite en lugar de MySQL")
+    args = parser.parse_args()
+
+    registro = configurar(**METRICAS)
+    if registro.activas and (EXPORTAR_METRICAS['archivo_json'] or EXPORTAR_METRICAS['archivo_prometheus']):
+        ExportadorMetricas(**EXPORTAR_METRICAS).start()
+    archivo_precalculadas = ARCHIVO_PRECALCULADAS or None
+    if args.sqlite:
+        fuente = FuenteSQLite(args.sqlite, archivo_precalculadas=archivo_precalculadas)
+    else:
+        fuente = FuenteMySQL(archivo_precalculadas=archivo_precalculadas)
+    sistema = SistemaRecomendacion(
+        modo_busqueda=MODO_BUSQUEDA, parametros_ann=PARAMETROS_ANN,
+        modo_recomendacion=MODO_RECOMENDACION, parametros_als=PARAMETROS_ALS, capacidad_hotel=CAPACIDAD_HOTEL,
+        fuente=fuente,
+        cache_resultados=CacheResultados(**CACHE_RESULTADOS)
+    )
+    inicio = time.perf_counter()
+    if args.sqlite:
+        sistema.cargar_datos()
+    else:
+        # El mismo paquete en disco que la aplicación
+        sistema.iniciar(DIR_MODELO)
+    print(f"Modelo cargado en {time.perf_counter() - inicio:.1f} s")
+    if INTERVALO_REFRESCO > 0:
+        RefrescadorModelo(sistema, INTERVALO_REFRESCO).start()
+
+    servicio = ServicioRecomendacion(sistema, args.ventana_ms / 1000, args.max_lote, args.hilos)
+    try:
+        asyncio.run(servicio.servir(args.host, args.puerto, args.informe))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sistema.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    main()